@@ -0,0 +1,39 @@
+import argparse
+import os
+
+from ingestion.backfill import Backfill
+from ingestion.ingestion_pipeline import IngestionPipeline
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def main():
+    """
+    Main function to ingest every file already present in a directory tree.
+    """
+    parser = argparse.ArgumentParser(
+        description="Ingest all supported documents under a directory."
+    )
+    parser.add_argument(
+        "path",
+        nargs="?",
+        default=os.getenv("INGESTION_SOURCE_PATH", "."),
+        help="directory to backfill, defaults to INGESTION_SOURCE_PATH",
+    )
+    parser.add_argument(
+        "--no-recursive",
+        action="store_true",
+        help="only ingest files directly inside the directory",
+    )
+    args = parser.parse_args()
+
+    logger.info(f"Starting backfill of {args.path}...")
+    ingestion_pipeline = IngestionPipeline()
+    backfill = Backfill(ingestion_pipeline)
+    backfill.run(args.path, recursive=not args.no_recursive)
+    logger.info("Backfill completed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Throughput benchmark for FixedWidthSplitter.
+
+Splits multi-megabyte prose, a base64 blob without whitespace and a minified
+log, checks that every chunk respects the configured chunk size and that chunks
+move strictly forward, and reports the throughput of each input.
+
+Usage:
+    python -m benchmarks.fixed_width_splitter_benchmark --size-mb 8 --repeat 3
+"""
+
+import argparse
+import base64
+import random
+import time
+from typing import Callable, Dict
+
+from ingestion.splitters.fixed_width_splitter import FixedWidthSplitter
+
+
+def _prose(size: int, rng: random.Random) -> str:
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing"]
+    parts = []
+    length = 0
+    while length < size:
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(5, 25)))
+        sentence = sentence.capitalize() + rng.choice([". ", "! ", "? ", ".\n\n"])
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts)[:size]
+
+
+def _base64_blob(size: int, rng: random.Random) -> str:
+    return base64.b64encode(rng.randbytes(size * 3 // 4 + 3)).decode("ascii")[:size]
+
+
+def _minified_log(size: int, rng: random.Random) -> str:
+    # long json-ish records with a single space every few kilobytes
+    record = (
+        '{"level":"info","msg":"request served","latency_ms":%d,'
+        '"path":"/api/v1/%d"}'
+    )
+    parts = []
+    length = 0
+    while length < size:
+        line = "".join(
+            record % (rng.randint(1, 999), rng.randint(1, 99999)) for _ in range(40)
+        )
+        parts.append(line + " ")
+        length += len(line) + 1
+    return "".join(parts)[:size]
+
+
+INPUTS: Dict[str, Callable[[int, random.Random], str]] = {
+    "prose": _prose,
+    "base64": _base64_blob,
+    "minified_log": _minified_log,
+}
+
+
+def run(size_mb: float, repeat: int) -> None:
+    splitter = FixedWidthSplitter()
+    rng = random.Random(0)
+    size = int(size_mb * 1024 * 1024)
+    print(
+        f"chunk_size={splitter.chunk_size} chunk_overlap={splitter.chunk_overlap} "
+        f"input={size_mb}MB"
+    )
+    for name, generate in INPUTS.items():
+        text = generate(size, rng)
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            spans = list(splitter.split_spans(text))
+            best = min(best, time.perf_counter() - started)
+
+        previous_start = -1
+        for start, end in spans:
+            assert end - start <= splitter.chunk_size, (name, start, end)
+            assert start > previous_start, (name, previous_start, start)
+            previous_start = start
+        assert spans and spans[-1][1] == len(text.rstrip()), name
+
+        print(
+            f"{name:>14}: {len(spans):>8} chunks in {best:.3f}s, "
+            f"{len(text) / best / 1e6:.1f} MB/s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--size-mb", type=float, default=8.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.size_mb, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 from .abstract_vector_store import AbstractVectorStore
+from .bm25_index import BM25Index
 from .chromadb_vector_store import ChromadbVectorStore
+from .numpy_vector_store import NumpyVectorStore
 
 
 __all__ = [
     "AbstractVectorStore",
-    "ChromaDBVectorStore",
+    "BM25Index",
+    "ChromadbVectorStore",
+    "NumpyVectorStore",
 ]
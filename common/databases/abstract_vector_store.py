@@ -1,11 +1,93 @@
+import hashlib
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 from langchain.schema import Document
 
 load_dotenv(override=False)
 
+# metadata keys that locate a chunk inside its source: the structural unit of a
+# DOCX file, the chunk's offset in its document and the document's offset in
+# the file
+_OFFSET_KEYS = ("unit", "start", "byte_start")
+
+# comparison operators supported in metadata filters
+_FILTER_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+
+def validate_filters(filters: Any) -> None:
+    """
+    Check that a metadata filter is well formed before it reaches a store.
+
+    Args:
+        filters (Any): The filter, see matches_filters, or None.
+
+    Raises:
+        ValueError: If the filter is not a dict, uses an unknown operator, or
+            gives $in or $nin something other than a list.
+    """
+    if filters is None:
+        return
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    for key, condition in filters.items():
+        if not isinstance(condition, dict):
+            continue
+        for operator, operand in condition.items():
+            if operator not in _FILTER_OPERATORS:
+                raise ValueError(f"Unknown filter operator: {operator}")
+            if operator in ("$in", "$nin") and not isinstance(operand, list):
+                raise ValueError(f"{operator} of {key} must be a list")
+
+
+def matches_filters(
+    metadata: Dict[str, Any], filters: Optional[Dict[str, Any]]
+) -> bool:
+    """
+    Check document metadata against a metadata filter.
+
+    A filter maps metadata keys to either a value, which must be equal, or a
+    dict of operators ($eq, $ne, $gt, $gte, $lt, $lte, $in, $nin), all of which
+    must hold. For example {"file_extension": ".pdf", "page": {"$gte": 3,
+    "$lte": 10}} keeps pages 3 to 10 of PDF files.
+
+    Args:
+        metadata (Dict[str, Any]): The document metadata.
+        filters (Optional[Dict[str, Any]]): The filter, None matches everything.
+
+    Returns:
+        bool: True if the metadata satisfies every condition.
+
+    Raises:
+        ValueError: If the filter uses an unknown operator.
+    """
+    if not filters:
+        return True
+    for key, condition in filters.items():
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, operand in condition.items():
+            if operator not in _FILTER_OPERATORS:
+                raise ValueError(f"Unknown filter operator: {operator}")
+            try:
+                if not _FILTER_OPERATORS[operator](value, operand):
+                    return False
+            except TypeError:
+                # e.g. comparing a missing page number with an int
+                return False
+    return True
+
 
 class AbstractVectorStore(ABC):
     @abstractmethod
@@ -14,5 +96,145 @@ class AbstractVectorStore(ABC):
     ) -> None:
         pass
 
-    def query_doc_embeddings(self, embeddings: List[float]) -> List[Document]:
+    @abstractmethod
+    def batch_query_doc_embeddings(
+        self,
+        embeddings: List[List[float]],
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Find the nearest chunks of several query vectors in one call.
+
+        Args:
+            embeddings (List[List[float]]): The query vectors.
+            k (int): The number of results per query.
+            filters (Optional[Dict[str, Any]]): A metadata filter, see
+                matches_filters.
+            max_distance (Optional[float]): Drop results further away than this.
+
+        Returns:
+            List[List[Tuple[Document, float]]]: For every query, the matching
+            chunks and their distances, nearest first.
+        """
+        pass
+
+    def query_doc_embeddings(
+        self,
+        embeddings: List[float],
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Find the nearest chunks of one query vector.
+
+        Args:
+            embeddings (List[float]): The query vector.
+            k (int): The number of results.
+            filters (Optional[Dict[str, Any]]): A metadata filter, see
+                matches_filters.
+            max_distance (Optional[float]): Drop results further away than this.
+
+        Returns:
+            List[Tuple[Document, float]]: The matching chunks and their distances,
+            nearest first.
+        """
+        return self.batch_query_doc_embeddings(
+            [embeddings], k, filters, max_distance
+        )[0]
+
+    def delete_documents(self, source: str) -> None:
+        """
+        Delete every chunk stored for a source file, before it is re-ingested
+        with different content or chunking.
+
+        Args:
+            source (str): The absolute path of the source file.
+        """
         pass
+
+    def collection_version(self) -> Optional[str]:
+        """
+        Identify the current state of the stored collection, so that caches of
+        query results can be dropped when it changes.
+
+        Returns:
+            Optional[str]: A token that changes whenever chunks are added,
+            replaced or deleted, or None if the store cannot tell.
+        """
+        return None
+
+    def flush(self) -> None:
+        """
+        Block until every write accepted by save_doc_embeddings is persisted.
+        Stores that write synchronously have nothing to do.
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Flush pending writes and release the store's resources.
+        """
+        self.flush()
+
+    @staticmethod
+    def document_ids(documents: List[Document]) -> List[str]:
+        """
+        Derive deterministic ids for chunks from where they come from.
+
+        The id hashes the source path, the page and the chunk's offset (its
+        "unit", "start" and "byte_start" metadata, or its position among the
+        chunks of that page), so retries and re-ingestion of the same file
+        overwrite the existing records instead of duplicating them. Chunks
+        with an offset get the same id however the chunks of a file are cut
+        into batches.
+
+        Args:
+            documents (List[Document]): The chunks to identify.
+
+        Returns:
+            List[str]: One id per chunk, unique within the list.
+        """
+        ids: List[str] = []
+        seen: Dict[str, int] = {}
+        ordinals: Dict[Tuple[Any, Any], int] = {}
+        for document in documents:
+            metadata = document.metadata
+            source = metadata.get("location") or metadata.get("source", "")
+            page = metadata.get("page", "")
+            ordinal = ordinals.get((source, page), 0)
+            ordinals[(source, page)] = ordinal + 1
+
+            # a chunk's offset within its page and the page's offset in the file
+            offset = "|".join(
+                str(metadata[key]) for key in _OFFSET_KEYS if key in metadata
+            ) or f"#{ordinal}"
+            key = f"{source}|{page}|{offset}"
+            # chunks sharing an offset, e.g. several chunks of a DOCX unit, are
+            # numbered within it
+            duplicates = seen.get(key, 0)
+            seen[key] = duplicates + 1
+            if duplicates:
+                key = f"{key}|#{duplicates}"
+            ids.append(hashlib.sha1(key.encode("utf-8")).hexdigest())
+        return ids
+
+    @staticmethod
+    def sanitize_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert metadata to the scalar types vector stores accept.
+
+        Args:
+            metadata (Dict[str, Any]): The document metadata.
+
+        Returns:
+            Dict[str, Any]: The metadata with None values dropped and values
+            other than str, int, float and bool converted to strings.
+        """
+        return {
+            key: value if isinstance(value, (str, int, float, bool)) else str(value)
+            for key, value in metadata.items()
+            if value is not None
+        }
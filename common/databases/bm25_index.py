@@ -0,0 +1,512 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain.schema import Document
+
+from common.databases.abstract_vector_store import AbstractVectorStore, matches_filters
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+# words, keeping codes such as E-1042, 0x80070005, v2.3.1 or /var/log together
+_TOKEN = re.compile(r"\w+(?:[-./:]\w+)*")
+_TOKEN_PART = re.compile(r"[-./:]")
+
+# term frequencies are stored as unsigned 16 bit integers
+_MAX_TERM_FREQUENCY = 65535
+
+# candidates fetched at a time while applying metadata filters
+_FILTER_FETCH_FACTOR = 4
+
+# sqlite's default limit on host parameters per statement is 999 before 3.32
+_SQL_BATCH_SIZE = 900
+
+# version of the chunks table and of the tokenizer that produced its terms,
+# kept in PRAGMA user_version: 1 allocates chunk numbers with AUTOINCREMENT, 2
+# no longer adds single character parts of compound tokens
+_SCHEMA_VERSION = 2
+_CREATE_CHUNKS = """
+    CREATE TABLE {table} (
+        chunk INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT NOT NULL UNIQUE,
+        source TEXT NOT NULL,
+        length INTEGER NOT NULL,
+        terms TEXT NOT NULL,
+        document TEXT NOT NULL,
+        metadata TEXT NOT NULL
+    )
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase index terms.
+
+    Compound tokens such as error codes, versions, part numbers and paths are
+    kept whole, and their parts longer than one character are added as terms
+    too, so "E-1042" matches both "E-1042" and "1042".
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        List[str]: The terms, in order, with repetitions.
+    """
+    terms: List[str] = []
+    for token in _TOKEN.findall(text.lower()):
+        terms.append(token)
+        if _TOKEN_PART.search(token):
+            # single characters such as the "e" of "e-7" would match everything
+            terms.extend(part for part in _TOKEN_PART.split(token) if len(part) > 1)
+    return terms
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[List[Tuple[Document, float]]], k: int = 4, rrf_k: int = 60
+) -> List[Tuple[Document, float]]:
+    """
+    Fuse ranked result lists with reciprocal rank fusion.
+
+    Every document scores the sum of 1 / (rrf_k + rank) over the lists it
+    appears in, so only ranks matter and lexical and vector scores need no
+    calibration against each other. Documents are matched by id.
+
+    Args:
+        rankings (Sequence[List[Tuple[Document, float]]]): The result lists,
+            best first.
+        k (int): The number of fused results.
+        rrf_k (int): Damps the weight of the top ranks.
+
+    Returns:
+        List[Tuple[Document, float]]: The fused results and their scores,
+        highest first.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, (document, _) in enumerate(ranking, start=1):
+            key = document.id or document.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, document)
+    best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+    return [(documents[key], score) for key, score in best]
+
+
+class BM25Index:
+    """
+    A persistent BM25 inverted index over the stored chunks.
+
+    Postings are kept in memory as compact arrays, one of chunk numbers (uint32)
+    and one of term frequencies (uint16) per term, and scored with vectorized
+    NumPy, so a lookup costs well under a millisecond for selective terms. The
+    chunks, their metadata and their term frequencies are persisted in SQLite,
+    so the postings are rebuilt at startup without tokenizing again.
+
+    Updates are incremental: adding a chunk appends to the postings of its terms,
+    and replaced or deleted chunks are dropped from scoring immediately and from
+    the postings at the next compaction. Chunks are identified like in the vector
+    stores, so lexical and vector results can be fused by id.
+
+    Several processes can share the index, e.g. the watcher, a backfill and the
+    query server. Chunk numbers are allocated by SQLite and never reused, and
+    every search and write first picks up the changes other processes made
+    since the last one, reading only the new chunks unless chunks were removed.
+    """
+
+    def __init__(self):
+        """
+        Initialize the index, loading the stored chunks.
+        """
+        _index_path = os.environ.get("BM25_INDEX_PATH", "bm25_index.sqlite")
+        _k1 = float(os.environ.get("BM25_K1", "1.2"))
+        _b = float(os.environ.get("BM25_B", "0.75"))
+
+        self.k1 = _k1
+        self.b = _b
+        self._index_path = _index_path
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(_index_path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            with self._connection:
+                self._connection.execute("BEGIN IMMEDIATE")
+                self._create_schema()
+            self._load()
+
+    def _create_schema(self) -> None:
+        """Create the chunks table, or migrate it from an older version."""
+        (version,) = self._connection.execute("PRAGMA user_version").fetchone()
+        if version >= _SCHEMA_VERSION:
+            return
+        if version < 1:
+            self._create_table()
+        if version < 2:
+            self._retokenize()
+        self._connection.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def _create_table(self) -> None:
+        self._connection.execute(_CREATE_CHUNKS.format(table="IF NOT EXISTS chunks"))
+        (definition,) = self._connection.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'chunks'"
+        ).fetchone()
+        if "AUTOINCREMENT" not in definition:
+            # chunk numbers used to be reused after deletes, which readers in
+            # other processes cannot tell apart from unchanged chunks
+            self._connection.execute("ALTER TABLE chunks RENAME TO chunks_old")
+            self._connection.execute(_CREATE_CHUNKS.format(table="chunks"))
+            self._connection.execute(
+                "INSERT INTO chunks (chunk, id, source, length, terms, document, "
+                "metadata) SELECT chunk, id, source, length, terms, document, "
+                "metadata FROM chunks_old"
+            )
+            self._connection.execute("DROP TABLE chunks_old")
+            logger.info(f"BM25Index migrated {self._index_path} to AUTOINCREMENT")
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source)"
+        )
+
+    def _retokenize(self) -> None:
+        """Recompute the stored terms of every chunk with the current tokenizer."""
+        rows = self._connection.execute("SELECT chunk, document FROM chunks").fetchall()
+        updates = []
+        for chunk, document in rows:
+            terms = tokenize(document)
+            updates.append((len(terms), json.dumps(Counter(terms)), chunk))
+        self._connection.executemany(
+            "UPDATE chunks SET length = ?, terms = ? WHERE chunk = ?", updates
+        )
+        if updates:
+            logger.info(f"BM25Index retokenized {len(updates)} chunks")
+
+    def _load(self) -> None:
+        """Rebuild the postings from every stored chunk."""
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._document_frequency: Counter = Counter()
+        self._lengths = array("I")
+        self._alive = bytearray()
+        self._chunk_of_id: Dict[str, int] = {}
+        self._total_length = 0
+        self._dead = 0
+        (self._data_version,) = self._connection.execute(
+            "PRAGMA data_version"
+        ).fetchone()
+
+        started = time.perf_counter()
+        for chunk, id, length, terms in self._connection.execute(
+            "SELECT chunk, id, length, terms FROM chunks ORDER BY chunk"
+        ):
+            self._index_chunk(chunk, id, length, json.loads(terms))
+        logger.debug(
+            f"BM25Index loaded {len(self._chunk_of_id)} chunks from "
+            f"{self._index_path} in {time.perf_counter() - started:.2f}s"
+        )
+
+    def _refresh(self) -> None:
+        """Pick up the chunks other processes added, replaced or deleted."""
+        (data_version,) = self._connection.execute("PRAGMA data_version").fetchone()
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+        known = len(self._lengths)
+        (kept,) = self._connection.execute(
+            "SELECT COUNT(*) FROM chunks WHERE chunk < ?", (known,)
+        ).fetchone()
+        if kept != len(self._chunk_of_id):
+            # chunks were removed, whose terms are no longer stored to unindex
+            self._load()
+            return
+        added = 0
+        for chunk, id, length, terms in self._connection.execute(
+            "SELECT chunk, id, length, terms FROM chunks WHERE chunk >= ? "
+            "ORDER BY chunk",
+            (known,),
+        ):
+            self._index_chunk(chunk, id, length, json.loads(terms))
+            added += 1
+        logger.debug(f"BM25Index picked up {added} chunks added elsewhere")
+
+    def _index_chunk(
+        self, chunk: int, id: str, length: int, frequencies: Dict[str, int]
+    ) -> None:
+        if chunk >= len(self._lengths):
+            grow = chunk + 1 - len(self._lengths)
+            self._lengths.extend([0] * grow)
+            self._alive.extend(bytes(grow))
+        self._lengths[chunk] = length
+        self._alive[chunk] = 1
+        self._chunk_of_id[id] = chunk
+        self._total_length += length
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("I"), array("H"))
+            postings[0].append(chunk)
+            postings[1].append(min(frequency, _MAX_TERM_FREQUENCY))
+            self._document_frequency[term] += 1
+
+    def _unindex_chunks(self, chunks: List[Tuple[int, str]]) -> None:
+        """Drop chunks from scoring, given their numbers and stored terms."""
+        for chunk, terms in chunks:
+            if not self._alive[chunk]:
+                continue
+            self._alive[chunk] = 0
+            self._total_length -= self._lengths[chunk]
+            self._dead += 1
+            for term in json.loads(terms):
+                self._document_frequency[term] -= 1
+                if self._document_frequency[term] <= 0:
+                    del self._document_frequency[term]
+        if self._dead > max(1000, len(self._chunk_of_id)):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Remove dropped chunks from the postings."""
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        for term in list(self._postings):
+            chunks, frequencies = self._postings[term]
+            keep = alive[np.frombuffer(chunks, dtype=np.uint32)]
+            if keep.all():
+                continue
+            if not keep.any():
+                del self._postings[term]
+                continue
+            self._postings[term] = (
+                array("I", np.frombuffer(chunks, dtype=np.uint32)[keep].tobytes()),
+                array("H", np.frombuffer(frequencies, dtype=np.uint16)[keep].tobytes()),
+            )
+        logger.debug(f"BM25Index compacted {self._dead} dropped chunks")
+        self._dead = 0
+
+    def add_documents(self, documents: List[Document]) -> None:
+        """
+        Index chunks, replacing earlier chunks with the same id.
+
+        Args:
+            documents (List[Document]): The chunks produced by the splitter.
+        """
+        if not documents:
+            return
+        ids = AbstractVectorStore.document_ids(documents)
+        records = []
+        for id, document in zip(ids, documents):
+            terms = tokenize(document.page_content)
+            metadata = AbstractVectorStore.sanitize_metadata(document.metadata)
+            records.append(
+                (
+                    id,
+                    metadata.get("location") or metadata.get("source", ""),
+                    len(terms),
+                    Counter(terms),
+                    document.page_content,
+                    json.dumps(metadata),
+                )
+            )
+
+        with self._lock:
+            with self._connection:
+                # the write lock keeps other writers out until the commit
+                self._connection.execute("BEGIN IMMEDIATE")
+                self._refresh()
+                replaced = []
+                for start in range(0, len(ids), _SQL_BATCH_SIZE):
+                    batch = ids[start : start + _SQL_BATCH_SIZE]
+                    replaced.extend(
+                        self._connection.execute(
+                            f"SELECT chunk, terms FROM chunks WHERE id IN "
+                            f"({', '.join('?' * len(batch))})",
+                            batch,
+                        )
+                    )
+                if replaced:
+                    self._connection.executemany(
+                        "DELETE FROM chunks WHERE chunk = ?",
+                        [(chunk,) for chunk, _ in replaced],
+                    )
+                chunks = [
+                    self._connection.execute(
+                        "INSERT INTO chunks (id, source, length, terms, document, "
+                        "metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                        (id, source, length, json.dumps(terms), text, metadata),
+                    ).lastrowid
+                    for id, source, length, terms, text, metadata in records
+                ]
+            if replaced:
+                self._unindex_chunks(replaced)
+            for chunk, (id, _, length, terms, _, _) in zip(chunks, records):
+                self._index_chunk(chunk, id, length, terms)
+        logger.debug(f"BM25Index added {len(records)} chunks")
+
+    def delete_documents(self, source: str) -> None:
+        """
+        Remove every chunk of a source file.
+
+        Args:
+            source (str): The absolute path of the source file.
+        """
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN IMMEDIATE")
+                self._refresh()
+                rows = self._connection.execute(
+                    "SELECT chunk, id, terms FROM chunks WHERE source = ?", (source,)
+                ).fetchall()
+                self._connection.execute(
+                    "DELETE FROM chunks WHERE source = ?", (source,)
+                )
+            for _, id, _ in rows:
+                self._chunk_of_id.pop(id, None)
+            self._unindex_chunks([(chunk, terms) for chunk, _, terms in rows])
+        logger.debug(f"BM25Index deleted {len(rows)} chunks of {source}")
+
+    def _score(self, terms: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every chunk containing a query term.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The chunk numbers and their scores.
+        """
+        count = len(self._chunk_of_id)
+        if count == 0:
+            return np.empty(0, dtype=np.uint32), np.empty(0)
+        average_length = max(self._total_length / count, 1.0)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        alive = np.frombuffer(self._alive, dtype=np.uint8)
+
+        all_chunks, all_scores = [], []
+        for term, query_frequency in Counter(terms).items():
+            postings = self._postings.get(term)
+            frequency = self._document_frequency.get(term, 0)
+            if postings is None or frequency == 0:
+                continue
+            idf = math.log(1.0 + (count - frequency + 0.5) / (frequency + 0.5))
+            chunks = np.frombuffer(postings[0], dtype=np.uint32)
+            tf = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float64)
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[chunks] / average_length)
+            scores = query_frequency * idf * tf * (self.k1 + 1.0) / (tf + norm)
+            live = alive[chunks].astype(bool)
+            all_chunks.append(chunks[live])
+            all_scores.append(scores[live])
+        if not all_chunks:
+            return np.empty(0, dtype=np.uint32), np.empty(0)
+
+        chunks = np.concatenate(all_chunks)
+        scores = np.concatenate(all_scores)
+        if len(all_chunks) > 1:
+            # sum the scores of chunks matching several terms
+            order = np.argsort(chunks, kind="stable")
+            chunks, scores = chunks[order], scores[order]
+            starts = np.flatnonzero(np.r_[True, chunks[1:] != chunks[:-1]])
+            chunks, scores = chunks[starts], np.add.reduceat(scores, starts)
+        return chunks, scores
+
+    def search(
+        self, query: str, k: int = 4, filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Find the chunks that best match a query's terms.
+
+        Args:
+            query (str): The query text.
+            k (int): The number of results.
+            filters (Optional[Dict[str, Any]]): A metadata filter, see
+                matches_filters.
+
+        Returns:
+            List[Tuple[Document, float]]: The matching chunks and their BM25
+            scores, highest first.
+        """
+        terms = tokenize(query)
+        with self._lock:
+            self._refresh()
+            chunks, scores = self._score(terms)
+            if len(chunks) == 0 or k <= 0:
+                return []
+            order = np.argsort(-scores, kind="stable")
+            results: List[Tuple[Document, float]] = []
+            batch = k if not filters else k * _FILTER_FETCH_FACTOR
+            for start in range(0, len(order), batch):
+                selected = order[start : start + batch]
+                documents = self._load_documents([int(c) for c in chunks[selected]])
+                for chunk, score in zip(chunks[selected], scores[selected]):
+                    # removed by another process since the last refresh
+                    document = documents.get(int(chunk))
+                    if document is None:
+                        continue
+                    if matches_filters(document.metadata, filters):
+                        results.append((document, float(score)))
+                        if len(results) == k:
+                            return results
+            return results
+
+    def batch_search(
+        self,
+        queries: List[str],
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Search several queries.
+
+        Args:
+            queries (List[str]): The query texts.
+            k (int): The number of results per query.
+            filters (Optional[Dict[str, Any]]): A metadata filter.
+
+        Returns:
+            List[List[Tuple[Document, float]]]: The results of every query.
+        """
+        return [self.search(query, k, filters) for query in queries]
+
+    def _load_documents(self, chunks: List[int]) -> Dict[int, Document]:
+        documents: Dict[int, Document] = {}
+        for start in range(0, len(chunks), _SQL_BATCH_SIZE):
+            batch = chunks[start : start + _SQL_BATCH_SIZE]
+            rows = self._connection.execute(
+                f"SELECT chunk, id, document, metadata FROM chunks WHERE chunk IN "
+                f"({', '.join('?' * len(batch))})",
+                batch,
+            )
+            for chunk, id, document, metadata in rows:
+                documents[chunk] = Document(
+                    id=id, page_content=document, metadata=json.loads(metadata)
+                )
+        return documents
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get the size of the index.
+
+        Returns:
+            Dict[str, float]: The number of chunks and terms, the average chunk
+            length in terms and the bytes held by the postings.
+        """
+        with self._lock:
+            self._refresh()
+            count = len(self._chunk_of_id)
+            return {
+                "chunks": count,
+                "terms": len(self._document_frequency),
+                "average_length": self._total_length / count if count else 0.0,
+                "postings_bytes": sum(
+                    chunks.itemsize * len(chunks) + tfs.itemsize * len(tfs)
+                    for chunks, tfs in self._postings.values()
+                ),
+            }
+
+    def close(self) -> None:
+        """
+        Close the underlying database connection.
+        """
+        with self._lock:
+            self._connection.close()
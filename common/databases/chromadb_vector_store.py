@@ -1,11 +1,18 @@
-from abc import ABC, abstractmethod
 import os
-from typing import List
+import queue
+import threading
 import uuid
+from typing import Any, Dict, List, Optional, Tuple
 import chromadb
 from langchain.schema import Document
 
 from common.databases.abstract_vector_store import AbstractVectorStore
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# sentinel placed on the write queue to stop the writer thread
+_STOP = object()
 
 
 class ChromadbVectorStore(AbstractVectorStore):
@@ -13,24 +20,211 @@ class ChromadbVectorStore(AbstractVectorStore):
     def __init__(self) -> None:
         _database_file_path = os.environ.get("CHROMADB_FILE_PATH", "chromadb.sqlite")
         _collection_name = os.environ.get("CHROMADB_COLLECTION_NAME", "documents")
+        _max_batch_size = int(os.environ.get("CHROMADB_MAX_BATCH_SIZE", "5000"))
+        _async_writes = os.environ.get("CHROMADB_ASYNC_WRITES", "false").lower()
+        _write_queue_size = int(os.environ.get("CHROMADB_WRITE_QUEUE_SIZE", "16"))
 
         _client = chromadb.PersistentClient(path=_database_file_path)
-        _collection = _client.create_collection(_collection_name)
+        # the store is long lived and reopened on config changes, so the
+        # collection may already exist
+        _collection = _client.get_or_create_collection(_collection_name)
+        self.client = _client
         self.collection = _collection
+        # never send more records than the server accepts in one call
+        self.max_batch_size = max(
+            1, min(_max_batch_size, _client.get_max_batch_size())
+        )
+
+        # bumped by every process writing to the collection after each write,
+        # so readers in other processes can tell when their results are stale
+        self._version_path = os.path.join(
+            _database_file_path, f"{_collection_name}.version"
+        )
+        self._changes = 0
+        self._writer: Optional[threading.Thread] = None
+        self._write_errors: List[Exception] = []
+        self._write_errors_lock = threading.Lock()
+        if _async_writes == "true":
+            self._write_queue: queue.Queue = queue.Queue(maxsize=_write_queue_size)
+            self._writer = threading.Thread(
+                target=self._writer_loop, name="chromadb-writer", daemon=True
+            )
+            self._writer.start()
+
+        logger.debug(
+            f"ChromadbVectorStore opened {_collection_name} at {_database_file_path} "
+            f"with batch size {self.max_batch_size}, async writes: {_async_writes}"
+        )
 
     def save_doc_embeddings(
         self, documents: List[Document], embeddings: List[List[float]]
     ) -> None:
-        ids: List[str] = []
-        docs: List[str] = []
+        """
+        Upsert chunks with their embeddings, text and metadata.
+
+        Ids are derived from the chunk's source, page and offset, so saving the
+        same chunks again overwrites them. Records are sent in batches no larger
+        than the client's maximum batch size, from a writer thread when
+        CHROMADB_ASYNC_WRITES is enabled.
+
+        Args:
+            documents (List[Document]): The chunks to store.
+            embeddings (List[List[float]]): One embedding per chunk.
+
+        Raises:
+            ValueError: If the number of documents and embeddings differ.
+        """
+        if len(documents) != len(embeddings):
+            raise ValueError(
+                f"Got {len(documents)} documents but {len(embeddings)} embeddings"
+            )
+
+        ids = self.document_ids(documents)
+        docs = [document.page_content for document in documents]
+        metadatas = [
+            self.sanitize_metadata(document.metadata) or {"source": ""}
+            for document in documents
+        ]
+
+        for start in range(0, len(ids), self.max_batch_size):
+            end = start + self.max_batch_size
+            batch = (
+                ids[start:end],
+                embeddings[start:end],
+                docs[start:end],
+                metadatas[start:end],
+            )
+            if self._writer is None:
+                self._upsert(*batch)
+            else:
+                self._write_queue.put(batch)
+        self._changes += 1
+
+    def delete_documents(self, source: str) -> None:
+        # pending writes for the source must not land after the delete
+        self.flush()
+        self.collection.delete(
+            where={"$or": [{"location": source}, {"source": source}]}
+        )
+        self._changes += 1
+        self._bump_version()
+        logger.debug(f"Deleted records of {source}")
+
+    def _upsert(self, ids, embeddings, docs, metadatas) -> None:
+        self.collection.upsert(
+            ids=ids, embeddings=embeddings, documents=docs, metadatas=metadatas
+        )
+        self._bump_version()
+        logger.debug(f"Upserted {len(ids)} records")
+
+    def _bump_version(self) -> None:
+        temporary_path = f"{self._version_path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary_path, "w") as version_file:
+            version_file.write(uuid.uuid4().hex)
+        os.replace(temporary_path, self._version_path)
+
+    def _writer_loop(self) -> None:
+        while True:
+            batch = self._write_queue.get()
+            try:
+                if batch is _STOP:
+                    return
+                self._upsert(*batch)
+            except Exception as e:
+                logger.error(f"Chromadb writer failed to upsert records: {e}")
+                with self._write_errors_lock:
+                    self._write_errors.append(e)
+            finally:
+                self._write_queue.task_done()
+
+    def _raise_write_error(self) -> None:
+        with self._write_errors_lock:
+            errors, self._write_errors = self._write_errors, []
+        if errors:
+            # every failure was logged by the writer, raise the first
+            raise errors[0]
+
+    def collection_version(self) -> Optional[str]:
+        try:
+            with open(self._version_path) as version_file:
+                persisted = version_file.read()
+        except FileNotFoundError:
+            # nothing written since versions were tracked
+            persisted = ""
+        return f"{self._changes}:{persisted}"
+
+    def flush(self) -> None:
+        """
+        Wait for the writer thread to persist every queued batch.
+
+        Callers flush before recording a write as done, so a failed batch is
+        reported to the caller that queued it.
 
-        
+        Raises:
+            Exception: The first error raised by the writer thread since the
+                last flush, if any.
+        """
+        if self._writer is not None:
+            self._write_queue.join()
+            self._raise_write_error()
 
-        for document in documents:
-            ids.append(str(uuid.uuid4()))
+    def close(self) -> None:
+        if self._writer is not None:
+            self._write_queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+            self._raise_write_error()
 
+    @staticmethod
+    def _to_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Translate a metadata filter to a Chroma where clause, which allows only
+        one key and one operator per clause.
+        """
+        if not filters:
+            return None
+        clauses = []
+        for key, condition in filters.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                clauses.append({key: {operator: operand}})
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
-        self.collection.add(documents=docs, embeddings=embeddings, ids=ids)
+    def batch_query_doc_embeddings(
+        self,
+        embeddings: List[List[float]],
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        if not embeddings:
+            return []
+        # queries must see the writes accepted so far
+        self.flush()
+        results = self.collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            where=self._to_where(filters),
+            include=["documents", "metadatas", "distances"],
+        )
 
-    def query_doc_embeddings(self, embeddings: List[float]) -> List[Document]:
-        pass
+        ranked: List[List[Tuple[Document, float]]] = []
+        for ids, docs, metadatas, distances in zip(
+            results["ids"],
+            results["documents"],
+            results["metadatas"],
+            results["distances"],
+        ):
+            matches = []
+            for id, doc, metadata, distance in zip(ids, docs, metadatas, distances):
+                if max_distance is not None and distance > max_distance:
+                    break
+                matches.append(
+                    (
+                        Document(id=id, page_content=doc or "", metadata=metadata or {}),
+                        distance,
+                    )
+                )
+            ranked.append(matches)
+        return ranked
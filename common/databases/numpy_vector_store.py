@@ -0,0 +1,839 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from common.databases.abstract_vector_store import AbstractVectorStore
+from common.databases.quantization import (
+    QUANTIZATION_KINDS,
+    Quantizer,
+    create_quantizer,
+    evaluate_quantizers,
+    kmeans,
+    load_quantizer,
+    pairwise_distances,
+)
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+_METRICS = ("cosine", "l2", "ip")
+
+# sqlite's default limit on host parameters per statement is 999 before 3.32
+_SQL_BATCH_SIZE = 900
+
+# filter operators and their SQL counterparts, see matches_filters
+_SQL_OPERATORS = {
+    "$eq": "IS",
+    "$ne": "IS NOT",
+    "$gt": ">",
+    "$gte": ">=",
+    "$lt": "<",
+    "$lte": "<=",
+}
+
+
+def _top_k(distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the k smallest distances of every row, sorted ascending.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The column indices and the distances.
+    """
+    k = min(k, distances.shape[1])
+    if k == 0:
+        empty = np.empty((distances.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    columns = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    selected = np.take_along_axis(distances, columns, axis=1)
+    order = np.argsort(selected, axis=1, kind="stable")
+    return (
+        np.take_along_axis(columns, order, axis=1),
+        np.take_along_axis(selected, order, axis=1),
+    )
+
+
+class NumpyVectorStore(AbstractVectorStore):
+    """
+    An embedded vector store backed by a memory-mapped float32 matrix.
+
+    Embeddings are appended to a raw float32 file, one row per chunk, and the
+    chunk ids, text and metadata live in a SQLite sidecar that maps ids to rows.
+    Upserts and deletes never rewrite the matrix: an upsert appends a new row and
+    repoints the id to it, and a delete drops the id, leaving the old row unused.
+
+    Queries compute exact distances with blocked matrix products over the mapped
+    file, so opening the store is instant and only the pages touched are loaded.
+    For large collections an IVF index (k-means coarse quantizer, probing the
+    nearest lists) can be built; rows appended after the index was built are
+    always searched exhaustively. With NUMPY_STORE_READ_ONLY several query worker
+    processes can share one store while an ingestion process writes to it.
+
+    With NUMPY_STORE_QUANTIZATION set to float16, int8 or pq, a compact copy of
+    every vector is kept in a codes file next to the matrix and searches scan the
+    codes instead. The best k * NUMPY_STORE_RERANK_FACTOR candidates are then
+    re-ranked against the full-precision rows on disk, so only those rows are
+    read. int8 and pq are trained once NUMPY_STORE_QUANTIZATION_TRAIN_ROWS rows
+    are stored; until then queries use the float32 matrix.
+    """
+
+    def __init__(self) -> None:
+        _store_path = os.environ.get("NUMPY_STORE_PATH", "numpy_store")
+        _metric = os.environ.get("NUMPY_STORE_METRIC", "cosine").lower()
+        _read_only = os.environ.get("NUMPY_STORE_READ_ONLY", "false").lower()
+        _block_rows = int(os.environ.get("NUMPY_STORE_BLOCK_ROWS", "65536"))
+        _ivf_lists = int(os.environ.get("NUMPY_STORE_IVF_LISTS", "0"))
+        _ivf_probes = int(os.environ.get("NUMPY_STORE_IVF_PROBES", "8"))
+        _ivf_min_rows = int(os.environ.get("NUMPY_STORE_IVF_MIN_ROWS", "50000"))
+        _quantization = os.environ.get("NUMPY_STORE_QUANTIZATION", "none").lower()
+        _pq_subvectors = int(os.environ.get("NUMPY_STORE_PQ_SUBVECTORS", "16"))
+        _train_rows = int(
+            os.environ.get("NUMPY_STORE_QUANTIZATION_TRAIN_ROWS", "10000")
+        )
+        _rerank_factor = int(os.environ.get("NUMPY_STORE_RERANK_FACTOR", "4"))
+
+        if _metric not in _METRICS:
+            raise ValueError(f"Unknown NUMPY_STORE_METRIC: {_metric}")
+        if _quantization not in ("none",) + QUANTIZATION_KINDS:
+            raise ValueError(f"Unknown NUMPY_STORE_QUANTIZATION: {_quantization}")
+
+        self.store_path = _store_path
+        self.metric = _metric
+        self.read_only = _read_only == "true"
+        self.block_rows = max(1, _block_rows)
+        self.ivf_lists = max(0, _ivf_lists)
+        self.ivf_probes = max(1, _ivf_probes)
+        self.ivf_min_rows = _ivf_min_rows
+        self.quantization = _quantization
+        self.pq_subvectors = _pq_subvectors
+        self.train_rows = max(1, _train_rows)
+        self.rerank_factor = max(0, _rerank_factor)
+
+        self._vectors_path = os.path.join(_store_path, "vectors.f32")
+        self._index_path = os.path.join(_store_path, "ivf.npz")
+        self._codes_path = os.path.join(_store_path, "codes.bin")
+        self._quantizer_path = os.path.join(_store_path, "quantizer.npz")
+        _database_path = os.path.join(_store_path, "metadata.sqlite")
+        if self.read_only:
+            self._connection = sqlite3.connect(
+                f"file:{_database_path}?mode=ro", uri=True, check_same_thread=False
+            )
+        else:
+            os.makedirs(_store_path, exist_ok=True)
+            self._connection = sqlite3.connect(
+                _database_path, check_same_thread=False
+            )
+            with self._connection:
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS records (
+                        row INTEGER PRIMARY KEY,
+                        id TEXT NOT NULL UNIQUE,
+                        source TEXT NOT NULL,
+                        document TEXT NOT NULL,
+                        metadata TEXT NOT NULL
+                    )
+                    """
+                )
+                self._connection.execute(
+                    "CREATE INDEX IF NOT EXISTS records_source ON records (source)"
+                )
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS info "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+                )
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO info VALUES ('metric', ?)", (_metric,)
+                )
+
+        self._lock = threading.RLock()
+        self._dimension = 0
+        self._rows = 0
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._data_version = -1
+        self._changes = 0
+        self._index: Optional[Dict[str, np.ndarray]] = None
+        self._index_mtime = 0.0
+        self._quantizer: Optional[Quantizer] = None
+        self._quantizer_mtime = 0.0
+        self._codes = np.empty((0, 0), dtype=np.uint8)
+        self._codes_rows = 0
+        self._refresh()
+
+        logger.debug(
+            f"NumpyVectorStore opened {_store_path} with {int(self._alive.sum())} "
+            f"records, metric {_metric}, read only: {self.read_only}"
+        )
+
+    # loading
+
+    def _read_info(self) -> None:
+        info = dict(self._connection.execute("SELECT key, value FROM info"))
+        stored_metric = info.get("metric", self.metric)
+        if stored_metric != self.metric:
+            raise ValueError(
+                f"Store {self.store_path} uses metric {stored_metric}, "
+                f"not {self.metric}"
+            )
+        self._dimension = int(info.get("dimension", 0))
+
+    def _map_rows(self) -> None:
+        """Map the rows of the vector file written so far."""
+        if self._dimension == 0 or not os.path.exists(self._vectors_path):
+            self._rows = 0
+            self._matrix = np.empty((0, self._dimension), dtype=np.float32)
+            return
+        row_bytes = self._dimension * 4
+        # a partially written trailing row is not visible yet
+        rows = os.path.getsize(self._vectors_path) // row_bytes
+        if rows == self._rows:
+            return
+        self._matrix = (
+            np.memmap(
+                self._vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(rows, self._dimension),
+            )
+            if rows
+            else np.empty((0, self._dimension), dtype=np.float32)
+        )
+        if self.metric == "l2" and rows > len(self._sq_norms):
+            self._sq_norms = np.concatenate(
+                [self._sq_norms, self._row_sq_norms(len(self._sq_norms), rows)]
+            )
+        self._rows = rows
+
+    def _row_sq_norms(self, start: int, end: int) -> np.ndarray:
+        norms = [
+            np.einsum("ij,ij->i", block, block)
+            for block in (
+                self._matrix[i : min(end, i + self.block_rows)]
+                for i in range(start, end, self.block_rows)
+            )
+        ]
+        return np.concatenate(norms) if norms else np.empty(0, dtype=np.float32)
+
+    def _refresh(self) -> None:
+        """
+        Reload the row mapping and the live rows when another connection
+        committed changes, e.g. the ingestion process writing to a store shared
+        with read-only query workers.
+        """
+        with self._lock:
+            data_version = self._connection.execute(
+                "PRAGMA data_version"
+            ).fetchone()[0]
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            self._changes += 1
+            self._read_info()
+            self._map_rows()
+            alive = np.zeros(self._rows, dtype=bool)
+            live_rows = np.fromiter(
+                (row for (row,) in self._connection.execute("SELECT row FROM records")),
+                dtype=np.int64,
+            )
+            alive[live_rows[live_rows < self._rows]] = True
+            self._alive = alive
+            self._load_index()
+            self._load_quantizer()
+
+    def _load_index(self) -> None:
+        if not os.path.exists(self._index_path):
+            self._index = None
+            return
+        mtime = os.path.getmtime(self._index_path)
+        if self._index is not None and mtime == self._index_mtime:
+            return
+        with np.load(self._index_path) as index:
+            self._index = {name: index[name] for name in index.files}
+        self._index_mtime = mtime
+        if self._index["centroids"].shape[1] != self._dimension:
+            logger.warning("Ignoring IVF index of a different dimension")
+            self._index = None
+
+    def _load_quantizer(self) -> None:
+        if not os.path.exists(self._quantizer_path):
+            self._quantizer = None
+            self._codes_rows = 0
+            return
+        mtime = os.path.getmtime(self._quantizer_path)
+        if self._quantizer is None or mtime != self._quantizer_mtime:
+            with np.load(self._quantizer_path) as arrays:
+                self._quantizer = load_quantizer(dict(arrays))
+            self._quantizer_mtime = mtime
+            self._codes_rows = 0
+        self._map_codes()
+
+    def _map_codes(self) -> None:
+        """Map the codes of the rows encoded so far."""
+        quantizer = self._quantizer
+        rows = 0
+        if os.path.exists(self._codes_path):
+            rows = min(
+                self._rows, os.path.getsize(self._codes_path) // quantizer.code_size
+            )
+        if rows == self._codes_rows:
+            return
+        self._codes = np.memmap(
+            self._codes_path,
+            dtype=quantizer.code_dtype,
+            mode="r",
+            shape=(rows, quantizer.code_length),
+        )
+        self._codes_rows = rows
+
+    # writing
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise RuntimeError(f"NumpyVectorStore {self.store_path} is read only")
+
+    def _prepare(self, embeddings: List[List[float]]) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError("Embeddings must all have the same dimension")
+        if self.metric == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+        return vectors
+
+    def save_doc_embeddings(
+        self, documents: List[Document], embeddings: List[List[float]]
+    ) -> None:
+        """
+        Upsert chunks by appending their embeddings and repointing their ids.
+
+        Args:
+            documents (List[Document]): The chunks to store.
+            embeddings (List[List[float]]): One embedding per chunk.
+
+        Raises:
+            ValueError: If the number of documents and embeddings differ, or the
+                embedding dimension does not match the store.
+            RuntimeError: If the store is read only.
+        """
+        self._check_writable()
+        if len(documents) != len(embeddings):
+            raise ValueError(
+                f"Got {len(documents)} documents but {len(embeddings)} embeddings"
+            )
+        if not documents:
+            return
+        vectors = self._prepare(embeddings)
+        ids = self.document_ids(documents)
+
+        with self._lock:
+            self._refresh()
+            if self._dimension == 0:
+                self._dimension = vectors.shape[1]
+                with self._connection:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO info VALUES ('dimension', ?)",
+                        (str(self._dimension),),
+                    )
+                self._sq_norms = np.empty(0, dtype=np.float32)
+            if vectors.shape[1] != self._dimension:
+                raise ValueError(
+                    f"Got embeddings of dimension {vectors.shape[1]}, "
+                    f"the store holds {self._dimension}"
+                )
+
+            # the vectors land before the rows pointing at them are committed
+            first_row = self._rows
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(first_row * self._dimension * 4)
+                f.write(vectors.tobytes())
+            replaced = self._rows_of_ids(ids)
+            records = []
+            for offset, (id, document) in enumerate(zip(ids, documents)):
+                metadata = self.sanitize_metadata(document.metadata)
+                records.append(
+                    (
+                        first_row + offset,
+                        id,
+                        metadata.get("location") or metadata.get("source", ""),
+                        document.page_content,
+                        json.dumps(metadata),
+                    )
+                )
+            with self._connection:
+                self._connection.executemany(
+                    """
+                    INSERT INTO records (row, id, source, document, metadata)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        row = excluded.row,
+                        source = excluded.source,
+                        document = excluded.document,
+                        metadata = excluded.metadata
+                    """,
+                    records,
+                )
+
+            self._map_rows()
+            alive = np.zeros(self._rows, dtype=bool)
+            alive[: len(self._alive)] = self._alive
+            alive[replaced] = False
+            alive[first_row : first_row + len(ids)] = True
+            self._alive = alive
+            self._changes += 1
+            self._quantize()
+            self._data_version = self._connection.execute(
+                "PRAGMA data_version"
+            ).fetchone()[0]
+        logger.debug(f"Appended {len(ids)} records at row {first_row}")
+
+    def _rows_of_ids(self, ids: List[str]) -> List[int]:
+        rows: List[int] = []
+        for start in range(0, len(ids), _SQL_BATCH_SIZE):
+            batch = ids[start : start + _SQL_BATCH_SIZE]
+            rows.extend(
+                row
+                for (row,) in self._connection.execute(
+                    f"SELECT row FROM records WHERE id IN "
+                    f"({', '.join('?' * len(batch))})",
+                    batch,
+                )
+            )
+        return rows
+
+    def delete_documents(self, source: str) -> None:
+        self._check_writable()
+        with self._lock:
+            self._refresh()
+            rows = [
+                row
+                for (row,) in self._connection.execute(
+                    "SELECT row FROM records WHERE source = ?", (source,)
+                )
+            ]
+            with self._connection:
+                self._connection.execute(
+                    "DELETE FROM records WHERE source = ?", (source,)
+                )
+            self._alive[[row for row in rows if row < len(self._alive)]] = False
+            self._changes += 1
+        logger.debug(f"Deleted {len(rows)} records of {source}")
+
+    def _quantize(self) -> None:
+        """
+        Train the quantizer once enough rows are stored, then encode every row
+        that has no codes yet.
+        """
+        if self.quantization == "none":
+            return
+        with self._lock:
+            quantizer = self._quantizer
+            if quantizer is not None and quantizer.kind != self.quantization:
+                # the quantization was changed, encode everything again
+                os.remove(self._quantizer_path)
+                self._quantizer = None
+            if self._quantizer is None:
+                live_rows = np.flatnonzero(self._alive)
+                needed = 1 if self.quantization == "float16" else self.train_rows
+                if len(live_rows) < needed:
+                    return
+                self._train_quantizer(live_rows)
+
+            quantizer = self._quantizer
+            with open(self._codes_path, "ab") as f:
+                f.truncate(self._codes_rows * quantizer.code_size)
+                for start in range(self._codes_rows, self._rows, self.block_rows):
+                    end = min(self._rows, start + self.block_rows)
+                    codes = quantizer.encode(np.asarray(self._matrix[start:end]))
+                    f.write(codes.astype(quantizer.code_dtype).tobytes())
+            self._map_codes()
+
+    def _train_quantizer(self, live_rows: np.ndarray) -> None:
+        rng = np.random.default_rng(0)
+        sample = np.sort(
+            rng.choice(live_rows, min(len(live_rows), self.train_rows), replace=False)
+        )
+        quantizer = create_quantizer(
+            self.quantization, self._dimension, self.pq_subvectors
+        )
+        quantizer.train(np.asarray(self._matrix[sample], dtype=np.float32))
+
+        temporary_path = f"{self._quantizer_path}.tmp.npz"
+        np.savez(temporary_path, **quantizer.to_arrays())
+        # codes of an earlier quantizer are meaningless to this one
+        if os.path.exists(self._codes_path):
+            os.remove(self._codes_path)
+        os.replace(temporary_path, self._quantizer_path)
+        self._quantizer = quantizer
+        self._quantizer_mtime = os.path.getmtime(self._quantizer_path)
+        self._codes_rows = 0
+        logger.info(
+            f"Trained {self.quantization} quantizer on {len(sample)} rows, "
+            f"{quantizer.code_size} bytes per vector instead of "
+            f"{self._dimension * 4}"
+        )
+
+    def collection_version(self) -> Optional[str]:
+        with self._lock:
+            self._refresh()
+            return str(self._changes)
+
+    def flush(self) -> None:
+        """
+        Train the quantizer when enough rows are stored, and rebuild the IVF
+        index when it is enabled and a fifth of the live rows were appended
+        after it was built.
+        """
+        if self.read_only:
+            return
+        self._quantize()
+        if self.ivf_lists == 0:
+            return
+        with self._lock:
+            live = int(self._alive.sum())
+            indexed = 0 if self._index is None else int(self._index["rows"][0])
+            if live < self.ivf_min_rows or self._rows - indexed <= live // 5:
+                return
+        self.build_index()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._connection.close()
+
+    # indexing
+
+    def build_index(self, iterations: int = 10) -> None:
+        """
+        Build the IVF index: cluster a sample of the live rows with k-means into
+        NUMPY_STORE_IVF_LISTS centroids and assign every live row to its nearest
+        centroid. The index is written atomically next to the vector file, so
+        read-only workers pick it up on their next query.
+
+        Args:
+            iterations (int): The number of k-means iterations.
+
+        Raises:
+            RuntimeError: If the store is read only.
+        """
+        self._check_writable()
+        with self._lock:
+            rows = self._rows
+            live_rows = np.flatnonzero(self._alive[:rows])
+        lists = min(max(1, self.ivf_lists), len(live_rows))
+        if lists == 0:
+            return
+
+        rng = np.random.default_rng(0)
+        sample_size = min(len(live_rows), lists * 64)
+        sample = np.sort(rng.choice(live_rows, sample_size, replace=False))
+        centroids = kmeans(
+            np.asarray(self._matrix[sample], dtype=np.float32), lists, iterations
+        )
+        if self.metric == "cosine":
+            centroids /= np.maximum(
+                np.linalg.norm(centroids, axis=1, keepdims=True),
+                np.finfo(np.float32).tiny,
+            )
+
+        assignment = np.concatenate(
+            [
+                self._nearest_centroids(
+                    np.asarray(self._matrix[block]), centroids, 1
+                )[:, 0]
+                for block in np.array_split(
+                    live_rows, max(1, len(live_rows) // self.block_rows)
+                )
+            ]
+        )
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignment, minlength=lists))]
+        )
+
+        temporary_path = f"{self._index_path}.tmp.npz"
+        np.savez(
+            temporary_path,
+            centroids=centroids.astype(np.float32),
+            offsets=offsets.astype(np.int64),
+            list_rows=live_rows[order].astype(np.int64),
+            rows=np.array([rows], dtype=np.int64),
+        )
+        os.replace(temporary_path, self._index_path)
+        with self._lock:
+            self._load_index()
+        logger.info(f"Built IVF index with {lists} lists over {len(live_rows)} rows")
+
+    def evaluate_quantization(
+        self, k: int = 10, queries: int = 100, sample_rows: int = 20000
+    ) -> List[Dict[str, float]]:
+        """
+        Report the recall and memory of every quantization on the stored
+        vectors, to choose NUMPY_STORE_QUANTIZATION. Stored vectors held out of
+        the sample are used as queries.
+
+        Args:
+            k (int): The number of neighbours compared.
+            queries (int): The number of queries.
+            sample_rows (int): The number of stored rows searched.
+
+        Returns:
+            List[Dict[str, float]]: See evaluate_quantizers.
+        """
+        with self._lock:
+            self._refresh()
+            live_rows = np.flatnonzero(self._alive)
+        rng = np.random.default_rng(0)
+        picked = rng.choice(
+            live_rows, min(len(live_rows), sample_rows + queries), replace=False
+        )
+        if len(picked) <= queries:
+            raise ValueError(f"Need more than {queries} stored rows to evaluate")
+        vectors = np.asarray(self._matrix[np.sort(picked)], dtype=np.float32)
+        return evaluate_quantizers(
+            vectors[queries:],
+            vectors[:queries],
+            self.metric,
+            k,
+            subvectors=self.pq_subvectors,
+            rerank_factor=self.rerank_factor,
+        )
+
+    def _nearest_centroids(
+        self, vectors: np.ndarray, centroids: np.ndarray, count: int
+    ) -> np.ndarray:
+        distances = self._distances(
+            vectors, centroids, np.einsum("ij,ij->i", centroids, centroids)
+        )
+        return _top_k(distances, count)[0]
+
+    # querying
+
+    def _distances(
+        self, queries: np.ndarray, vectors: np.ndarray, sq_norms: np.ndarray
+    ) -> np.ndarray:
+        return pairwise_distances(queries, vectors, self.metric, sq_norms)
+
+    def _vector_sq_norms(self, rows) -> Optional[np.ndarray]:
+        # only the l2 distance uses the row norms
+        return self._sq_norms[rows] if self.metric == "l2" else None
+
+    def _full_distances(self, queries: np.ndarray, rows) -> np.ndarray:
+        return self._distances(
+            queries, self._matrix[rows], self._vector_sq_norms(rows)
+        )
+
+    def _scan_distances(self, queries: np.ndarray, rows) -> np.ndarray:
+        """
+        Compute the distances used to pick candidates: from the codes when the
+        rows are quantized, otherwise from the float32 matrix.
+
+        Args:
+            queries (np.ndarray): The query vectors.
+            rows: A slice or a sorted array of row indices.
+        """
+        quantizer, covered = self._quantizer, self._codes_rows
+        if quantizer is None or covered == 0:
+            return self._full_distances(queries, rows)
+        if isinstance(rows, slice):
+            if rows.stop <= covered:
+                return quantizer.distances(queries, self._codes[rows], self.metric)
+            rows = np.arange(rows.start, rows.stop)
+        inside = rows < covered
+        distances = np.empty((len(queries), len(rows)), dtype=np.float32)
+        distances[:, inside] = quantizer.distances(
+            queries, self._codes[rows[inside]], self.metric
+        )
+        # rows appended since the last encoding
+        if not inside.all():
+            distances[:, ~inside] = self._full_distances(queries, rows[~inside])
+        return distances
+
+    def _rerank(
+        self, queries: np.ndarray, rows: np.ndarray, distances: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-rank candidates picked from the codes with the float32 rows."""
+        ranked_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        ranked_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            candidates = np.sort(rows[i][np.isfinite(distances[i])])
+            if len(candidates) == 0:
+                continue
+            columns, exact = _top_k(
+                self._full_distances(query[None, :], candidates), k
+            )
+            ranked_rows[i, : columns.shape[1]] = candidates[columns[0]]
+            ranked_distances[i, : columns.shape[1]] = exact[0]
+        return ranked_rows, ranked_distances
+
+    def _filter_mask(
+        self, alive: np.ndarray, filters: Optional[Dict[str, Any]]
+    ) -> np.ndarray:
+        if not filters:
+            return alive
+        clauses: List[str] = []
+        parameters: List[Any] = []
+        for key, condition in filters.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            field = "json_extract(metadata, ?)"
+            path = '$."' + key.replace('"', '\\"') + '"'
+            for operator, operand in condition.items():
+                if operator in ("$in", "$nin"):
+                    operand = list(operand)
+                    placeholders = ", ".join("?" * len(operand))
+                    clauses.append(
+                        f"{field} IN ({placeholders})"
+                        if operator == "$in"
+                        else f"({field} IS NULL OR {field} NOT IN ({placeholders}))"
+                    )
+                    parameters.extend(
+                        [path, *operand] if operator == "$in" else [path, path, *operand]
+                    )
+                elif operator in _SQL_OPERATORS:
+                    clauses.append(f"{field} {_SQL_OPERATORS[operator]} ?")
+                    parameters.extend([path, operand])
+                else:
+                    raise ValueError(f"Unknown filter operator: {operator}")
+        matching = np.fromiter(
+            (
+                row
+                for (row,) in self._connection.execute(
+                    f"SELECT row FROM records WHERE {' AND '.join(clauses)}",
+                    parameters,
+                )
+            ),
+            dtype=np.int64,
+        )
+        mask = np.zeros_like(alive)
+        mask[matching[matching < len(mask)]] = True
+        return mask & alive
+
+    def _exact_search(
+        self, queries: np.ndarray, mask: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_distances = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(mask), self.block_rows):
+            end = min(len(mask), start + self.block_rows)
+            valid = mask[start:end]
+            if not valid.any():
+                continue
+            distances = self._scan_distances(queries, slice(start, end))
+            distances[:, ~valid] = np.inf
+            rows, distances = _top_k(distances, k)
+            rows = np.concatenate([best_rows, rows + start], axis=1)
+            distances = np.concatenate([best_distances, distances], axis=1)
+            columns, best_distances = _top_k(distances, k)
+            best_rows = np.take_along_axis(rows, columns, axis=1)
+        return best_rows, best_distances
+
+    def _ivf_search(
+        self, queries: np.ndarray, mask: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        index = self._index
+        offsets, list_rows = index["offsets"], index["list_rows"]
+        # rows appended since the index was built are not in any list
+        tail = np.arange(min(int(index["rows"][0]), len(mask)), len(mask))
+        probes = self._nearest_centroids(
+            queries, index["centroids"], min(self.ivf_probes, len(offsets) - 1)
+        )
+
+        all_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        all_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            candidates = np.concatenate(
+                [list_rows[offsets[p] : offsets[p + 1]] for p in probes[i]] + [tail]
+            )
+            candidates = candidates[candidates < len(mask)]
+            candidates = np.sort(candidates[mask[candidates]])
+            if len(candidates) == 0:
+                continue
+            distances = self._scan_distances(query[None, :], candidates)
+            columns, distances = _top_k(distances, k)
+            all_rows[i, : columns.shape[1]] = candidates[columns[0]]
+            all_distances[i, : columns.shape[1]] = distances[0]
+        return all_rows, all_distances
+
+    def _load_documents(self, rows: List[int]) -> Dict[int, Document]:
+        documents: Dict[int, Document] = {}
+        for start in range(0, len(rows), _SQL_BATCH_SIZE):
+            batch = rows[start : start + _SQL_BATCH_SIZE]
+            for row, id, document, metadata in self._connection.execute(
+                f"SELECT row, id, document, metadata FROM records WHERE row IN "
+                f"({', '.join('?' * len(batch))})",
+                batch,
+            ):
+                documents[row] = Document(
+                    id=id, page_content=document, metadata=json.loads(metadata)
+                )
+        return documents
+
+    def batch_query_doc_embeddings(
+        self,
+        embeddings: List[List[float]],
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Find the nearest chunks of several query vectors with one matrix product
+        per block of rows, or by probing the IVF index when one is built. With
+        quantization the candidates found from the codes are re-ranked with
+        the full-precision vectors.
+
+        Distances are 1 - cosine similarity, squared euclidean distance or the
+        negated inner product, depending on NUMPY_STORE_METRIC.
+        """
+        if not embeddings or k <= 0:
+            return [[] for _ in embeddings]
+        queries = self._prepare(embeddings)
+
+        with self._lock:
+            self._refresh()
+            if self._dimension == 0:
+                return [[] for _ in embeddings]
+            if queries.shape[1] != self._dimension:
+                raise ValueError(
+                    f"Got queries of dimension {queries.shape[1]}, "
+                    f"the store holds {self._dimension}"
+                )
+            mask = self._filter_mask(self._alive, filters)
+            # a selective filter could leave the probed lists empty, so filtered
+            # queries are answered exactly
+            use_index = self._index is not None and not filters
+            rerank = self._codes_rows > 0 and self.rerank_factor > 0
+        candidates = k * self.rerank_factor if rerank else k
+
+        if use_index:
+            rows, distances = self._ivf_search(queries, mask, candidates)
+        else:
+            rows, distances = self._exact_search(queries, mask, candidates)
+        if rerank:
+            rows, distances = self._rerank(queries, rows, distances, k)
+
+        with self._lock:
+            documents = self._load_documents(
+                sorted({int(row) for row in rows[np.isfinite(distances)]})
+            )
+
+        ranked: List[List[Tuple[Document, float]]] = []
+        for query_rows, query_distances in zip(rows, distances):
+            matches = []
+            for row, distance in zip(query_rows, query_distances):
+                if not np.isfinite(distance) or (
+                    max_distance is not None and distance > max_distance
+                ):
+                    break
+                document = documents.get(int(row))
+                # the row may have been replaced since the search
+                if document is not None:
+                    matches.append((document, float(distance)))
+            ranked.append(matches)
+        return ranked
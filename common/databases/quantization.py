@@ -0,0 +1,422 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+QUANTIZATION_KINDS = ("float16", "int8", "pq")
+
+
+def pairwise_distances(
+    queries: np.ndarray,
+    vectors: np.ndarray,
+    metric: str,
+    sq_norms: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Compute the distance of every query to every vector.
+
+    Args:
+        queries (np.ndarray): The query vectors, one per row.
+        vectors (np.ndarray): The stored vectors, one per row.
+        metric (str): "cosine" (vectors must be normalized), "l2" for the
+            squared euclidean distance, or "ip" for the negated inner product.
+        sq_norms (Optional[np.ndarray]): The vectors' squared norms, for l2.
+
+    Returns:
+        np.ndarray: A (queries, vectors) matrix of distances.
+    """
+    products = queries @ vectors.T
+    if metric == "cosine":
+        return 1.0 - products
+    if metric == "ip":
+        return -products
+    if sq_norms is None:
+        sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+    query_sq_norms = np.einsum("ij,ij->i", queries, queries)
+    return np.maximum(
+        query_sq_norms[:, None] + sq_norms[None, :] - 2.0 * products, 0.0
+    )
+
+
+def kmeans(
+    vectors: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0
+) -> np.ndarray:
+    """
+    Cluster vectors with Lloyd's k-means under the euclidean distance.
+
+    Args:
+        vectors (np.ndarray): The training vectors, one per row.
+        clusters (int): The number of centroids, at most the number of vectors.
+        iterations (int): The number of assignment and update rounds.
+        seed (int): Seeds the choice of initial centroids.
+
+    Returns:
+        np.ndarray: The (clusters, dimension) centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmin(pairwise_distances(vectors, centroids, "l2"), axis=1)
+        counts = np.bincount(assignment, minlength=clusters)
+        nonempty = counts > 0
+        # sum the members of every cluster in one pass over the sorted vectors
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums = np.add.reduceat(
+            vectors[np.argsort(assignment, kind="stable")], starts, axis=0
+        )
+        # empty clusters keep their previous centroid
+        centroids[nonempty] = sums / counts[nonempty, None]
+    return centroids.astype(np.float32)
+
+
+class Quantizer(ABC):
+    """
+    Encodes float32 vectors into compact codes and computes approximate distances
+    from query vectors directly against those codes.
+    """
+
+    kind = ""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    @property
+    @abstractmethod
+    def code_length(self) -> int:
+        """The number of code elements of one encoded vector."""
+        pass
+
+    @property
+    @abstractmethod
+    def code_dtype(self) -> np.dtype:
+        """The element type of the codes."""
+        pass
+
+    @property
+    def code_size(self) -> int:
+        """The number of bytes of one encoded vector."""
+        return self.code_length * self.code_dtype.itemsize
+
+    def train(self, vectors: np.ndarray) -> None:
+        """
+        Fit the quantizer's parameters to a sample of the vectors.
+
+        Args:
+            vectors (np.ndarray): The training sample, one vector per row.
+        """
+        pass
+
+    @abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Encode vectors.
+
+        Args:
+            vectors (np.ndarray): The float32 vectors, one per row.
+
+        Returns:
+            np.ndarray: One row of codes per vector.
+        """
+        pass
+
+    @abstractmethod
+    def distances(
+        self, queries: np.ndarray, codes: np.ndarray, metric: str
+    ) -> np.ndarray:
+        """
+        Compute approximate distances from full-precision queries to codes.
+
+        Args:
+            queries (np.ndarray): The float32 query vectors.
+            codes (np.ndarray): The encoded vectors.
+            metric (str): The distance metric, see pairwise_distances.
+
+        Returns:
+            np.ndarray: A (queries, codes) matrix of distances.
+        """
+        pass
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Get the quantizer's parameters, for saving with numpy.savez.
+
+        Returns:
+            Dict[str, np.ndarray]: The parameters, including the kind.
+        """
+        return {"kind": np.array(self.kind), "dimension": np.array(self.dimension)}
+
+
+class Float16Quantizer(Quantizer):
+    """Stores every component as a half precision float, halving the memory."""
+
+    kind = "float16"
+
+    @property
+    def code_length(self) -> int:
+        return self.dimension
+
+    @property
+    def code_dtype(self) -> np.dtype:
+        return np.dtype(np.float16)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.astype(np.float16)
+
+    def distances(
+        self, queries: np.ndarray, codes: np.ndarray, metric: str
+    ) -> np.ndarray:
+        return pairwise_distances(queries, codes.astype(np.float32), metric)
+
+
+class Int8Quantizer(Quantizer):
+    """
+    Scalar quantization: every component is mapped linearly to 256 levels
+    between its minimum and maximum in the training sample, using a quarter of
+    the memory.
+    """
+
+    kind = "int8"
+
+    def __init__(
+        self,
+        dimension: int,
+        low: Optional[np.ndarray] = None,
+        scale: Optional[np.ndarray] = None,
+    ):
+        super().__init__(dimension)
+        self.low = low
+        self.scale = scale
+
+    @property
+    def code_length(self) -> int:
+        return self.dimension
+
+    @property
+    def code_dtype(self) -> np.dtype:
+        return np.dtype(np.uint8)
+
+    def train(self, vectors: np.ndarray) -> None:
+        self.low = vectors.min(axis=0).astype(np.float32)
+        high = vectors.max(axis=0).astype(np.float32)
+        self.scale = np.maximum(high - self.low, np.finfo(np.float32).tiny) / 255.0
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        levels = np.rint((vectors - self.low) / self.scale)
+        return np.clip(levels, 0, 255).astype(np.uint8)
+
+    def distances(
+        self, queries: np.ndarray, codes: np.ndarray, metric: str
+    ) -> np.ndarray:
+        decoded = self.low + codes.astype(np.float32) * self.scale
+        return pairwise_distances(queries, decoded, metric)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {**super().to_arrays(), "low": self.low, "scale": self.scale}
+
+
+class ProductQuantizer(Quantizer):
+    """
+    Product quantization: the vector is cut into subvectors, each replaced by
+    the index of its nearest of 256 centroids learned for that subspace, so a
+    vector takes one byte per subvector. Distances are computed asymmetrically,
+    from the full-precision query to the centroids, with one lookup table per
+    subspace.
+    """
+
+    kind = "pq"
+
+    def __init__(
+        self,
+        dimension: int,
+        subvectors: int = 16,
+        codebooks: Optional[np.ndarray] = None,
+    ):
+        super().__init__(dimension)
+        subvectors = min(max(1, subvectors), dimension)
+        # subspaces differ by at most one dimension when it does not divide evenly
+        self.bounds = np.linspace(0, dimension, subvectors + 1).astype(np.int64)
+        # the centroids of all subspaces side by side: codebooks[:, a:b] holds the
+        # centroids of the subspace spanning dimensions a to b
+        self.codebooks = codebooks
+
+    @property
+    def subvectors(self) -> int:
+        return len(self.bounds) - 1
+
+    @property
+    def code_length(self) -> int:
+        return self.subvectors
+
+    @property
+    def code_dtype(self) -> np.dtype:
+        return np.dtype(np.uint8)
+
+    def _subspaces(self):
+        return zip(self.bounds[:-1], self.bounds[1:])
+
+    def train(self, vectors: np.ndarray, iterations: int = 10) -> None:
+        clusters = min(256, len(vectors))
+        self.codebooks = np.concatenate(
+            [
+                kmeans(vectors[:, start:end], clusters, iterations, seed=m)
+                for m, (start, end) in enumerate(self._subspaces())
+            ],
+            axis=1,
+        )
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.subvectors), dtype=np.uint8)
+        for m, (start, end) in enumerate(self._subspaces()):
+            codes[:, m] = np.argmin(
+                pairwise_distances(
+                    vectors[:, start:end], self.codebooks[:, start:end], "l2"
+                ),
+                axis=1,
+            )
+        return codes
+
+    def distances(
+        self, queries: np.ndarray, codes: np.ndarray, metric: str
+    ) -> np.ndarray:
+        distances = np.zeros((len(queries), len(codes)), dtype=np.float32)
+        for m, (start, end) in enumerate(self._subspaces()):
+            # the distance of every query subvector to every centroid of the
+            # subspace, looked up by each code
+            table = pairwise_distances(
+                queries[:, start:end],
+                self.codebooks[:, start:end],
+                "l2" if metric == "l2" else "ip",
+            )
+            distances += table[:, codes[:, m]]
+        return distances + 1.0 if metric == "cosine" else distances
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            **super().to_arrays(),
+            "subvectors": np.array(self.subvectors),
+            "codebooks": self.codebooks,
+        }
+
+
+def create_quantizer(kind: str, dimension: int, subvectors: int = 16) -> Quantizer:
+    """
+    Create an untrained quantizer.
+
+    Args:
+        kind (str): "float16", "int8" or "pq".
+        dimension (int): The vector dimension.
+        subvectors (int): The number of product quantization subvectors.
+
+    Returns:
+        Quantizer: The quantizer.
+
+    Raises:
+        ValueError: If the kind is unknown.
+    """
+    if kind == "float16":
+        return Float16Quantizer(dimension)
+    if kind == "int8":
+        return Int8Quantizer(dimension)
+    if kind == "pq":
+        return ProductQuantizer(dimension, subvectors)
+    raise ValueError(f"Unknown quantization: {kind}")
+
+
+def load_quantizer(arrays: Dict[str, np.ndarray]) -> Quantizer:
+    """
+    Recreate a trained quantizer from the arrays returned by to_arrays.
+
+    Args:
+        arrays (Dict[str, np.ndarray]): The saved parameters.
+
+    Returns:
+        Quantizer: The trained quantizer.
+    """
+    kind = str(arrays["kind"])
+    dimension = int(arrays["dimension"])
+    if kind == "int8":
+        return Int8Quantizer(dimension, arrays["low"], arrays["scale"])
+    if kind == "pq":
+        return ProductQuantizer(
+            dimension, int(arrays["subvectors"]), arrays["codebooks"]
+        )
+    return create_quantizer(kind, dimension)
+
+
+def _recall(found: np.ndarray, expected: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found, expected))
+    return hits / expected.size if expected.size else 1.0
+
+
+def evaluate_quantizers(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    metric: str,
+    k: int = 10,
+    kinds: Sequence[str] = QUANTIZATION_KINDS,
+    subvectors: int = 16,
+    rerank_factor: int = 4,
+) -> List[Dict[str, float]]:
+    """
+    Measure the recall and memory of every quantization on a sample.
+
+    Each quantizer is trained on the vectors, and its top-k for every query is
+    compared to the exact top-k, both straight from the codes and after
+    re-ranking k * rerank_factor candidates with the full-precision vectors.
+
+    Args:
+        vectors (np.ndarray): The sample of stored vectors.
+        queries (np.ndarray): The query vectors.
+        metric (str): The distance metric, see pairwise_distances.
+        k (int): The number of neighbours compared.
+        kinds (Sequence[str]): The quantizations to evaluate.
+        subvectors (int): The number of product quantization subvectors.
+        rerank_factor (int): Candidates re-ranked per result.
+
+    Returns:
+        List[Dict[str, float]]: Per quantization, including float32 as the
+        baseline: the bytes per vector, the compression ratio and the recall at
+        k without and with re-ranking.
+    """
+    k = min(k, len(vectors))
+    exact = pairwise_distances(queries, vectors, metric)
+    expected = np.argsort(exact, axis=1)[:, :k]
+    float32_size = vectors.shape[1] * 4
+    report: List[Dict[str, float]] = [
+        {
+            "quantization": "float32",
+            "bytes_per_vector": float32_size,
+            "compression": 1.0,
+            "recall": 1.0,
+            "reranked_recall": 1.0,
+        }
+    ]
+
+    for kind in kinds:
+        quantizer = create_quantizer(kind, vectors.shape[1], subvectors)
+        quantizer.train(vectors)
+        approximate = quantizer.distances(queries, quantizer.encode(vectors), metric)
+        candidates = np.argsort(approximate, axis=1)[:, : k * max(1, rerank_factor)]
+        reranked = np.take_along_axis(
+            candidates,
+            np.argsort(np.take_along_axis(exact, candidates, axis=1), axis=1),
+            axis=1,
+        )[:, :k]
+        report.append(
+            {
+                "quantization": kind,
+                "bytes_per_vector": quantizer.code_size,
+                "compression": float32_size / quantizer.code_size,
+                "recall": _recall(candidates[:, :k], expected),
+                "reranked_recall": _recall(reranked, expected),
+            }
+        )
+        logger.info(
+            f"{kind}: {quantizer.code_size} bytes per vector, recall@{k} "
+            f"{report[-1]['recall']:.3f}, re-ranked {report[-1]['reranked_recall']:.3f}"
+        )
+    return report
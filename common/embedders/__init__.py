@@ -1,11 +1,20 @@
 from .abstract_document_embedder import AbstractDocumentEmbedder
+from .adaptive_batch_controller import AdaptiveBatchController
 from .bedrock_embedder import BedrockEmbedder
+from .embedding_cache import CachedEmbedder, CachedEmbeddings, EmbeddingCache
+from .embedding_resilience import CircuitOpenError, EmbeddingResilience
 from .ollama_embedder import OllamaEmbedder
 from .openai_embedder import OpenAIEmbedder
 
 __all__ = [
     "AbstractDocumentEmbedder",
+    "AdaptiveBatchController",
     "BedrockEmbedder",
+    "CachedEmbedder",
+    "CachedEmbeddings",
+    "EmbeddingCache",
+    "EmbeddingResilience",
+    "CircuitOpenError",
     "OllamaEmbedder",
     "OpenAIEmbedder",
 ]
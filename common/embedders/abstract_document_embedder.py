@@ -1,12 +1,26 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncContextManager, Awaitable, Callable, List, Tuple
 from dotenv import load_dotenv
 from langchain.schema import Document
 
+from common.embedders.adaptive_batch_controller import get_controller
+from common.embedders.embedding_resilience import get_resilience
+
 load_dotenv(override=False)
 
+# runs the sub-batches of synchronous embedding calls, the provider's
+# controller decides how many of them are actually in flight
+_batch_executor = ThreadPoolExecutor(thread_name_prefix="embedding-batch")
+
 
 class AbstractDocumentEmbedder(ABC):
+    # identify the embedding provider and model, used for concurrency limits
+    provider_name: str = "unknown"
+    model_id: str = ""
+
     @abstractmethod
     def embed_documents(self, documents: List[Document]) -> List[List[float]]:
         """
@@ -36,3 +50,158 @@ class AbstractDocumentEmbedder(ABC):
             Exception: For any other errors during loading or splitting.
         """
         pass
+
+    def embed_queries(self, input_texts: List[str]) -> List[List[float]]:
+        """
+        Embed several queries at once.
+
+        The default implementation embeds the queries concurrently with
+        embed_query. Providers whose query and document embeddings are the same
+        override it to send the queries as batched requests.
+
+        Args:
+            input_texts (List[str]): The query texts to embed.
+
+        Returns:
+            List[List[float]]: One embedding per query, in input order.
+        """
+        if len(input_texts) == 1:
+            return [self.embed_query(input_texts[0])]
+        return list(_batch_executor.map(self.embed_query, input_texts))
+
+    def needs_refresh(self) -> bool:
+        """
+        Report whether the embedder holds stale clients or credentials.
+
+        Long-lived owners of an embedder call this before reuse and rebuild the
+        embedder when it returns True.
+
+        Returns:
+            bool: True if the embedder should be rebuilt before it is used again.
+        """
+        return False
+
+    async def aembed_documents(self, documents: List[Document]) -> List[List[float]]:
+        """
+        Asynchronously embed a list of documents.
+
+        The default implementation runs embed_documents in a worker thread.
+        Providers with a native async client override it.
+
+        Args:
+            documents (List[Document]): The documents to embed.
+
+        Returns:
+            List[List[float]]: One embedding per document, in input order.
+        """
+        return await asyncio.to_thread(self.embed_documents, documents)
+
+    async def aembed_query(self, input_text: str) -> List[float]:
+        """
+        Asynchronously embed a query.
+
+        The default implementation runs embed_query in a worker thread.
+        Providers with a native async client override it.
+
+        Args:
+            input_text (str): The query text to embed.
+
+        Returns:
+            List[float]: The query embedding.
+        """
+        return await asyncio.to_thread(self.embed_query, input_text)
+
+    def _provider_slots(self) -> AsyncContextManager[None]:
+        """
+        Get one of the provider's parallel request slots for a coroutine. Sync
+        and async calls share the count of the provider's
+        AdaptiveBatchController.
+        """
+        return get_controller(self.provider_name).aslot()
+
+    def _embed_batches(
+        self,
+        texts: List[str],
+        embed_batch: Callable[[List[str]], List[List[float]]],
+    ) -> List[List[float]]:
+        """
+        Embed texts as sub-batches sized and parallelized by the provider's
+        AdaptiveBatchController. Each sub-batch is rate limited and retried on
+        its own by the provider's EmbeddingResilience.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            embed_batch (Callable): Function embedding one sub-batch.
+
+        Returns:
+            List[List[float]]: One embedding per text, in input order.
+        """
+        if not texts:
+            return []
+        controller = get_controller(self.provider_name)
+
+        resilience = get_resilience(self.provider_name)
+
+        def _attempt(batch: List[str]) -> List[List[float]]:
+            # a slot is held per attempt, not across backoff or circuit waits,
+            # and only the successful attempt's latency feeds the controller
+            with controller.slot():
+                started = time.perf_counter()
+                vectors = embed_batch(batch)
+                controller.record_success(time.perf_counter() - started)
+                return vectors
+
+        def _run(batch_range: Tuple[int, int]) -> List[List[float]]:
+            return resilience.call(
+                _attempt,
+                texts[batch_range[0] : batch_range[1]],
+                on_throttle=controller.record_throttle,
+            )
+
+        ranges = controller.batches(texts)
+        if len(ranges) == 1:
+            return _run(ranges[0])
+        results = list(_batch_executor.map(_run, ranges))
+        return [vector for batch in results for vector in batch]
+
+    async def _afan_out(
+        self,
+        texts: List[str],
+        aembed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+    ) -> List[List[float]]:
+        """
+        Embed texts as concurrent sub-batches sized and limited by the provider's
+        AdaptiveBatchController. Each sub-batch is rate limited and retried on
+        its own by the provider's EmbeddingResilience.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            aembed_batch (Callable): Coroutine function embedding one sub-batch.
+
+        Returns:
+            List[List[float]]: One embedding per text, in input order.
+        """
+        if not texts:
+            return []
+        controller = get_controller(self.provider_name)
+
+        resilience = get_resilience(self.provider_name)
+
+        async def _attempt(batch: List[str]) -> List[List[float]]:
+            async with controller.aslot():
+                started = time.perf_counter()
+                vectors = await aembed_batch(batch)
+                controller.record_success(time.perf_counter() - started)
+                return vectors
+
+        async def _run(batch_range: Tuple[int, int]) -> List[List[float]]:
+            return await resilience.acall(
+                _attempt,
+                texts[batch_range[0] : batch_range[1]],
+                on_throttle=controller.record_throttle,
+            )
+
+        results = await asyncio.gather(
+            *(_run(batch_range) for batch_range in controller.batches(texts))
+        )
+        return [vector for batch in results for vector in batch]
@@ -0,0 +1,334 @@
+import asyncio
+import os
+import re
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+# substrings identifying provider throttling / rate limit errors
+_THROTTLING_MARKERS = (
+    "throttl",
+    "too many requests",
+    "toomanyrequests",
+    "rate limit",
+    "ratelimit",
+    "slow down",
+)
+# what precedes a status in a message, e.g. "Error code: 429" or "HTTP/1.1 503",
+# so a status is not mistaken for part of an id, a byte count or a port
+_STATUS_PREFIX = (
+    r"\b(?:(?:status|error)[\s_]?code|status|code|http(?:/\d(?:\.\d)?)?)"
+    r"[\s:=(\"']*"
+)
+# botocore ClientError codes of throttled requests
+_THROTTLING_CODES = frozenset(
+    ["ThrottlingException", "TooManyRequestsException", "Throttling"]
+)
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """Find the HTTP status of a provider client error, from its attributes."""
+    status = getattr(error, "status_code", None)
+    response: Any = getattr(error, "response", None)
+    if status is None and response is not None:
+        if isinstance(response, dict):
+            # botocore ClientError
+            status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        else:
+            status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def has_status(error: BaseException, statuses: Tuple[int, ...]) -> bool:
+    """
+    Tell whether a provider client error carries one of some HTTP statuses,
+    as an attribute or as a status in its message.
+
+    Args:
+        error (BaseException): The exception raised by the embedding call.
+        statuses (Tuple[int, ...]): The HTTP statuses to look for.
+
+    Returns:
+        bool: True if the error has one of the statuses.
+    """
+    if _status_code(error) in statuses:
+        return True
+    pattern = _STATUS_PREFIX + r"(?:" + "|".join(map(str, statuses)) + r")\b"
+    return bool(re.search(pattern, f"{error}".lower()))
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """
+    Tell whether an exception raised by a provider client signals throttling.
+
+    Bedrock raises botocore ThrottlingException, OpenAI raises RateLimitError
+    and Ollama returns HTTP 429, so the check looks at the HTTP status and
+    error code the exception carries, then at its type and message, rather
+    than at one client's exception classes.
+
+    Args:
+        error (BaseException): The exception raised by the embedding call.
+
+    Returns:
+        bool: True if the provider asked us to slow down.
+    """
+    if has_status(error, (429,)):
+        return True
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        if response.get("Error", {}).get("Code") in _THROTTLING_CODES:
+            return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _THROTTLING_MARKERS)
+
+
+class AdaptiveBatchController:
+    """
+    Sizes embedding batches and limits their parallelism using AIMD.
+
+    Texts are packed into batches bounded by a character budget and an item cap.
+    Every batch that completes under the target latency grows the budget
+    additively, and every full round of such batches adds one parallel request.
+    A slow batch shrinks the budget multiplicatively, and a throttling response
+    halves both the budget and the parallelism. Throughput therefore settles just
+    below the provider's limit without a hand-tuned batch size per model.
+    """
+
+    def __init__(self, provider_name: str):
+        """
+        Initialize the controller for one provider.
+
+        Args:
+            provider_name (str): The provider whose calls this controller sizes.
+        """
+        _initial_chars = int(os.environ.get("EMBEDDING_BATCH_CHARS", "16000"))
+        _min_chars = int(os.environ.get("EMBEDDING_BATCH_MIN_CHARS", "1000"))
+        _max_chars = int(os.environ.get("EMBEDDING_BATCH_MAX_CHARS", "200000"))
+        _max_items = int(os.environ.get("EMBEDDING_BATCH_MAX_ITEMS", "96"))
+        _increase_chars = int(os.environ.get("EMBEDDING_BATCH_INCREASE_CHARS", "2000"))
+        _target_latency = float(os.environ.get("EMBEDDING_TARGET_LATENCY", "2.0"))
+        _max_parallelism = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", "8"))
+
+        logger.debug(
+            f"AdaptiveBatchController for {provider_name} initialized with "
+            f"{_initial_chars} chars per batch and up to {_max_parallelism} "
+            f"parallel requests"
+        )
+
+        self.provider_name = provider_name
+        self.min_chars = max(1, _min_chars)
+        self.max_chars = max(self.min_chars, _max_chars)
+        self.max_items = max(1, _max_items)
+        self.increase_chars = _increase_chars
+        self.target_latency = _target_latency
+        self.max_parallelism = max(1, _max_parallelism)
+
+        self._lock = threading.Lock()
+        self._slot_available = threading.Condition(self._lock)
+        self._in_flight = 0
+        # futures of async callers waiting for a slot, with their event loops
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._batch_chars = min(max(_initial_chars, self.min_chars), self.max_chars)
+        self._parallelism = min(2, self.max_parallelism)
+        self._successes_in_round = 0
+        self._batches = 0
+        self._throttles = 0
+        self._slow_batches = 0
+        self._total_latency = 0.0
+
+    @property
+    def batch_chars(self) -> int:
+        with self._lock:
+            return self._batch_chars
+
+    @property
+    def parallelism(self) -> int:
+        with self._lock:
+            return self._parallelism
+
+    def _notify_slot(self) -> None:
+        """Wake the callers waiting for a slot, with the lock held."""
+        self._slot_available.notify()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def _release_slot(self) -> None:
+        with self._slot_available:
+            self._in_flight -= 1
+            self._notify_slot()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        Hold one of the provider's parallel request slots, waiting for one to
+        free up when the current parallelism is reached.
+        """
+        with self._slot_available:
+            while self._in_flight >= self._parallelism:
+                self._slot_available.wait()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._release_slot()
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        """
+        Hold one of the provider's parallel request slots from a coroutine,
+        sharing the count with slot, without blocking the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._in_flight < self._parallelism:
+                    self._in_flight += 1
+                    break
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            try:
+                await future
+            finally:
+                with self._lock:
+                    if (loop, future) in self._async_waiters:
+                        self._async_waiters.remove((loop, future))
+        try:
+            yield
+        finally:
+            self._release_slot()
+
+    def batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """
+        Pack texts into consecutive batches under the current budget.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            List[Tuple[int, int]]: The (start, end) index range of every batch.
+                A text larger than the budget gets a batch of its own.
+        """
+        budget = self.batch_chars
+        ranges: List[Tuple[int, int]] = []
+        start = 0
+        used = 0
+        for i, text in enumerate(texts):
+            text_size = len(text)
+            if i > start and (
+                used + text_size > budget or i - start >= self.max_items
+            ):
+                ranges.append((start, i))
+                start, used = i, 0
+            used += text_size
+        if start < len(texts):
+            ranges.append((start, len(texts)))
+        return ranges
+
+    def record_success(self, latency: float) -> None:
+        """
+        Record a batch that completed.
+
+        Args:
+            latency (float): The batch latency in seconds.
+        """
+        with self._lock:
+            self._batches += 1
+            self._total_latency += latency
+            if latency > self.target_latency:
+                self._slow_batches += 1
+                self._successes_in_round = 0
+                self._batch_chars = max(
+                    self.min_chars, int(self._batch_chars * 0.75)
+                )
+                return
+            self._batch_chars = min(
+                self.max_chars, self._batch_chars + self.increase_chars
+            )
+            self._successes_in_round += 1
+            if self._successes_in_round >= self._parallelism:
+                self._successes_in_round = 0
+                self._parallelism = min(self.max_parallelism, self._parallelism + 1)
+                self._notify_slot()
+
+    def record_throttle(self) -> None:
+        """
+        Record a batch rejected by the provider because of throttling.
+        """
+        with self._lock:
+            self._throttles += 1
+            self._successes_in_round = 0
+            self._batch_chars = max(self.min_chars, self._batch_chars // 2)
+            self._parallelism = max(1, self._parallelism // 2)
+            logger.warning(
+                f"{self.provider_name} throttled, batch size reduced to "
+                f"{self._batch_chars} chars and parallelism to {self._parallelism}"
+            )
+
+    def get_metrics(self) -> Dict[str, float]:
+        """
+        Get the current settings and the observed batch statistics.
+
+        Returns:
+            Dict[str, float]: The batch budget, parallelism, batch and throttle
+            counts and the mean batch latency.
+        """
+        with self._lock:
+            return {
+                "batch_chars": self._batch_chars,
+                "parallelism": self._parallelism,
+                "in_flight": self._in_flight,
+                "batches": self._batches,
+                "slow_batches": self._slow_batches,
+                "throttles": self._throttles,
+                "mean_latency": (
+                    self._total_latency / self._batches if self._batches else 0.0
+                ),
+            }
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+_controllers: Dict[str, AdaptiveBatchController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_controller(provider_name: str) -> AdaptiveBatchController:
+    """
+    Get the controller shared by every embedder of a provider.
+
+    Args:
+        provider_name (str): The embedding provider.
+
+    Returns:
+        AdaptiveBatchController: The provider's controller.
+    """
+    with _controllers_lock:
+        controller = _controllers.get(provider_name)
+        if controller is None:
+            controller = AdaptiveBatchController(provider_name)
+            _controllers[provider_name] = controller
+        return controller
+
+
+def get_all_metrics() -> Dict[str, Dict[str, float]]:
+    """
+    Get the metrics of every provider controller created so far.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Metrics keyed by provider name.
+    """
+    with _controllers_lock:
+        controllers = dict(_controllers)
+    return {name: c.get_metrics() for name, c in controllers.items()}
+
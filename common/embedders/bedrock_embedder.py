@@ -5,6 +5,7 @@ from langchain.schema import Document
 from langchain_community.embeddings import BedrockEmbeddings
 
 from common.embedders.abstract_document_embedder import AbstractDocumentEmbedder
+from common.embedders.embedding_resilience import get_resilience
 from common.utils.aws_util import AWSUtil
 from logging_config import setup_logger
 
@@ -13,6 +14,7 @@ logger = setup_logger(__name__)
 
 
 class BedrockEmbedder(AbstractDocumentEmbedder):
+    provider_name = "aws"
 
     def __init__(self):
         _embedding_model_provider = os.environ.get(
@@ -26,11 +28,12 @@ class BedrockEmbedder(AbstractDocumentEmbedder):
         _model_id = os.environ.get("EMBEDDING_MODEL_ID", "text-embedding-ada-002")
         aws_util = AWSUtil()
         client = aws_util.get_client("bedrock-runtime")
+        self.aws_util = aws_util
         self.embeddings = BedrockEmbeddings(client=client, model_id=_model_id)
+        self.model_id = _model_id
 
         logger.info(f"Bedrock embedder initialized using {_model_id} model")
 
-
     def embed_documents(self, documents: List[Document]) -> List[List[float]]:
         logger.info("Start of embedding documents")
         # iterate through the document List
@@ -39,7 +42,22 @@ class BedrockEmbedder(AbstractDocumentEmbedder):
             doc_content.append(document.page_content)
 
         logger.debug(f"Embedding {len(doc_content)} documents")
-        return self.embeddings.embed_documents(doc_content)
+        return self._embed_batches(doc_content, self.embeddings.embed_documents)
 
     def embed_query(self, input_text: str) -> List[float]:
-        return self.embeddings.embed_query(input_text)
+        return get_resilience(self.provider_name).call(
+            self.embeddings.embed_query, input_text
+        )
+
+    def needs_refresh(self) -> bool:
+        return self.aws_util.credentials_expired()
+
+    async def aembed_documents(self, documents: List[Document]) -> List[List[float]]:
+        doc_content = [document.page_content for document in documents]
+        return await self._afan_out(doc_content, self.embeddings.aembed_documents)
+
+    async def aembed_query(self, input_text: str) -> List[float]:
+        async with self._provider_slots():
+            return await get_resilience(self.provider_name).acall(
+                self.embeddings.aembed_query, input_text
+            )
@@ -0,0 +1,425 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+from common.embedders.abstract_document_embedder import AbstractDocumentEmbedder
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text before it is hashed, so trivially different copies of the
+    same content share a cache entry.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The NFC-normalized text with runs of whitespace collapsed.
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class EmbeddingCache:
+    """
+    A content-addressed embedding cache with an in-memory hot tier in front of a
+    size-bounded SQLite store.
+
+    Entries are keyed by the hash of (provider, model id, normalized text), so a
+    vector is only reused for the exact model that produced it. Both tiers evict
+    the least recently used entries. Vectors are stored as float32.
+    """
+
+    def __init__(self):
+        """
+        Initialize the cache, creating the database if needed.
+        """
+        _cache_path = os.environ.get("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite")
+        _max_entries = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "1000000"))
+        _memory_entries = int(
+            os.environ.get("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000")
+        )
+
+        logger.debug(
+            f"EmbeddingCache initialized at {_cache_path} with {_max_entries} "
+            f"entries on disk and {_memory_entries} in memory"
+        )
+
+        self.max_entries = _max_entries
+        self.memory_entries = _memory_entries
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._connection = sqlite3.connect(_cache_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_access "
+                "ON embeddings (last_access)"
+            )
+            self._disk_entries = self._connection.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()[0]
+
+    @staticmethod
+    def make_key(provider: str, model_id: str, text: str) -> str:
+        """
+        Build the cache key of a text for a given provider and model.
+
+        Args:
+            provider (str): The embedding provider.
+            model_id (str): The embedding model id.
+            text (str): The text being embedded.
+
+        Returns:
+            str: The hex SHA-256 cache key.
+        """
+        payload = "\0".join((provider, model_id, normalize_text(text)))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up several keys at once.
+
+        Args:
+            keys (List[str]): Keys built with make_key.
+
+        Returns:
+            List[Optional[List[float]]]: The cached vector of every key, or None.
+        """
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        missing: Dict[str, List[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self._stats["memory_hits"] += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing:
+                found = self._read_disk(list(missing))
+                for key, positions in missing.items():
+                    vector = found.get(key)
+                    if vector is None:
+                        self._stats["misses"] += len(positions)
+                        continue
+                    self._remember(key, vector)
+                    self._stats["disk_hits"] += len(positions)
+                    for i in positions:
+                        results[i] = vector
+        return results
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        # stay well below SQLite's bound parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector.tolist()
+        if found:
+            now = time.time()
+            with self._connection:
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+        return found
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]) -> None:
+        """
+        Store several vectors at once, evicting old entries if the store is full.
+
+        Args:
+            keys (List[str]): Keys built with make_key.
+            vectors (List[List[float]]): The vector of every key.
+        """
+        now = time.time()
+        rows = [
+            (key, array("f", vector).tobytes(), now)
+            for key, vector in zip(keys, vectors)
+        ]
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+            with self._connection:
+                before = self._connection.total_changes
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, last_access) "
+                    "VALUES (?, ?, ?)",
+                    rows,
+                )
+                self._disk_entries += self._connection.total_changes - before
+                if self._disk_entries > self.max_entries:
+                    self._evict()
+
+    def _evict(self) -> None:
+        # evict a little more than needed so eviction does not run on every put
+        excess = self._disk_entries - int(self.max_entries * 0.9)
+        self._connection.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+            (excess,),
+        )
+        self._disk_entries -= excess
+        self._stats["evictions"] += excess
+        logger.debug(f"Evicted {excess} entries from the embedding cache")
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get the cache hit and miss counters.
+
+        Returns:
+            Dict[str, float]: Hits per tier, misses, evictions, entry counts and
+            the overall hit rate.
+        """
+        with self._lock:
+            stats: Dict[str, float] = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = self._disk_entries
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        )
+        return stats
+
+
+_shared_cache: Optional[EmbeddingCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> EmbeddingCache:
+    """
+    Get the process-wide embedding cache, so the splitter and the embedder share
+    one hot tier and one database connection.
+
+    Returns:
+        EmbeddingCache: The shared cache.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache()
+        return _shared_cache
+
+
+def _lookup(cache, provider, model_id, texts):
+    keys = [EmbeddingCache.make_key(provider, model_id, text) for text in texts]
+    vectors = cache.get_many(keys)
+    # embed every distinct missing text once
+    missing: Dict[str, int] = {}
+    for i, vector in enumerate(vectors):
+        if vector is None and keys[i] not in missing:
+            missing[keys[i]] = i
+    return keys, vectors, missing
+
+
+def _merge(cache, keys, vectors, missing, computed) -> List[List[float]]:
+    cache.put_many(list(missing), computed)
+    by_key = dict(zip(missing, computed))
+    return [
+        vector if vector is not None else by_key[key]
+        for key, vector in zip(keys, vectors)
+    ]
+
+
+def _embed_with_cache(cache, provider, model_id, texts, embed) -> List[List[float]]:
+    keys, vectors, missing = _lookup(cache, provider, model_id, texts)
+    if not missing:
+        return vectors
+    computed = embed([texts[i] for i in missing.values()])
+    return _merge(cache, keys, vectors, missing, computed)
+
+
+async def _aembed_with_cache(
+    cache, provider, model_id, texts, aembed
+) -> List[List[float]]:
+    keys, vectors, missing = _lookup(cache, provider, model_id, texts)
+    if not missing:
+        return vectors
+    computed = await aembed([texts[i] for i in missing.values()])
+    return _merge(cache, keys, vectors, missing, computed)
+
+
+class CachedEmbedder(AbstractDocumentEmbedder):
+    """
+    An AbstractDocumentEmbedder that serves repeated texts from an EmbeddingCache
+    and only sends the misses to the wrapped embedder.
+    """
+
+    def __init__(
+        self, embedder: AbstractDocumentEmbedder, cache: Optional[EmbeddingCache] = None
+    ):
+        """
+        Initialize the cached embedder.
+
+        Args:
+            embedder (AbstractDocumentEmbedder): The embedder computing misses.
+            cache (Optional[EmbeddingCache]): The cache, the shared one by default.
+        """
+        self.embedder = embedder
+        self.cache = cache or get_shared_cache()
+        self.provider_name = embedder.provider_name
+        self.model_id = embedder.model_id
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_documents(
+            [Document(page_content=text) for text in texts]
+        )
+
+    async def _aembed_texts(self, texts: List[str]) -> List[List[float]]:
+        return await self.embedder.aembed_documents(
+            [Document(page_content=text) for text in texts]
+        )
+
+    def embed_documents(self, documents: List[Document]) -> List[List[float]]:
+        texts = [document.page_content for document in documents]
+        return _embed_with_cache(
+            self.cache, self.provider_name, self.model_id, texts, self._embed_texts
+        )
+
+    def embed_query(self, input_text: str) -> List[float]:
+        # some models embed queries differently, so queries get their own keys
+        return _embed_with_cache(
+            self.cache,
+            f"{self.provider_name}/query",
+            self.model_id,
+            [input_text],
+            lambda texts: [self.embedder.embed_query(texts[0])],
+        )[0]
+
+    def embed_queries(self, input_texts: List[str]) -> List[List[float]]:
+        return _embed_with_cache(
+            self.cache,
+            f"{self.provider_name}/query",
+            self.model_id,
+            input_texts,
+            self.embedder.embed_queries,
+        )
+
+    async def aembed_documents(self, documents: List[Document]) -> List[List[float]]:
+        texts = [document.page_content for document in documents]
+        return await _aembed_with_cache(
+            self.cache, self.provider_name, self.model_id, texts, self._aembed_texts
+        )
+
+    async def aembed_query(self, input_text: str) -> List[float]:
+        async def _aembed_query(texts: List[str]) -> List[List[float]]:
+            return [await self.embedder.aembed_query(texts[0])]
+
+        vectors = await _aembed_with_cache(
+            self.cache,
+            f"{self.provider_name}/query",
+            self.model_id,
+            [input_text],
+            _aembed_query,
+        )
+        return vectors[0]
+
+    def needs_refresh(self) -> bool:
+        return self.embedder.needs_refresh()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    A LangChain Embeddings adapter backed by an EmbeddingCache, for components
+    such as SemanticChunker that take a LangChain embeddings model directly.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        provider: str,
+        model_id: str,
+        cache: Optional[EmbeddingCache] = None,
+    ):
+        """
+        Initialize the cached embeddings.
+
+        Args:
+            embeddings (Embeddings): The LangChain model computing misses.
+            provider (str): The embedding provider, part of the cache key.
+            model_id (str): The embedding model id, part of the cache key.
+            cache (Optional[EmbeddingCache]): The cache, the shared one by default.
+        """
+        self.embeddings = embeddings
+        self.provider = provider
+        self.model_id = model_id
+        self.cache = cache or get_shared_cache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return _embed_with_cache(
+            self.cache,
+            self.provider,
+            self.model_id,
+            texts,
+            self.embeddings.embed_documents,
+        )
+
+    def embed_query(self, text: str) -> List[float]:
+        return _embed_with_cache(
+            self.cache,
+            f"{self.provider}/query",
+            self.model_id,
+            [text],
+            lambda texts: [self.embeddings.embed_query(texts[0])],
+        )[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await _aembed_with_cache(
+            self.cache,
+            self.provider,
+            self.model_id,
+            texts,
+            self.embeddings.aembed_documents,
+        )
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async def _aembed_query(texts: List[str]) -> List[List[float]]:
+            return [await self.embeddings.aembed_query(texts[0])]
+
+        vectors = await _aembed_with_cache(
+            self.cache, f"{self.provider}/query", self.model_id, [text], _aembed_query
+        )
+        return vectors[0]
@@ -0,0 +1,395 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+from common.embedders.adaptive_batch_controller import (
+    has_status,
+    is_throttling_error,
+)
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+T = TypeVar("T")
+
+# substrings identifying transient provider or network errors worth retrying
+_TRANSIENT_MARKERS = (
+    "timeout",
+    "timed out",
+    "connectionerror",
+    "connection reset",
+    "connection aborted",
+    "serviceunavailable",
+    "service unavailable",
+    "internalserver",
+    "modelnotready",
+)
+# HTTP statuses of transient gateway and service errors
+_TRANSIENT_STATUSES = (502, 503, 504)
+
+# longest single sleep while waiting on the circuit breaker, so waiters notice
+# a successful probe quickly
+_BREAKER_POLL_INTERVAL = 1.0
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a provider stays unavailable for longer than callers wait."""
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    Tell whether a failed embedding call is worth retrying.
+
+    Args:
+        error (BaseException): The exception raised by the embedding call.
+
+    Returns:
+        bool: True for throttling and transient network or service errors.
+    """
+    if is_throttling_error(error) or has_status(error, _TRANSIENT_STATUSES):
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _TRANSIENT_MARKERS)
+
+
+class TokenBucket:
+    """A thread-safe token bucket handing out request permits at a fixed rate."""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize a full bucket.
+
+        Args:
+            rate (float): Tokens added per second. Zero or less disables limiting.
+            capacity (float): The maximum number of tokens, i.e. the burst size.
+        """
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens from the bucket, going into debt if it is empty.
+
+        Args:
+            tokens (float): The number of tokens to take.
+
+        Returns:
+            float: How many seconds the caller must wait before proceeding.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker that pauses callers instead of failing them.
+
+    After failure_threshold consecutive failed attempts the circuit opens for
+    reset_timeout seconds. Callers wait while it is open; once it elapses a single
+    probe call is let through, and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        """
+        Initialize a closed circuit.
+
+        Args:
+            name (str): Used in log messages.
+            failure_threshold (int): Consecutive failures that open the circuit.
+            reset_timeout (float): Seconds the circuit stays open.
+        """
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_until = 0.0
+        self._probe_in_flight = False
+        self._open_count = 0
+
+    def wait_time(self) -> float:
+        """
+        Ask for permission to call the provider.
+
+        Returns:
+            float: Zero if the call may proceed, otherwise the seconds to wait
+            before asking again.
+        """
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return 0.0
+            remaining = self._opened_until - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._probe_in_flight:
+                return _BREAKER_POLL_INTERVAL
+            # half open: let exactly one probe through
+            self._probe_in_flight = True
+            return 0.0
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._failures >= self.failure_threshold:
+                logger.info(f"Circuit for {self.name} closed")
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._failures >= self.failure_threshold:
+                self._opened_until = time.monotonic() + self.reset_timeout
+                self._open_count += 1
+                logger.warning(
+                    f"Circuit for {self.name} open for {self.reset_timeout:.1f}s "
+                    f"after {self._failures} consecutive failures"
+                )
+
+    def release_probe(self) -> None:
+        """
+        Let another probe through after a call ended without an outcome, e.g.
+        because it was cancelled, which would otherwise keep the circuit open.
+        """
+        with self._lock:
+            if self._failures >= self.failure_threshold:
+                self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._failures >= self.failure_threshold
+
+    @property
+    def open_count(self) -> int:
+        with self._lock:
+            return self._open_count
+
+
+class EmbeddingResilience:
+    """
+    Rate limiting, retries and circuit breaking for one embedding provider.
+
+    Every attempt first waits for the circuit breaker and a token bucket permit.
+    Throttling and transient errors are retried with full-jitter exponential
+    backoff; since the wrapped call is a single sub-batch, only that sub-batch is
+    retried. When the provider keeps failing the circuit opens and every caller
+    pauses instead of failing its document.
+    """
+
+    def __init__(self, provider_name: str):
+        """
+        Initialize the resilience layer for one provider.
+
+        Args:
+            provider_name (str): The embedding provider.
+        """
+        _rate = float(os.environ.get("EMBEDDING_RATE_LIMIT_RPS", "0"))
+        _burst = float(os.environ.get("EMBEDDING_RATE_LIMIT_BURST", "10"))
+        _max_attempts = int(os.environ.get("EMBEDDING_RETRY_MAX_ATTEMPTS", "6"))
+        _base_delay = float(os.environ.get("EMBEDDING_RETRY_BASE_DELAY", "0.5"))
+        _max_delay = float(os.environ.get("EMBEDDING_RETRY_MAX_DELAY", "30"))
+        _failure_threshold = int(
+            os.environ.get("EMBEDDING_CIRCUIT_FAILURE_THRESHOLD", "5")
+        )
+        _reset_timeout = float(os.environ.get("EMBEDDING_CIRCUIT_RESET_TIMEOUT", "30"))
+        _max_wait = float(os.environ.get("EMBEDDING_CIRCUIT_MAX_WAIT", "600"))
+
+        logger.debug(
+            f"EmbeddingResilience for {provider_name} initialized with rate "
+            f"{_rate}/s, {_max_attempts} attempts and circuit threshold "
+            f"{_failure_threshold}"
+        )
+
+        self.provider_name = provider_name
+        self.max_attempts = max(1, _max_attempts)
+        self.base_delay = _base_delay
+        self.max_delay = _max_delay
+        self.max_wait = _max_wait
+        self.bucket = TokenBucket(_rate, _burst)
+        self.breaker = CircuitBreaker(provider_name, _failure_threshold, _reset_timeout)
+
+        self._lock = threading.Lock()
+        self._retries = 0
+        self._failures = 0
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: uniform between zero and the exponential ceiling
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _breaker_wait(self, waited: float) -> float:
+        delay = self.breaker.wait_time()
+        if delay > 0 and waited + delay > self.max_wait:
+            raise CircuitOpenError(
+                f"{self.provider_name} unavailable for more than {self.max_wait:.0f}s"
+            )
+        return min(delay, _BREAKER_POLL_INTERVAL) if delay > 0 else 0.0
+
+    def _should_retry(
+        self,
+        error: Exception,
+        attempt: int,
+        on_throttle: Optional[Callable[[], None]],
+    ) -> bool:
+        if not is_retryable_error(error):
+            # the provider answered, so this says nothing about its availability
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        if on_throttle is not None and is_throttling_error(error):
+            on_throttle()
+        with self._lock:
+            if attempt + 1 >= self.max_attempts:
+                self._failures += 1
+                return False
+            self._retries += 1
+        logger.warning(
+            f"{self.provider_name} embedding attempt {attempt + 1} failed, "
+            f"retrying: {error}"
+        )
+        return True
+
+    def call(
+        self,
+        function: Callable[..., T],
+        *args,
+        on_throttle: Optional[Callable[[], None]] = None,
+    ) -> T:
+        """
+        Call a blocking embedding function with rate limiting and retries.
+
+        Args:
+            function (Callable): The embedding call, e.g. one sub-batch.
+            *args: Arguments passed to the function.
+            on_throttle (Optional[Callable[[], None]]): Called on every
+                throttling response, e.g. to shrink the batch size.
+
+        Returns:
+            T: The function's result.
+
+        Raises:
+            CircuitOpenError: If the provider stays unavailable too long.
+            Exception: The last error once retries are exhausted, or any
+                non-retryable error immediately.
+        """
+        waited = 0.0
+        attempt = 0
+        while True:
+            while (delay := self._breaker_wait(waited)) > 0:
+                time.sleep(delay)
+                waited += delay
+            try:
+                time.sleep(self.bucket.reserve())
+                result = function(*args)
+            except Exception as e:
+                if not self._should_retry(e, attempt, on_throttle):
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                # e.g. KeyboardInterrupt, which records no outcome
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def acall(
+        self,
+        function: Callable[..., Awaitable[T]],
+        *args,
+        on_throttle: Optional[Callable[[], None]] = None,
+    ) -> T:
+        """
+        Await an async embedding function with rate limiting and retries.
+
+        Args:
+            function (Callable): The coroutine function, e.g. one sub-batch.
+            *args: Arguments passed to the function.
+            on_throttle (Optional[Callable[[], None]]): Called on every
+                throttling response, e.g. to shrink the batch size.
+
+        Returns:
+            T: The function's result.
+
+        Raises:
+            CircuitOpenError: If the provider stays unavailable too long.
+            Exception: The last error once retries are exhausted, or any
+                non-retryable error immediately.
+        """
+        waited = 0.0
+        attempt = 0
+        while True:
+            while (delay := self._breaker_wait(waited)) > 0:
+                await asyncio.sleep(delay)
+                waited += delay
+            try:
+                await asyncio.sleep(self.bucket.reserve())
+                result = await function(*args)
+            except Exception as e:
+                if not self._should_retry(e, attempt, on_throttle):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                # e.g. asyncio.CancelledError, which records no outcome
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def get_metrics(self) -> Dict[str, float]:
+        """
+        Get the retry and circuit breaker counters.
+
+        Returns:
+            Dict[str, float]: Retries, calls that failed after all retries,
+            circuit state and the number of times it opened.
+        """
+        with self._lock:
+            return {
+                "retries": self._retries,
+                "failures": self._failures,
+                "circuit_open": float(self.breaker.is_open),
+                "circuit_opened": self.breaker.open_count,
+            }
+
+
+_resilience: Dict[str, EmbeddingResilience] = {}
+_resilience_lock = threading.Lock()
+
+
+def get_resilience(provider_name: str) -> EmbeddingResilience:
+    """
+    Get the resilience layer shared by every embedder of a provider.
+
+    Args:
+        provider_name (str): The embedding provider.
+
+    Returns:
+        EmbeddingResilience: The provider's resilience layer.
+    """
+    with _resilience_lock:
+        resilience = _resilience.get(provider_name)
+        if resilience is None:
+            resilience = EmbeddingResilience(provider_name)
+            _resilience[provider_name] = resilience
+        return resilience
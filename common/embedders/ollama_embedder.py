@@ -2,6 +2,7 @@ import os
 from typing import List
 from langchain.schema import Document
 from common.embedders.abstract_document_embedder import AbstractDocumentEmbedder
+from common.embedders.embedding_resilience import get_resilience
 from logging_config import setup_logger
 from langchain_ollama import OllamaEmbeddings
 
@@ -9,6 +10,8 @@ logger = setup_logger(__name__)
 
 
 class OllamaEmbedder(AbstractDocumentEmbedder):
+    provider_name = "ollama"
+
     def __init__(self):
         super().__init__()
         _embedding_model_provider = os.environ.get(
@@ -26,15 +29,36 @@ class OllamaEmbedder(AbstractDocumentEmbedder):
                 base_url=_ollama_base_url, model=_ollama_embedding_model
             )
             self._embedding_model = _embedding_model
+            self.model_id = _ollama_embedding_model
 
     def embed_documents(self, documents: List[Document]) -> List[List[float]]:
         # iterate through the document List
         doc_content: List[str] = []
         for document in documents:
             doc_content.append(document.page_content)
-        vectors = self._embedding_model.embed_documents(doc_content)
+        vectors = self._embed_batches(
+            doc_content, self._embedding_model.embed_documents
+        )
         return vectors
 
     def embed_query(self, input_text: str) -> List[float]:
-        vectors = self._embedding_model.embed_query(input_text)
+        vectors = get_resilience(self.provider_name).call(
+            self._embedding_model.embed_query, input_text
+        )
         return vectors
+
+    def embed_queries(self, input_texts: List[str]) -> List[List[float]]:
+        # queries are embedded like documents by this provider
+        return self._embed_batches(input_texts, self._embedding_model.embed_documents)
+
+    async def aembed_documents(self, documents: List[Document]) -> List[List[float]]:
+        doc_content = [document.page_content for document in documents]
+        return await self._afan_out(
+            doc_content, self._embedding_model.aembed_documents
+        )
+
+    async def aembed_query(self, input_text: str) -> List[float]:
+        async with self._provider_slots():
+            return await get_resilience(self.provider_name).acall(
+                self._embedding_model.aembed_query, input_text
+            )
@@ -5,6 +5,7 @@ from langchain.schema import Document
 from langchain_openai import OpenAIEmbeddings
 
 from common.embedders.abstract_document_embedder import AbstractDocumentEmbedder
+from common.embedders.embedding_resilience import get_resilience
 from logging_config import setup_logger
 
 
@@ -12,6 +13,8 @@ logger = setup_logger(__name__)
 
 
 class OpenAIEmbedder(AbstractDocumentEmbedder):
+    provider_name = "openai"
+
     def __init__(self):
         _embedding_model_provider = os.environ.get(
             "EMBEDDING_MODEL_PROVIDER", "OpenAI"
@@ -28,15 +31,36 @@ class OpenAIEmbedder(AbstractDocumentEmbedder):
             model=_openai_embedding_model,
         )
         self._embedding_model = _embedding_model
+        self.model_id = _openai_embedding_model
 
     def embed_documents(self, documents: List[Document]) -> List[List[float]]:
         # iterate through the document List
         doc_content: List[str] = []
         for document in documents:
             doc_content.append(document.page_content)
-        vectors = self._embedding_model.embed_documents(doc_content)
+        vectors = self._embed_batches(
+            doc_content, self._embedding_model.embed_documents
+        )
         return vectors
 
     def embed_query(self, input_text: str) -> List[float]:
-        vectors = self._embedding_model.embed_query(input_text)
+        vectors = get_resilience(self.provider_name).call(
+            self._embedding_model.embed_query, input_text
+        )
         return vectors
+
+    def embed_queries(self, input_texts: List[str]) -> List[List[float]]:
+        # queries are embedded like documents by this provider
+        return self._embed_batches(input_texts, self._embedding_model.embed_documents)
+
+    async def aembed_documents(self, documents: List[Document]) -> List[List[float]]:
+        doc_content = [document.page_content for document in documents]
+        return await self._afan_out(
+            doc_content, self._embedding_model.aembed_documents
+        )
+
+    async def aembed_query(self, input_text: str) -> List[float]:
+        async with self._provider_slots():
+            return await get_resilience(self.provider_name).acall(
+                self._embedding_model.aembed_query, input_text
+            )
@@ -1,5 +1,7 @@
 import logging
 import os
+import threading
+from datetime import datetime, timedelta, timezone
 
 import boto3
 from dotenv import load_dotenv
@@ -17,16 +19,26 @@ class AWSUtil:
         _aws_access_key = os.environ.get("AWS_ACCESS_KEY")
         _aws_region_id = os.environ.get("AWS_REGION_ID")
         _aws_role_arn = os.environ.get("AWS_ROLE_ARN")
+        # refresh the assumed role credentials this many seconds before they expire
+        _refresh_margin = int(os.environ.get("AWS_CREDENTIAL_REFRESH_MARGIN", "300"))
 
         self.session = boto3.Session(
             aws_access_key_id=_aws_access_key,
             aws_secret_access_key=_aws_secret_key,
             region_name=_aws_region_id,
         )
+        self.role_arn = _aws_role_arn
+        self.region_name = _aws_region_id
+        self.refresh_margin = timedelta(seconds=_refresh_margin)
+
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._assume_role()
 
+    def _assume_role(self):
         sts_client = self.session.client("sts")
         assume_role_response = sts_client.assume_role(
-            RoleArn=_aws_role_arn, RoleSessionName="AWSSampleSession"
+            RoleArn=self.role_arn, RoleSessionName="AWSSampleSession"
         )
 
         credentials = assume_role_response["Credentials"]
@@ -34,19 +46,51 @@ class AWSUtil:
         self.aws_access_key_id = credentials["AccessKeyId"]
         self.aws_secret_access_key = credentials["SecretAccessKey"]
         self.aws_session_token = credentials["SessionToken"]
-        self.region_name = _aws_region_id
+        self.expiration = credentials.get("Expiration")
+        # clients are bound to the credentials they were created with
+        self._clients = {}
+
+    def credentials_expired(self) -> bool:
+        """
+        Check whether the assumed role credentials are expired or about to expire.
+
+        Returns:
+            bool: True if the credentials expire within the refresh margin.
+        """
+        if self.expiration is None:
+            return False
+        now = datetime.now(timezone.utc)
+        return now + self.refresh_margin >= self.expiration
+
+    def refresh(self):
+        """
+        Assume the role again and drop the clients created with the old credentials.
+        """
+        with self._lock:
+            logger.info("Refreshing assumed role credentials for: %s", self.role_arn)
+            self._assume_role()
 
     def get_client(self, service_name):
 
-        logger.info("Getting client for service: %s", service_name)
+        if self.credentials_expired():
+            self.refresh()
 
-        if self.aws_session_token is None:
-            raise ValueError("AWS_SESSION_TOKEN is not set")
+        with self._lock:
+            client = self._clients.get(service_name)
+            if client is not None:
+                return client
 
-        return boto3.client(
-            service_name,
-            aws_access_key_id=self.aws_access_key_id,
-            aws_secret_access_key=self.aws_secret_access_key,
-            aws_session_token=self.aws_session_token,
-            region_name=self.region_name,
-        )
+            logger.info("Getting client for service: %s", service_name)
+
+            if self.aws_session_token is None:
+                raise ValueError("AWS_SESSION_TOKEN is not set")
+
+            client = boto3.client(
+                service_name,
+                aws_access_key_id=self.aws_access_key_id,
+                aws_secret_access_key=self.aws_secret_access_key,
+                aws_session_token=self.aws_session_token,
+                region_name=self.region_name,
+            )
+            self._clients[service_name] = client
+            return client
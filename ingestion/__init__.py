@@ -9,8 +9,12 @@ from ingestion.splitters import (
     SentenceSplitter,
 )
 
+from .backfill import Backfill
+from .ingestion_manifest import IngestionManifest
 from .ingestion_pipeline import IngestionPipeline
 from .ingestion_pipeline_handler import IngestionPipelineHandler
+from .pipeline_components import PipelineComponents
+from .staged_pipeline import StagedPipeline
 from .universal_loader import UniversalLoader
 from .universal_splitter import UniversalSplitter
 from .universal_embedder import UniversalEmbedder
@@ -33,5 +37,9 @@ __all__ = [
     "SemanticSplitter",
     "IngestionPipelineHandler",
     "IngestionPipeline",
+    "Backfill",
+    "IngestionManifest",
+    "PipelineComponents",
+    "StagedPipeline",
     "UniversalEmbedder"
 ]
@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator
+
+from dotenv import load_dotenv
+
+from ingestion.ingestion_pipeline import IngestionPipeline
+from ingestion.staged_pipeline import StagedPipeline
+from ingestion.universal_loader import UniversalLoader
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+
+def scan_directory(
+    path: str, extensions: Iterable[str], recursive: bool = True
+) -> Iterator[str]:
+    """
+    Walk a directory tree and yield the paths of files with a supported extension.
+
+    The walk uses os.scandir with an explicit stack, so file types come from the
+    directory entries without an extra stat call per file and no full listing of
+    the tree is ever held in memory.
+
+    Args:
+        path (str): The root directory to walk.
+        extensions (Iterable[str]): Lower-case extensions to keep, e.g. ".pdf".
+        recursive (bool): Whether to descend into sub-directories.
+
+    Yields:
+        str: The path of every matching file.
+    """
+    _extensions = frozenset(extensions)
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                stack.append(entry.path)
+                        elif (
+                            entry.is_file()
+                            and os.path.splitext(entry.name)[1].lower() in _extensions
+                        ):
+                            yield entry.path
+                    except OSError as e:
+                        logger.warning(f"Skipping {entry.path}: {e}")
+        except OSError as e:
+            logger.warning(f"Cannot scan directory {directory}: {e}")
+
+
+class Backfill:
+    """
+    A one-shot ingestion of every supported file already present in a directory.
+
+    Files are discovered lazily and ingested in parallel by the pipeline's shared
+    components, with periodic progress reports and a final throughput summary.
+    """
+
+    def __init__(self, pipeline: IngestionPipeline):
+        """
+        Initialize the backfill.
+
+        Args:
+            pipeline (IngestionPipeline): The pipeline used to ingest every file.
+        """
+        self.pipeline = pipeline
+        self.workers = int(os.environ.get("BACKFILL_WORKERS", "8"))
+        self.progress_interval = float(
+            os.environ.get("BACKFILL_PROGRESS_INTERVAL", "10")
+        )
+
+        self._lock = threading.Lock()
+        self._discovered = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._started = 0.0
+        # bounds the number of files submitted but not yet finished
+        self._slots = threading.BoundedSemaphore(self.workers * 2)
+
+    def _record(self, file_path: str, succeeded: bool) -> None:
+        with self._lock:
+            if succeeded:
+                self._succeeded += 1
+            else:
+                self._failed += 1
+        self._slots.release()
+
+    def _process(self, file_path: str) -> None:
+        succeeded = False
+        try:
+            succeeded = self.pipeline.process_document(file_path) is not False
+        finally:
+            self._record(file_path, succeeded)
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get the backfill progress so far.
+
+        Returns:
+            Dict[str, float]: The files discovered, succeeded and failed, the elapsed
+            time in seconds and the files-per-second rate.
+        """
+        with self._lock:
+            elapsed = time.perf_counter() - self._started
+            finished = self._succeeded + self._failed
+            return {
+                "discovered": self._discovered,
+                "succeeded": self._succeeded,
+                "failed": self._failed,
+                "elapsed": elapsed,
+                "files_per_second": finished / elapsed if elapsed > 0 else 0.0,
+            }
+
+    def _report_progress(self, stop: threading.Event) -> None:
+        while not stop.wait(self.progress_interval):
+            stats = self.get_stats()
+            logger.info(
+                f"Backfill progress: {stats['succeeded'] + stats['failed']:.0f}"
+                f"/{stats['discovered']:.0f} files, {stats['failed']:.0f} failed, "
+                f"{stats['files_per_second']:.2f} files/s"
+            )
+
+    def run(self, path: str, recursive: bool = True) -> Dict[str, float]:
+        """
+        Ingest every supported file under a directory and wait for completion.
+
+        Args:
+            path (str): The root directory to backfill.
+            recursive (bool): Whether to descend into sub-directories.
+
+        Returns:
+            Dict[str, float]: The final statistics, see get_stats.
+
+        Raises:
+            ValueError: If the path is not a directory.
+        """
+        if not os.path.isdir(path):
+            raise ValueError(f"Error: Backfill path is not a directory: {path}")
+
+        logger.info(f"Starting backfill of {path} with {self.workers} workers")
+        self.pipeline.components.warm_up()
+        self._started = time.perf_counter()
+
+        stop = threading.Event()
+        reporter = threading.Thread(
+            target=self._report_progress, args=(stop,), daemon=True
+        )
+        reporter.start()
+
+        files = scan_directory(path, UniversalLoader.SUPPORTED_EXTENSIONS, recursive)
+        try:
+            if self.pipeline.mode == "staged":
+                self._run_staged(files)
+            else:
+                self._run_sequential(files)
+            # make sure pipelined vector store writes are persisted
+            self.pipeline.components.get_vector_store().flush()
+        finally:
+            stop.set()
+            reporter.join()
+
+        stats = self.get_stats()
+        logger.info(
+            f"Backfill completed: {stats['succeeded']:.0f} succeeded, "
+            f"{stats['failed']:.0f} failed out of {stats['discovered']:.0f} files "
+            f"in {stats['elapsed']:.1f}s ({stats['files_per_second']:.2f} files/s)"
+        )
+        return stats
+
+    def _run_sequential(self, files: Iterable[str]) -> None:
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="backfill"
+        ) as executor:
+            for file_path in files:
+                self._slots.acquire()
+                with self._lock:
+                    self._discovered += 1
+                executor.submit(self._process, file_path)
+
+    def _run_staged(self, files: Iterable[str]) -> None:
+        staged_pipeline = StagedPipeline(
+            self.pipeline.components, self._record, self.pipeline.manifest
+        )
+        try:
+            for file_path in files:
+                self._slots.acquire()
+                with self._lock:
+                    self._discovered += 1
+                staged_pipeline.submit(file_path)
+        finally:
+            staged_pipeline.shutdown()
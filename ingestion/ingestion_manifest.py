@@ -0,0 +1,472 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+STATUS_STARTED = "started"
+STATUS_INGESTED = "ingested"
+STATUS_FAILED = "failed"
+# a copy of a file ingested at another path, not ingested itself
+STATUS_DUPLICATE = "duplicate"
+
+# bytes read at a time while hashing a file
+_HASH_BLOCK_SIZE = 1024 * 1024
+# leading bytes of a followed log hashed to detect that it was rewritten
+_LOG_HEAD_BYTES = 4096
+# bytes read at a time while looking for the last line break of a log
+_LOG_SCAN_BLOCK_SIZE = 64 * 1024
+
+
+@dataclass
+class ManifestCheck:
+    """The outcome of checking a file against the manifest."""
+
+    skip: bool
+    content_hash: Optional[str]
+    size: int
+    mtime: float
+    reason: str = ""
+    # the path was ingested before, so its old chunks have to be replaced, or
+    # deleted when it is skipped as a duplicate
+    replaces_previous: bool = False
+
+
+@dataclass
+class LogCheck:
+    """The outcome of checking a followed log file against its saved offset."""
+
+    skip: bool
+    device: int
+    inode: int
+    # the byte range of complete new lines to ingest
+    start: int
+    end: int
+    # hash of the leading bytes once the range is ingested
+    head_hash: str
+    reason: str = ""
+    # the log was rotated or truncated, so its old chunks have to be replaced
+    replaces_previous: bool = False
+
+
+class IngestionManifest:
+    """
+    A persistent SQLite record of every file the pipeline has ingested.
+
+    Each row is keyed by absolute path and holds the content hash, size, mtime, ingest
+    status and the chunking and embedding configuration the file was ingested
+    with. A file is skipped when it (or a byte-identical copy at another path) was
+    already ingested with the current configuration. The size and mtime are
+    compared first, so unchanged files are skipped without being read at all.
+
+    Followed log files are tracked separately by device, inode and the byte
+    offset up to which they were ingested, so only appended lines are read.
+    """
+
+    def __init__(self, chunking_config: str, embedding_model: str):
+        """
+        Initialize the manifest, creating the database if needed.
+
+        Args:
+            chunking_config (str): Identifies the chunking strategy and parameters.
+            embedding_model (str): Identifies the embedding provider and model.
+        """
+        _manifest_path = os.environ.get(
+            "INGESTION_MANIFEST_PATH", "ingestion_manifest.sqlite"
+        )
+        logger.debug(f"IngestionManifest using database: {_manifest_path}")
+
+        _follow_logs = os.environ.get("LOG_TAIL_ENABLED", "true").lower()
+
+        self.chunking_config = chunking_config
+        self.embedding_model = embedding_model
+        self.follow_logs = _follow_logs == "true"
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(_manifest_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    chunking_config TEXT NOT NULL,
+                    embedding_model TEXT NOT NULL,
+                    chunk_count INTEGER,
+                    error TEXT,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS files_content_hash ON files (content_hash)"
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS log_offsets (
+                    path TEXT PRIMARY KEY,
+                    device INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    head_hash TEXT NOT NULL,
+                    chunking_config TEXT NOT NULL,
+                    embedding_model TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        """
+        Compute the SHA-256 of a file's content, reading it in blocks.
+
+        Args:
+            file_path (str): The file to hash.
+
+        Returns:
+            str: The hex digest of the file content.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while block := f.read(_HASH_BLOCK_SIZE):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def check(self, file_path: str) -> ManifestCheck:
+        """
+        Decide whether a file needs to be ingested.
+
+        Args:
+            file_path (str): The file about to be ingested.
+
+        Returns:
+            ManifestCheck: Whether to skip the file, and its hash, size and mtime.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        size, mtime = stat.st_size, stat.st_mtime
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content_hash, size, mtime, status, chunking_config, "
+                "embedding_model FROM files WHERE path = ?",
+                (file_path,),
+            ).fetchone()
+
+        same_config = row is not None and row[4:6] == (
+            self.chunking_config,
+            self.embedding_model,
+        )
+        if (
+            same_config
+            and row[3] in (STATUS_INGESTED, STATUS_DUPLICATE)
+            and row[1] == size
+            and row[2] == mtime
+        ):
+            reason = "unchanged" if row[3] == STATUS_INGESTED else "unchanged duplicate"
+            return ManifestCheck(True, row[0], size, mtime, reason)
+
+        content_hash = self.hash_file(file_path)
+        with self._lock:
+            duplicate = self._connection.execute(
+                "SELECT path FROM files WHERE content_hash = ? AND status = ? "
+                "AND chunking_config = ? AND embedding_model = ? LIMIT 1",
+                (
+                    content_hash,
+                    STATUS_INGESTED,
+                    self.chunking_config,
+                    self.embedding_model,
+                ),
+            ).fetchone()
+
+        if duplicate is None:
+            return ManifestCheck(
+                False, content_hash, size, mtime, replaces_previous=row is not None
+            )
+        if duplicate[0] == file_path:
+            # only touched, remember the new mtime to skip hashing next time
+            self._record(file_path, content_hash, size, mtime, STATUS_INGESTED)
+            return ManifestCheck(True, content_hash, size, mtime, "content unchanged")
+        # chunks of what the path held before are still stored unless it was
+        # a duplicate already, the caller deletes them and then marks it
+        replaces_previous = row is not None and row[3] != STATUS_DUPLICATE
+        if not replaces_previous:
+            # remember the copy, so it is not hashed again on every event
+            self._record(file_path, content_hash, size, mtime, STATUS_DUPLICATE)
+        return ManifestCheck(
+            True,
+            content_hash,
+            size,
+            mtime,
+            f"duplicate of {duplicate[0]}",
+            replaces_previous=replaces_previous,
+        )
+
+    def _record(
+        self,
+        file_path: str,
+        content_hash: str,
+        size: int,
+        mtime: float,
+        status: str,
+        chunk_count: Optional[int] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        file_path = os.path.abspath(file_path)
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                INSERT INTO files (path, content_hash, size, mtime, status,
+                    chunking_config, embedding_model, chunk_count, error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    size = excluded.size,
+                    mtime = excluded.mtime,
+                    status = excluded.status,
+                    chunking_config = excluded.chunking_config,
+                    embedding_model = excluded.embedding_model,
+                    chunk_count = COALESCE(excluded.chunk_count, files.chunk_count),
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    file_path,
+                    content_hash,
+                    size,
+                    mtime,
+                    status,
+                    self.chunking_config,
+                    self.embedding_model,
+                    chunk_count,
+                    error,
+                    time.time(),
+                ),
+            )
+
+    def mark_started(self, file_path: str, check: ManifestCheck) -> None:
+        """
+        Record that ingestion of a file has started.
+
+        Args:
+            file_path (str): The file being ingested.
+            check (ManifestCheck): The result of check for the file.
+        """
+        self._record(
+            file_path, check.content_hash or "", check.size, check.mtime, STATUS_STARTED
+        )
+
+    def mark_ingested(
+        self, file_path: str, check: ManifestCheck, chunk_count: Optional[int] = None
+    ) -> None:
+        """
+        Record that a file was ingested successfully.
+
+        Args:
+            file_path (str): The ingested file.
+            check (ManifestCheck): The result of check for the file.
+            chunk_count (Optional[int]): The number of chunks stored for the file.
+        """
+        self._record(
+            file_path,
+            check.content_hash or "",
+            check.size,
+            check.mtime,
+            STATUS_INGESTED,
+            chunk_count,
+        )
+
+    def mark_duplicate(self, file_path: str, check: ManifestCheck) -> None:
+        """
+        Record that a file is a copy of a file ingested at another path, once
+        the chunks it had of its own are deleted.
+
+        Args:
+            file_path (str): The duplicate file.
+            check (ManifestCheck): The result of check for the file.
+        """
+        self._record(
+            file_path,
+            check.content_hash or "",
+            check.size,
+            check.mtime,
+            STATUS_DUPLICATE,
+        )
+
+    def mark_failed(
+        self, file_path: str, check: ManifestCheck, error: Optional[str] = None
+    ) -> None:
+        """
+        Record that ingestion of a file failed, so it is retried next time.
+
+        Args:
+            file_path (str): The file that failed.
+            check (ManifestCheck): The result of check for the file.
+            error (Optional[str]): A description of the failure.
+        """
+        self._record(
+            file_path,
+            check.content_hash or "",
+            check.size,
+            check.mtime,
+            STATUS_FAILED,
+            error=error,
+        )
+
+    def follows(self, file_path: str) -> bool:
+        """
+        Report whether a file is a log followed by offset (LOG_TAIL_ENABLED)
+        rather than ingested whole.
+
+        Args:
+            file_path (str): The file about to be ingested.
+
+        Returns:
+            bool: True for .log files when following is enabled.
+        """
+        return self.follow_logs and os.path.splitext(file_path)[1].lower() == ".log"
+
+    @staticmethod
+    def _hash_head(file, length: int) -> str:
+        file.seek(0)
+        return hashlib.sha256(file.read(min(length, _LOG_HEAD_BYTES))).hexdigest()
+
+    @staticmethod
+    def _last_line_end(file, start: int, size: int) -> int:
+        """Find the offset just after the last line break in [start, size)."""
+        end = size
+        while end > start:
+            block_start = max(start, end - _LOG_SCAN_BLOCK_SIZE)
+            file.seek(block_start)
+            newline = file.read(end - block_start).rfind(b"\n")
+            if newline >= 0:
+                return block_start + newline + 1
+            end = block_start
+        return start
+
+    def check_log(self, file_path: str) -> LogCheck:
+        """
+        Find the part of a followed log file that has not been ingested yet.
+
+        The saved offset is used when the file is still the same (same device
+        and inode, not shorter than the offset, same leading bytes). Otherwise
+        the log was rotated or truncated and is ingested again from the start.
+        Only complete lines are ingested, a trailing partial line is picked up
+        once it is terminated.
+
+        Args:
+            file_path (str): The log file.
+
+        Returns:
+            LogCheck: Whether to skip the file, and the byte range to ingest.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        file_path = os.path.abspath(file_path)
+        with open(file_path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT device, inode, offset, head_hash, chunking_config, "
+                    "embedding_model FROM log_offsets WHERE path = ?",
+                    (file_path,),
+                ).fetchone()
+                ingested_before = row is not None or (
+                    self._connection.execute(
+                        "SELECT 1 FROM files WHERE path = ?", (file_path,)
+                    ).fetchone()
+                    is not None
+                )
+
+            start, reason = 0, "new log"
+            if row is not None:
+                device, inode, offset, head_hash = row[:4]
+                if row[4:6] != (self.chunking_config, self.embedding_model):
+                    reason = "configuration changed"
+                elif (device, inode) != (stat.st_dev, stat.st_ino):
+                    reason = "rotated"
+                elif (
+                    stat.st_size < offset
+                    or self._hash_head(file, offset) != head_hash
+                ):
+                    reason = "truncated"
+                else:
+                    start, reason = offset, "appended"
+
+            end = self._last_line_end(file, start, stat.st_size)
+            head_hash = self._hash_head(file, end)
+
+        if end <= start:
+            return LogCheck(
+                True, stat.st_dev, stat.st_ino, start, start, head_hash, "no new lines"
+            )
+        return LogCheck(
+            False,
+            stat.st_dev,
+            stat.st_ino,
+            start,
+            end,
+            head_hash,
+            reason,
+            replaces_previous=start == 0 and ingested_before,
+        )
+
+    def mark_log_ingested(self, file_path: str, check: LogCheck) -> None:
+        """
+        Save the offset up to which a followed log file was ingested.
+
+        Args:
+            file_path (str): The log file.
+            check (LogCheck): The result of check_log for the ingested range.
+        """
+        file_path = os.path.abspath(file_path)
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                INSERT INTO log_offsets (path, device, inode, offset, head_hash,
+                    chunking_config, embedding_model, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET
+                    device = excluded.device,
+                    inode = excluded.inode,
+                    offset = excluded.offset,
+                    head_hash = excluded.head_hash,
+                    chunking_config = excluded.chunking_config,
+                    embedding_model = excluded.embedding_model,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    file_path,
+                    check.device,
+                    check.inode,
+                    check.end,
+                    check.head_hash,
+                    self.chunking_config,
+                    self.embedding_model,
+                    time.time(),
+                ),
+            )
+
+    def close(self) -> None:
+        """
+        Close the underlying database connection.
+        """
+        with self._lock:
+            self._connection.close()
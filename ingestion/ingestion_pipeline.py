@@ -1,14 +1,18 @@
 import os
 import time
+from itertools import batched
+from typing import Iterable
 
 from dotenv import load_dotenv
+from langchain.schema import Document
 from watchdog.observers import Observer
 
+from ingestion.ingestion_manifest import IngestionManifest
 from ingestion.ingestion_pipeline_handler import IngestionPipelineHandler
-from ingestion.universal_vector_store import UniversalVectorStore
-from ingestion.universal_embedder import UniversalEmbedder
+from ingestion.loaders import TextLoader
+from ingestion.pipeline_components import PipelineComponents
+from ingestion.staged_pipeline import StagedPipeline
 from ingestion.universal_loader import UniversalLoader
-from ingestion.universal_splitter import UniversalSplitter
 from logging_config import setup_logger
 
 logger = setup_logger(__name__)
@@ -21,22 +25,50 @@ class IngestionPipeline:
         file_path = os.getenv("INGESTION_SOURCE_PATH", ".")
 
         logger.debug(f"ingestion_pipeline function received file_path: {file_path}")
-
-        # Check if the file exists
-        if not os.path.exists(file_path):
-            logger.error(f"Error: Incorrect path configured : {file_path}")
-            raise ValueError(f"Error: Incorrect path configured: {file_path}")
-
         logger.debug(f"Current working directory: {os.getcwd()}")
-        logger.debug(f"Directory contents: {os.listdir(os.path.dirname(file_path))}")
 
         self.file_path = file_path
+        self.components = PipelineComponents()
+        # sequential: one file at a time per worker, staged: streaming stages
+        self.mode = os.getenv("INGESTION_PIPELINE_MODE", "sequential").lower()
+        # pages split, embedded and stored together by the sequential pipeline
+        self.batch_pages = int(os.getenv("INGESTION_BATCH_PAGES", "32"))
+        self.manifest = self._create_manifest()
+
+    def _create_manifest(self):
+        if os.getenv("INGESTION_MANIFEST_ENABLED", "true").lower() != "true":
+            return None
+        embedding_model = "{}:{}".format(
+            os.getenv("EMBEDDING_MODEL_PROVIDER", "openai").lower(),
+            os.getenv("EMBEDDING_MODEL_ID", ""),
+        )
+        return IngestionManifest(
+            self.components.config_signature("splitter"), embedding_model
+        )
 
     def run(self):
-        self.watch_directory(self.file_path, self.process_document)
+        # only watching needs the source path, a backfill is given its own
+        if not os.path.exists(self.file_path):
+            logger.error(f"Error: Incorrect path configured : {self.file_path}")
+            raise ValueError(f"Error: Incorrect path configured: {self.file_path}")
+
+        self.components.warm_up()
+        if self.mode == "staged":
+            staged_pipeline = StagedPipeline(self.components, manifest=self.manifest)
+            try:
+                self.watch_directory(self.file_path, staged_pipeline.submit)
+            finally:
+                staged_pipeline.shutdown()
+        elif self.mode == "sequential":
+            self.watch_directory(self.file_path, self.process_document)
+        else:
+            raise ValueError(f"Unknown ingestion pipeline mode: {self.mode}")
+        self.components.close()
 
     def watch_directory(self, path, process_function):
-        event_handler = IngestionPipelineHandler(process_function)
+        # appended lines are only told apart with the manifest's log offsets
+        follow_logs = self.manifest is not None and self.manifest.follow_logs
+        event_handler = IngestionPipelineHandler(process_function, follow_logs)
         observer = Observer()
         observer.schedule(event_handler, path, recursive=False)
         observer.start()
@@ -46,30 +78,119 @@ class IngestionPipeline:
         except KeyboardInterrupt:
             observer.stop()
         observer.join()
-
-    def process_document(self, file_path):
-        loader = UniversalLoader(file_path)
-        splitter = UniversalSplitter()
-        embedder = UniversalEmbedder()
-        vector_store = UniversalVectorStore()
-
-        try:
-            documents = loader.load()
-            logger.info(f"Successfully loaded {len(documents)} documents.")
-            # Process documents further as needed
-            chunks = splitter.split_documents(documents)
-            logger.info(f"Successfully split {len(chunks)} chunks.")
-
-            # loop through the chunks and print them
-            if logger.debug:
-                for chunk in chunks:
-                    print(chunk.page_content)
-                    print("-" * 80)
+        # finish the files that were already detected before exiting
+        event_handler.shutdown(drain=True)
+
+    def _ingest(self, documents: Iterable[Document]) -> int:
+        """
+        Split, embed and store documents, INGESTION_BATCH_PAGES at a time, so
+        memory stays bounded by the batch rather than the file.
+
+        Args:
+            documents (Iterable[Document]): The loaded documents, e.g. a lazy_load.
+
+        Returns:
+            int: The number of chunks stored.
+        """
+        splitter = self.components.get_splitter()
+        embedder = self.components.get_embedder()
+        vector_store = self.components.get_vector_store()
+
+        chunk_count = 0
+        for batch in batched(documents, self.batch_pages):
+            chunks = splitter.split_documents(list(batch))
+            logger.info(
+                f"Successfully split {len(batch)} documents into {len(chunks)} chunks."
+            )
+            if not chunks:
+                continue
 
             embeddings = embedder.embed_documents(chunks)
             logger.info(f"Successfully embedded {len(embeddings)} embeddings.")
 
             vector_store.save_doc_embeddings(chunks, embeddings)
+            chunk_count += len(chunks)
+        # asynchronous writes must land before the file is marked ingested, so
+        # a failed write fails this file rather than the next one
+        vector_store.flush()
+        return chunk_count
+
+    def process_log(self, file_path) -> bool:
+        """
+        Ingest the lines appended to a followed log file since it was last
+        ingested. A rotated or truncated log replaces its previous chunks.
+
+        Args:
+            file_path (str): The path of the log file.
+
+        Returns:
+            bool: True if the new lines were ingested, False if ingestion failed.
+        """
+        try:
+            check = self.manifest.check_log(file_path)
+            if check.skip:
+                logger.info(f"Skipping {file_path}: {check.reason}")
+                return True
+            logger.info(
+                f"Ingesting bytes {check.start}-{check.end} of {file_path}: "
+                f"{check.reason}"
+            )
+            if check.replaces_previous:
+                self.components.get_vector_store().delete_documents(
+                    os.path.abspath(file_path)
+                )
+            chunk_count = self._ingest(
+                TextLoader(file_path).load_range(check.start, check.end)
+            )
+            # the offset only moves once the range is stored, a failed range is
+            # read again on the next change
+            self.manifest.mark_log_ingested(file_path, check)
+            logger.info(f"Ingested {chunk_count} chunks from {file_path}")
+            return True
+        except Exception as e:
+            logger.error(f"Error following {file_path}: {e}")
+            self.components.handle_error(e)
+            return False
+
+    def process_document(self, file_path) -> bool:
+        """
+        Load, split, embed and store a single file.
+
+        Args:
+            file_path (str): The path of the file to ingest.
+
+        Returns:
+            bool: True if the file was ingested, False if ingestion failed.
+        """
+        if self.manifest is not None and self.manifest.follows(file_path):
+            return self.process_log(file_path)
+
+        loader = UniversalLoader(file_path)
+        check = None
+
+        try:
+            if self.manifest is not None:
+                check = self.manifest.check(file_path)
+                if check.skip:
+                    if check.replaces_previous:
+                        # now a copy of another file, drop what it held before
+                        self.components.get_vector_store().delete_documents(
+                            os.path.abspath(file_path)
+                        )
+                        self.manifest.mark_duplicate(file_path, check)
+                    logger.info(f"Skipping {file_path}: {check.reason}")
+                    return True
+                self.manifest.mark_started(file_path, check)
+
+            if check is not None and check.replaces_previous:
+                self.components.get_vector_store().delete_documents(
+                    os.path.abspath(file_path)
+                )
+
+            chunk_count = self._ingest(loader.lazy_load())
+            if check is not None:
+                self.manifest.mark_ingested(file_path, check, chunk_count)
+            return True
 
         except FileNotFoundError as e:
             logger.error(
@@ -81,3 +202,7 @@ class IngestionPipeline:
             )
         except Exception as e:
             logger.error(f"An unexpected error occurred: {e}")
+            self.components.handle_error(e)
+        if check is not None:
+            self.manifest.mark_failed(file_path, check)
+        return False
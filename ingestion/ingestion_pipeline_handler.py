@@ -1,3 +1,10 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
 from watchdog.events import FileSystemEventHandler
 
 from logging_config import setup_logger
@@ -5,12 +12,318 @@ from logging_config import setup_logger
 
 logger = setup_logger(__name__)
 
+# sentinel placed on the queue to stop a worker
+_STOP = object()
+
+# number of (size, mtime) signatures remembered for recently submitted files
+_SUBMITTED_HISTORY = 10000
+
+
+class _PendingFile:
+    """The last observed state of a file that is still being written."""
+
+    __slots__ = ("size", "mtime", "changed_at", "seen_at", "closed")
+
+    def __init__(self, size: int, mtime: float, changed_at: float):
+        self.size = size
+        self.mtime = mtime
+        self.changed_at = changed_at
+        self.seen_at = changed_at
+        # the writer closed the file, so it need not settle unless it changes
+        self.closed = False
+
 
 class IngestionPipelineHandler(FileSystemEventHandler):
-    def __init__(self, process_function):
+    """
+    A watchdog event handler that hands new files to a pool of ingestion workers.
+
+    Created, modified and moved events are coalesced per path. A file is only
+    handed over once its size and modification time have been stable for the
+    settle period, or at the next settle poll after a close-after-write
+    notification, so files that are still being copied in are never parsed half
+    written. A path that is already queued is not queued a second time. When
+    the pipeline follows .log files, it only reads them up to their last
+    complete line, so one that keeps growing is handed over every
+    LOG_TAIL_INTERVAL seconds without waiting for it to settle.
+
+    Settled files are enqueued for a pool of worker threads, so a slow document
+    never blocks the detection of the files dropped after it. The queue is
+    bounded: when it is full the settle thread waits, which applies backpressure
+    instead of buffering an unbounded backlog in memory.
+    """
+
+    def __init__(self, process_function, follow_logs: bool = False):
+        """
+        Initialize the handler and start the worker pool.
+
+        Args:
+            process_function (Callable[[str], Any]): The function called with the
+                path of every detected file.
+            follow_logs (bool): Whether process_function ingests only the lines
+                appended to .log files, so growing logs can be handed over
+                before they settle.
+        """
+        _worker_count = int(os.environ.get("INGESTION_WORKERS", "4"))
+        _queue_size = int(os.environ.get("INGESTION_QUEUE_SIZE", "1000"))
+        _settle_seconds = float(os.environ.get("INGESTION_SETTLE_SECONDS", "2"))
+        _settle_poll_interval = float(
+            os.environ.get("INGESTION_SETTLE_POLL_INTERVAL", "0.5")
+        )
+        _tail_interval = float(os.environ.get("LOG_TAIL_INTERVAL", "10"))
+
+        logger.debug(
+            f"IngestionPipelineHandler initialized with {_worker_count} workers "
+            f"and queue size {_queue_size}"
+        )
+
         self.process_function = process_function
+        self.queue: queue.Queue = queue.Queue(maxsize=_queue_size)
+
+        self._counter_lock = threading.Lock()
+        self._in_flight = 0
+        self._processed = 0
+        self._failed = 0
+        self._shutting_down = False
+
+        self.settle_seconds = _settle_seconds
+        self.settle_poll_interval = _settle_poll_interval
+        self.tail_interval = _tail_interval if follow_logs else None
+        self._pending_lock = threading.Lock()
+        self._pending: Dict[str, _PendingFile] = {}
+        self._queued: Set[str] = set()
+        self._submitted: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._stop_settling = threading.Event()
+        self._settle_thread = threading.Thread(
+            target=self._settle_loop, name="ingestion-settle", daemon=True
+        )
+        self._settle_thread.start()
+
+        self._workers: List[threading.Thread] = []
+        for i in range(max(1, _worker_count)):
+            worker = threading.Thread(
+                target=self._worker_loop, name=f"ingestion-worker-{i}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
 
     def on_created(self, event):
         if not event.is_directory:
             logger.debug(f"New document detected: {event.src_path}")
-            self.process_function(event.src_path)
+            self._track(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._track(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            logger.debug(f"Document moved: {event.src_path} -> {event.dest_path}")
+            with self._pending_lock:
+                self._pending.pop(event.src_path, None)
+            self._track(event.dest_path)
+
+    def on_closed(self, event):
+        # the writer closed the file, so there is no need to wait for it to
+        # settle; the settle thread enqueues it, as a full queue must never
+        # block the observer thread
+        if not event.is_directory:
+            try:
+                size, mtime = self._stat(event.src_path)
+            except OSError:
+                return
+            pending = _PendingFile(size, mtime, time.monotonic())
+            pending.closed = True
+            with self._pending_lock:
+                self._pending[event.src_path] = pending
+
+    @staticmethod
+    def _stat(file_path: str) -> Tuple[int, float]:
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime
+
+    def _track(self, file_path: str) -> None:
+        try:
+            size, mtime = self._stat(file_path)
+        except OSError:
+            # removed again before we could look at it
+            return
+        now = time.monotonic()
+        with self._pending_lock:
+            pending = self._pending.get(file_path)
+            if pending is None:
+                self._pending[file_path] = _PendingFile(size, mtime, now)
+            elif pending.size != size or pending.mtime != mtime:
+                pending.size, pending.mtime, pending.changed_at = size, mtime, now
+                pending.closed = False
+
+    def _settle_loop(self) -> None:
+        while not self._stop_settling.wait(self.settle_poll_interval):
+            now = time.monotonic()
+            settled: List[Tuple[str, Tuple[int, float]]] = []
+            with self._pending_lock:
+                paths = list(self._pending.items())
+            for file_path, pending in paths:
+                try:
+                    size, mtime = self._stat(file_path)
+                except OSError:
+                    with self._pending_lock:
+                        self._pending.pop(file_path, None)
+                    continue
+                with self._pending_lock:
+                    if self._pending.get(file_path) is not pending:
+                        continue
+                    if pending.size != size or pending.mtime != mtime:
+                        pending.size, pending.mtime, pending.changed_at = (
+                            size,
+                            mtime,
+                            now,
+                        )
+                        pending.closed = False
+                    if (
+                        pending.closed
+                        or now - pending.changed_at >= self.settle_seconds
+                        or self._tails(file_path, pending, now)
+                    ):
+                        del self._pending[file_path]
+                        settled.append((file_path, (size, mtime)))
+            for file_path, signature in settled:
+                self._enqueue(file_path, signature)
+
+    def _tails(self, file_path: str, pending: _PendingFile, now: float) -> bool:
+        """Report whether a growing followed log is due to be handed over."""
+        return (
+            self.tail_interval is not None
+            and os.path.splitext(file_path)[1].lower() == ".log"
+            and now - pending.seen_at >= self.tail_interval
+        )
+
+    def _enqueue(
+        self, file_path: str, signature: Optional[Tuple[int, float]] = None
+    ) -> None:
+        with self._pending_lock:
+            if file_path in self._queued:
+                logger.debug(f"Document already queued: {file_path}")
+                return
+            if signature is not None:
+                if self._submitted.get(file_path) == signature:
+                    # a late modified event for content we already submitted
+                    logger.debug(f"Document unchanged since submission: {file_path}")
+                    return
+                self._submitted[file_path] = signature
+                self._submitted.move_to_end(file_path)
+                if len(self._submitted) > _SUBMITTED_HISTORY:
+                    self._submitted.popitem(last=False)
+            self._queued.add(file_path)
+        try:
+            self.submit(file_path)
+        except RuntimeError:
+            with self._pending_lock:
+                self._queued.discard(file_path)
+            raise
+
+    def submit(self, file_path: str) -> None:
+        """
+        Enqueue a file for ingestion, blocking while the queue is full.
+
+        Args:
+            file_path (str): The path of the file to ingest.
+
+        Raises:
+            RuntimeError: If the handler is shutting down.
+        """
+        if self._shutting_down:
+            raise RuntimeError("IngestionPipelineHandler is shutting down")
+
+        if self.queue.full():
+            logger.warning(
+                f"Ingestion queue is full ({self.queue.maxsize}), waiting to enqueue: {file_path}"
+            )
+        self.queue.put(file_path)
+
+    def _worker_loop(self) -> None:
+        while True:
+            file_path = self.queue.get()
+            try:
+                if file_path is _STOP:
+                    return
+                with self._pending_lock:
+                    # later changes to the file are queued again from here on
+                    self._queued.discard(file_path)
+                with self._counter_lock:
+                    self._in_flight += 1
+                try:
+                    succeeded = self.process_function(file_path) is not False
+                    with self._counter_lock:
+                        if succeeded:
+                            self._processed += 1
+                        else:
+                            self._failed += 1
+                except Exception as e:
+                    logger.error(f"Ingestion worker failed on {file_path}: {e}")
+                    with self._counter_lock:
+                        self._failed += 1
+                finally:
+                    with self._counter_lock:
+                        self._in_flight -= 1
+            finally:
+                self.queue.task_done()
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get the current queue and worker counters.
+
+        Returns:
+            Dict[str, int]: The number of files waiting to settle, the queue depth,
+            the number of files being processed, and the number of files
+            processed and failed so far.
+        """
+        # each lock guards its own fields, and like everywhere else they are
+        # taken one at a time rather than nested
+        with self._pending_lock:
+            settling = len(self._pending)
+        with self._counter_lock:
+            return {
+                "settling": settling,
+                "queue_depth": self.queue.qsize(),
+                "in_flight": self._in_flight,
+                "processed": self._processed,
+                "failed": self._failed,
+            }
+
+    def shutdown(self, drain: bool = True) -> None:
+        """
+        Stop the worker pool.
+
+        Args:
+            drain (bool): When True, files already queued are processed before the
+                workers stop. When False, queued files are discarded and only the
+                files currently in flight are finished.
+        """
+        self._stop_settling.set()
+        self._settle_thread.join()
+        with self._pending_lock:
+            unsettled = len(self._pending)
+            self._pending.clear()
+        if unsettled:
+            logger.warning(f"Ignoring {unsettled} files that had not settled")
+
+        self._shutting_down = True
+
+        if not drain:
+            discarded = 0
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                self.queue.task_done()
+                discarded += 1
+            if discarded:
+                logger.warning(f"Discarded {discarded} queued files on shutdown")
+
+        logger.info(f"Shutting down ingestion workers: {self.get_stats()}")
+        for _ in self._workers:
+            self.queue.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+        logger.info(f"Ingestion workers stopped: {self.get_stats()}")
@@ -1,11 +1,27 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterator, List, Optional
 
 from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
 
 
 class AbstractDocumentLoader(ABC):
     @abstractmethod
+    def lazy_load(self) -> Iterator[Document]:
+        """
+        Load the document one Document (a page, or a window of text) at a time,
+        so memory is bounded by the size of a Document rather than of the file.
+
+        Yields:
+            Document: The loaded documents, in file order.
+
+        Raises:
+            FileNotFoundError: If the file is not found.
+            PermissionError: If there's no permission to read the file.
+            Exception: For any other errors during loading.
+        """
+        pass
+
     def load(self) -> List[Document]:
         """
         Load the document and return a list of Document objects.
@@ -18,13 +34,22 @@ class AbstractDocumentLoader(ABC):
             PermissionError: If there's no permission to read the file.
             Exception: For any other errors during loading.
         """
-        pass
+        return list(self.lazy_load())
 
-    @abstractmethod
-    def load_and_split(self) -> List[Document]:
+    def load_and_split(
+        self, text_splitter: Optional[TextSplitter] = None
+    ) -> List[Document]:
         """
         Load the document, split it into chunks, and return a list of Document objects.
 
+        Documents are split as they are loaded, so only one of them is held in
+        memory at a time next to the chunks.
+
+        Args:
+            text_splitter (Optional[TextSplitter]): The splitter to use, a
+                RecursiveCharacterTextSplitter with chunks of 1000 characters
+                overlapping by 200 by default.
+
         Returns:
             List[Document]: A list of loaded and split documents.
 
@@ -33,4 +58,11 @@ class AbstractDocumentLoader(ABC):
             PermissionError: If there's no permission to read the file.
             Exception: For any other errors during loading or splitting.
         """
-        pass
+        if text_splitter is None:
+            text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=1000, chunk_overlap=200
+            )
+        split_docs: List[Document] = []
+        for document in self.lazy_load():
+            split_docs.extend(text_splitter.split_documents([document]))
+        return split_docs
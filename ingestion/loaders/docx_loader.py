@@ -1,17 +1,71 @@
 import os
-from typing import List
+import re
+import zipfile
+from typing import Any, Dict, Iterator, List, Optional
+from xml.etree import ElementTree
 
+from dotenv import load_dotenv
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import Docx2txtLoader
 
 from ingestion.loaders.abstract_document_loader import AbstractDocumentLoader
 from logging_config import setup_logger
 
 logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+# WordprocessingML namespace, as ElementTree qualifies tag names
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_HEADING_NAME = re.compile(r"^heading\s*(\d)$", re.IGNORECASE)
+# run children that stand for text
+_RUN_TEXT = {
+    f"{_W}tab": "\t",
+    f"{_W}br": "\n",
+    f"{_W}cr": "\n",
+    f"{_W}noBreakHyphen": "-",
+}
+
+
+def _paragraph_text(paragraph: ElementTree.Element) -> str:
+    """Join the text runs of a w:p element, deleted text and fields excluded."""
+    parts: List[str] = []
+    for element in paragraph.iter():
+        if element.tag == f"{_W}t":
+            parts.append(element.text or "")
+        elif element.tag in _RUN_TEXT:
+            parts.append(_RUN_TEXT[element.tag])
+    return "".join(parts).strip()
+
+
+def _table_text(table: ElementTree.Element) -> str:
+    """Render a w:tbl element one row per line, cells separated by " | "."""
+    rows = []
+    for row in table.findall(f"{_W}tr"):
+        cells = [
+            " ".join(
+                text
+                for text in (_paragraph_text(p) for p in cell.iter(f"{_W}p"))
+                if text
+            )
+            for cell in row.findall(f"{_W}tc")
+        ]
+        if any(cells):
+            rows.append(" | ".join(cells))
+    return "\n".join(rows)
 
 
 class DocxLoader(AbstractDocumentLoader):
+    """
+    A class for loading DOCX documents without converting them to a single string.
+
+    word/document.xml is stream-parsed out of the archive, so memory is bounded
+    by the largest section or table rather than the document. The body is
+    yielded as structural units: a Document per section, the paragraphs under
+    a heading separated by blank lines (and cut after DOCX_SECTION_MAX_CHARS
+    characters), and a Document per table, one row per line. Each unit carries
+    its "heading_path" (the enclosing headings joined by " > ") and its
+    "element" type ("section" or "table") in metadata.
+    """
+
     def __init__(self, file_path: str):
         """
         Initialize the DocxLoader with the path to the DOCX file.
@@ -22,7 +76,10 @@ class DocxLoader(AbstractDocumentLoader):
         Example:
             >>> loader = DocxLoader("/path/to/your/docx/file.docx")
         """
+        _section_max_chars = int(os.environ.get("DOCX_SECTION_MAX_CHARS", "20000"))
+
         self.file_path = file_path
+        self.section_max_chars = max(1, _section_max_chars)
 
     def _get_full_path(self) -> str:
         """
@@ -41,15 +98,77 @@ class DocxLoader(AbstractDocumentLoader):
         """
         return os.path.abspath(os.path.expanduser(self.file_path))
 
-    def load(self) -> List[Document]:
+    @staticmethod
+    def _heading_levels(archive: zipfile.ZipFile) -> Dict[str, int]:
         """
-        Load the DOCX file and return a list of Document objects.
+        Map the ids of the paragraph styles that are headings to their level,
+        from their outline level or a "heading N" name, following basedOn.
 
-        This method reads the DOCX file from the specified path, converts it
-        into a list of Document objects, and returns the list.
+        Args:
+            archive (zipfile.ZipFile): The opened DOCX archive.
 
         Returns:
-            List[Document]: A list of Document objects loaded from the DOCX file.
+            Dict[str, int]: Heading levels, starting at 1, by style id.
+        """
+        try:
+            root = ElementTree.fromstring(archive.read("word/styles.xml"))
+        except KeyError:
+            return {}
+
+        own: Dict[str, Optional[int]] = {}
+        based_on: Dict[str, str] = {}
+        for style in root.iter(f"{_W}style"):
+            if style.get(f"{_W}type") != "paragraph":
+                continue
+            style_id = style.get(f"{_W}styleId", "")
+            level = None
+            outline = style.find(f"{_W}pPr/{_W}outlineLvl")
+            name = style.find(f"{_W}name")
+            if outline is not None and outline.get(f"{_W}val", "").isdigit():
+                level = int(outline.get(f"{_W}val")) + 1
+            elif name is not None:
+                match = _HEADING_NAME.match(name.get(f"{_W}val", ""))
+                if match:
+                    level = int(match.group(1))
+            own[style_id] = level
+            parent = style.find(f"{_W}basedOn")
+            if parent is not None:
+                based_on[style_id] = parent.get(f"{_W}val", "")
+
+        levels: Dict[str, int] = {}
+        for style_id in own:
+            current, seen = style_id, set()
+            while current in own and current not in seen:
+                if own[current] is not None:
+                    # outline levels 9 and up mark body text
+                    if own[current] <= 9:
+                        levels[style_id] = own[current]
+                    break
+                seen.add(current)
+                current = based_on.get(current, "")
+        return levels
+
+    @staticmethod
+    def _paragraph_level(
+        paragraph: ElementTree.Element, levels: Dict[str, int]
+    ) -> Optional[int]:
+        properties = paragraph.find(f"{_W}pPr")
+        if properties is None:
+            return None
+        outline = properties.find(f"{_W}outlineLvl")
+        if outline is not None and outline.get(f"{_W}val", "").isdigit():
+            level = int(outline.get(f"{_W}val")) + 1
+            return level if level <= 9 else None
+        style = properties.find(f"{_W}pStyle")
+        return levels.get(style.get(f"{_W}val", "")) if style is not None else None
+
+    def lazy_load(self) -> Iterator[Document]:
+        """
+        Load the DOCX file, yielding its sections and tables in document order.
+
+        Yields:
+            Document: A section or table of the DOCX file, see the class
+            description.
 
         Raises:
             FileNotFoundError: If the file does not exist at the specified path.
@@ -57,9 +176,10 @@ class DocxLoader(AbstractDocumentLoader):
 
         Example:
             >>> loader = DocxLoader("/path/to/your/docx/file.docx")
-            >>> documents = loader.load()
-            >>> print(len(documents))
-            1
+            >>> for document in loader.lazy_load():
+            ...     print(document.metadata["heading_path"])
+            Introduction
+            Introduction > Scope
         """
         logger.debug(f"DocxLoader loading file: {self.file_path}")
 
@@ -73,41 +193,82 @@ class DocxLoader(AbstractDocumentLoader):
         logger.info(f"File found at: {full_path}")
 
         try:
-            loader = Docx2txtLoader(full_path)
-            documents = loader.load()
-            logger.info(
-                f"Successfully loaded DOCX file with {len(documents)} document(s)."
-            )
-            return documents
+            count = 0
+            for document in self._parse(full_path):
+                count += 1
+                yield document
+            logger.info(f"Successfully loaded DOCX file with {count} document(s).")
         except Exception as e:
             logger.error(f"Error loading DOCX file: {str(e)}")
             raise
 
-    def load_and_split(self) -> List[Document]:
-        """
-        Load the DOCX file, split it into chunks, and return a list of Document objects.
+    def _parse(self, full_path: str) -> Iterator[Document]:
+        base_metadata = {
+            "source": full_path,
+            "file_name": os.path.basename(full_path),
+            "file_extension": os.path.splitext(full_path)[1],
+        }
+        headings: List[str] = []
+        paragraphs: List[str] = []
+        section_chars = 0
+        units = 0
 
-        This method reads the DOCX file from the specified path, converts it
-        into a list of Document objects, splits the documents into smaller chunks,
-        and returns the list of chunks.
+        def unit(text: str, element: str) -> Document:
+            nonlocal units
+            units += 1
+            metadata: Dict[str, Any] = {
+                **base_metadata,
+                "element": element,
+                "unit": units,
+                "heading_path": " > ".join(heading for heading in headings if heading),
+            }
+            return Document(page_content=text, metadata=metadata)
 
-        Returns:
-            List[Document]: A list of Document objects split into chunks.
+        with zipfile.ZipFile(full_path) as archive:
+            levels = self._heading_levels(archive)
+            with archive.open("word/document.xml") as stream:
+                body: Optional[ElementTree.Element] = None
+                table_depth = 0
+                for event, element in ElementTree.iterparse(
+                    stream, events=("start", "end")
+                ):
+                    if element.tag == f"{_W}tbl":
+                        table_depth += 1 if event == "start" else -1
+                    if event == "start":
+                        if element.tag == f"{_W}body":
+                            body = element
+                        continue
+                    if table_depth or body is None:
+                        continue
 
-        Raises:
-            FileNotFoundError: If the file does not exist at the specified path.
-            Exception: For any other errors during loading or splitting.
+                    if element.tag == f"{_W}p":
+                        text = _paragraph_text(element)
+                        level = self._paragraph_level(element, levels)
+                        if level is not None and text:
+                            # a heading closes the section before it
+                            if paragraphs:
+                                yield unit("\n\n".join(paragraphs), "section")
+                                paragraphs, section_chars = [], 0
+                            del headings[level - 1 :]
+                            headings.extend([""] * (level - 1 - len(headings)))
+                            headings.append(text)
+                        if text:
+                            paragraphs.append(text)
+                            section_chars += len(text) + 2
+                            if section_chars >= self.section_max_chars:
+                                yield unit("\n\n".join(paragraphs), "section")
+                                paragraphs, section_chars = [], 0
+                    elif element.tag == f"{_W}tbl":
+                        text = _table_text(element)
+                        if text:
+                            if paragraphs:
+                                yield unit("\n\n".join(paragraphs), "section")
+                                paragraphs, section_chars = [], 0
+                            yield unit(text, "table")
+                    else:
+                        continue
+                    # drop the parsed top level element to keep memory bounded
+                    del body[:]
 
-        Example:
-            >>> loader = DocxLoader("/path/to/your/docx/file.docx")
-            >>> split_documents = loader.load_and_split()
-            >>> print(len(split_documents))
-            10
-        """
-        documents = self.load()
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=200
-        )
-        split_docs = text_splitter.split_documents(documents)
-        logger.info(f"Split DOCX document into {len(split_docs)} chunks.")
-        return split_docs
+        if paragraphs:
+            yield unit("\n\n".join(paragraphs), "section")
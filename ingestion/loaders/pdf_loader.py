@@ -1,5 +1,11 @@
+import multiprocessing
 import os
-from typing import List, override
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
 from urllib.parse import unquote
 
 from dotenv import load_dotenv
@@ -12,13 +18,55 @@ from logging_config import setup_logger
 logger = setup_logger(__name__)
 load_dotenv(override=False)
 
+# extraction processes shared by all loaders, created on first use; sized by
+# PDF_EXTRACTION_WORKERS so concurrent loads do not multiply the process count
+_extraction_executor: Optional[ProcessPoolExecutor] = None
+_extraction_lock = threading.Lock()
+# pages per extraction range, bounds the pages held while a range is in flight
+_MAX_RANGE_PAGES = 32
+
+
+def _extraction_workers() -> int:
+    _workers = int(os.environ.get("PDF_EXTRACTION_WORKERS", "0"))
+    return _workers if _workers > 0 else (os.cpu_count() or 1)
+
+
+def _get_extraction_executor() -> ProcessPoolExecutor:
+    global _extraction_executor
+    with _extraction_lock:
+        if _extraction_executor is None:
+            # spawn rather than fork, the ingestion process runs many threads
+            _extraction_executor = ProcessPoolExecutor(
+                max_workers=_extraction_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _extraction_executor
+
+
+def _reset_extraction_executor() -> None:
+    global _extraction_executor
+    with _extraction_lock:
+        if _extraction_executor is not None:
+            _extraction_executor.shutdown(wait=False, cancel_futures=True)
+        _extraction_executor = None
+
+
+def _extract_page_range(full_path: str, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF, run in a worker process
+    that opens the document on its own.
+    """
+    with pymupdf.open(full_path) as source_docs:
+        return [source_docs[i].get_text() for i in range(start, stop)]  # type: ignore
+
 
 class PDFLoader(AbstractDocumentLoader):
     """
     A class for loading and processing PDF documents using PyMuPDF (fitz).
 
     This class implements the AbstractDocumentLoader interface and provides
-    methods to load PDF files, split them into chunks, and handle file paths.
+    methods to load PDF files page by page, split them into chunks, and handle
+    file paths.
 
     Attributes:
         file_path (str): The path to the PDF file to be loaded.
@@ -31,7 +79,10 @@ class PDFLoader(AbstractDocumentLoader):
         Args:
             file_path (str): The path to the PDF file.
         """
+        _parallel_min_pages = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "64"))
+
         self.file_path = file_path
+        self.parallel_min_pages = _parallel_min_pages
 
     def _get_full_path(self) -> str:
         """
@@ -43,12 +94,12 @@ class PDFLoader(AbstractDocumentLoader):
         decoded_path = unquote(self.file_path)
         return os.path.abspath(os.path.expanduser(decoded_path))
 
-    def load(self) -> List[Document]:
+    def lazy_load(self) -> Iterator[Document]:
         """
-        Load the PDF file and return a list of Document objects using PyMuPDF (fitz).
+        Load the PDF file one page at a time using PyMuPDF (fitz).
 
-        Returns:
-            List[Document]: A list of Document objects, each representing a page in the PDF.
+        Yields:
+            Document: A Document object for each page in the PDF, in page order.
 
         Raises:
             FileNotFoundError: If the specified file does not exist.
@@ -66,15 +117,10 @@ class PDFLoader(AbstractDocumentLoader):
         logger.info(f"File found at: {full_path}")
 
         try:
-            source_docs = pymupdf.open(full_path)
-            logger.info(f"PDF loaded successfully. Number of pages: {len(source_docs)}")
-            documents = []
-            # iterate the document pages and create a document object for each page
-            i = 0
-            for page in source_docs:
-                i = i + 1
-                document = Document(
-                    page_content=page.get_text(),  # type: ignore
+            # create a document object for each page
+            for i, page_text in enumerate(self._iter_page_texts(full_path), start=1):
+                yield Document(
+                    page_content=page_text,
                     metadata={
                         "page": i,
                         "location": full_path,
@@ -82,13 +128,80 @@ class PDFLoader(AbstractDocumentLoader):
                         "file_extension": os.path.splitext(full_path)[1],
                     },
                 )
-                documents.append(document)
-            return documents
 
         except Exception as e:
             logger.error(f"Error loading PDF: {str(e)}")
             raise
 
-    @override
-    def load_and_split(self) -> List[Document]:
-        return super().load_and_split()
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        """
+        Split the pages into contiguous ranges for the extraction processes, at
+        least two per worker so a slow range does not hold up the others, and
+        at most _MAX_RANGE_PAGES pages each.
+
+        Args:
+            page_count (int): The number of pages in the document.
+
+        Returns:
+            List[Tuple[int, int]]: The [start, stop) page ranges, in page order.
+        """
+        workers = _extraction_workers()
+        if workers < 2 or page_count < max(2, self.parallel_min_pages):
+            return [(0, page_count)]
+        slices = min(page_count, max(workers * 2, -(-page_count // _MAX_RANGE_PAGES)))
+        bounds = [page_count * i // slices for i in range(slices + 1)]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _iter_page_texts(self, full_path: str) -> Iterator[str]:
+        """
+        Extract the text of every page. Documents with at least
+        PDF_PARALLEL_MIN_PAGES pages are split into page ranges extracted in
+        parallel by PDF_EXTRACTION_WORKERS processes, smaller ones are
+        extracted here. At most two ranges per worker are in flight, so a
+        large document is never held in memory as a whole.
+
+        Args:
+            full_path (str): The absolute path of the PDF file.
+
+        Yields:
+            str: The text of each page, in page order.
+        """
+        with pymupdf.open(full_path) as source_docs:
+            page_count = len(source_docs)
+            logger.info(f"PDF loaded successfully. Number of pages: {page_count}")
+            ranges = self._page_ranges(page_count)
+            if len(ranges) == 1:
+                for page in source_docs:
+                    yield page.get_text()  # type: ignore
+                return
+
+        logger.debug(f"Extracting {page_count} pages in {len(ranges)} ranges")
+        next_page = 0
+        in_flight: deque = deque()
+        try:
+            executor = _get_extraction_executor()
+            pending = iter(ranges)
+            for start, stop in islice(pending, 2 * _extraction_workers()):
+                in_flight.append(
+                    executor.submit(_extract_page_range, full_path, start, stop)
+                )
+            while in_flight:
+                texts = in_flight.popleft().result()
+                next_range = next(pending, None)
+                if next_range is not None:
+                    in_flight.append(
+                        executor.submit(_extract_page_range, full_path, *next_range)
+                    )
+                for text in texts:
+                    next_page += 1
+                    yield text
+        except BrokenProcessPool:
+            logger.warning("PDF extraction processes died, extracting serially")
+            _reset_extraction_executor()
+            with pymupdf.open(full_path) as source_docs:
+                for i in range(next_page, page_count):
+                    yield source_docs[i].get_text()  # type: ignore
+        finally:
+            # the caller may stop iterating early
+            for future in in_flight:
+                future.cancel()
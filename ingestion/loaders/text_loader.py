@@ -1,14 +1,15 @@
+import mmap
 import os
-from typing import List
+from typing import Iterator, Optional, Tuple
 
+from dotenv import load_dotenv
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader as LangchainTextLoader
 
 from ingestion.loaders.abstract_document_loader import AbstractDocumentLoader
 from logging_config import setup_logger
 
 logger = setup_logger(__name__)
+load_dotenv(override=False)
 
 
 class TextLoader(AbstractDocumentLoader):
@@ -18,6 +19,12 @@ class TextLoader(AbstractDocumentLoader):
     This class implements the AbstractDocumentLoader interface and provides
     methods to load text files, split them into chunks, and handle file paths.
 
+    The file is memory-mapped and decoded one window of about
+    TEXT_LOADER_WINDOW_BYTES at a time, cut at a line boundary, so very large
+    files and logs are loaded with constant memory and without reading them
+    whole. Each window is one Document with its byte range in the file as
+    "byte_start" and "byte_end" metadata.
+
     Attributes:
         file_path (str): The path to the text file to be loaded.
     """
@@ -29,7 +36,12 @@ class TextLoader(AbstractDocumentLoader):
         Args:
             file_path (str): The path to the text file.
         """
+        _window_bytes = int(os.environ.get("TEXT_LOADER_WINDOW_BYTES", "1048576"))
+        _encoding = os.environ.get("TEXT_LOADER_ENCODING", "utf-8")
+
         self.file_path = file_path
+        self.window_bytes = max(1, _window_bytes)
+        self.encoding = _encoding
 
     def _get_full_path(self) -> str:
         """
@@ -40,12 +52,14 @@ class TextLoader(AbstractDocumentLoader):
         """
         return os.path.abspath(os.path.expanduser(self.file_path))
 
-    def load(self) -> List[Document]:
+    def lazy_load(self) -> Iterator[Document]:
         """
-        Load the text file and return a list of Document objects.
+        Load the text file one window at a time, yielding Document objects as
+        they are read.
 
-        Returns:
-            List[Document]: A list of Document objects, typically containing one document for the entire text file.
+        Yields:
+            Document: One Document per window, a single one for files smaller
+            than the window.
 
         Raises:
             FileNotFoundError: If the specified file does not exist.
@@ -63,30 +77,72 @@ class TextLoader(AbstractDocumentLoader):
         logger.info(f"File found at: {full_path}")
 
         try:
-            loader = LangchainTextLoader(full_path)
-            documents = loader.load()
-            logger.info(
-                f"Successfully loaded text file with {len(documents)} document(s)."
-            )
-            return documents
+            count = 0
+            for document in self.load_range(0):
+                count += 1
+                yield document
+            logger.info(f"Successfully loaded text file with {count} document(s).")
         except Exception as e:
             logger.error(f"Error loading text file: {str(e)}")
             raise
 
-    def load_and_split(self) -> List[Document]:
+    def load_range(self, start: int, end: Optional[int] = None) -> Iterator[Document]:
         """
-        Load the text file, split it into chunks, and return a list of Document objects.
+        Load the bytes [start, end) of the text file, one window at a time.
 
-        This method loads the text file using the `load` method and then splits the
-        resulting documents into smaller chunks using RecursiveCharacterTextSplitter.
+        Args:
+            start (int): The byte offset to start at, expected at a line or
+                character boundary.
+            end (Optional[int]): The byte offset to stop at, the file size by
+                default.
 
-        Returns:
-            List[Document]: A list of Document objects representing chunks of the text content.
+        Yields:
+            Document: One Document per window, with its absolute byte range.
+        """
+        full_path = self._get_full_path()
+        metadata = {
+            "source": full_path,
+            "file_name": os.path.basename(full_path),
+            "file_extension": os.path.splitext(full_path)[1],
+        }
+        with open(full_path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            end = size if end is None else min(end, size)
+            if start >= end:
+                # mmap cannot map an empty file
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                for window_start, window_end in self._windows(mapped, start, end):
+                    yield Document(
+                        page_content=mapped[window_start:window_end].decode(
+                            self.encoding, errors="replace"
+                        ),
+                        metadata={
+                            **metadata,
+                            "byte_start": window_start,
+                            "byte_end": window_end,
+                        },
+                    )
+
+    def _windows(
+        self, mapped: mmap.mmap, start: int, end: int
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Cut [start, end) into windows of at most window_bytes, each ending after
+        a newline when the window contains one, otherwise at a character
+        boundary.
         """
-        documents = self.load()
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=200
-        )
-        split_docs = text_splitter.split_documents(documents)
-        logger.info(f"Split text document into {len(split_docs)} chunks.")
-        return split_docs
+        while start < end:
+            stop = min(start + self.window_bytes, end)
+            if stop < end:
+                newline = mapped.rfind(b"\n", start, stop)
+                if newline >= start:
+                    stop = newline + 1
+                else:
+                    # no line break, do not cut a UTF-8 sequence in two
+                    while stop > start + 1 and mapped[stop] & 0xC0 == 0x80:
+                        stop -= 1
+            yield start, stop
+            start = stop
@@ -0,0 +1,238 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from ingestion.universal_embedder import UniversalEmbedder
+from ingestion.universal_splitter import UniversalSplitter
+from ingestion.universal_vector_store import UniversalVectorStore
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+# botocore ClientError codes of credentials that expired or were revoked
+_EXPIRED_CREDENTIAL_CODES = frozenset(
+    ["ExpiredToken", "ExpiredTokenException", "RequestExpired"]
+)
+
+
+def is_expired_credentials_error(error: BaseException) -> bool:
+    """
+    Tell whether an exception, or one it was raised from, is a botocore
+    ClientError for expired credentials. Provider clients such as langchain's
+    Bedrock embeddings re-raise the ClientError wrapped in another exception.
+
+    Args:
+        error (BaseException): The exception raised while ingesting.
+
+    Returns:
+        bool: True if the embedder's credentials have to be renewed.
+    """
+    seen = set()
+    current: Optional[BaseException] = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        response = getattr(current, "response", None)
+        if isinstance(response, dict):
+            code = response.get("Error", {}).get("Code")
+            if code in _EXPIRED_CREDENTIAL_CODES:
+                return True
+        current = current.__cause__ or current.__context__
+    return False
+
+
+class PipelineComponents:
+    """
+    A registry of the long-lived components used by the ingestion pipeline.
+
+    The splitter, embedder and vector store are built lazily on first use and
+    then reused for every document. A component is rebuilt when the environment
+    variables it is configured from change, and the embedder is also rebuilt
+    when it reports stale credentials (for example expiring AWS STS credentials).
+
+    All accessors are thread safe, so one registry can be shared by several
+    ingestion workers.
+    """
+
+    # environment variables each component is configured from
+    _CONFIG_KEYS: Dict[str, Tuple[str, ...]] = {
+        "splitter": (
+            "CHUNKING_STRATEGY",
+            "CHUNK_SIZE_UNIT",
+            "CHUNK_TOKEN_BUDGET",
+            "CHUNK_TOKEN_OVERLAP",
+            "EMBEDDING_MODEL_ID",
+            "EMBEDDING_MAX_TOKENS",
+            "FWCS_CHUNK_SIZE",
+            "FWCS_CHUNK_OVERLAP",
+            "PCS_MIN_CHUNK_LENGTH",
+            "PCS_MAX_CHUNK_LENGTH",
+            "SSCS_MODE",
+            "SSCS_CHUNK_SIZE",
+            "SSCS_SENTENCE_OVERLAP",
+            "SCS_EMBEDDING_MODEL_PROVIDER",
+            "SCS_OLLAMA_BASE_URL",
+            "SCS_OLLAMA_EMBEDDING_MODEL",
+            "SCS_MIN_CHUNK_SIZE",
+            "SCS_BREAKPOINT_THRESHOLD_TYPE",
+        ),
+        "embedder": (
+            "EMBEDDING_MODEL_PROVIDER",
+            "EMBEDDING_MODEL_ID",
+            "OLLAMA_BASE_URL",
+            "AWS_ROLE_ARN",
+            "AWS_REGION_ID",
+            "EMBEDDING_CACHE_ENABLED",
+        ),
+        "vector_store": (
+            "VECTOR_STORE",
+            "CHROMADB_FILE_PATH",
+            "CHROMADB_COLLECTION_NAME",
+            "CHROMADB_MAX_BATCH_SIZE",
+            "CHROMADB_ASYNC_WRITES",
+            "NUMPY_STORE_PATH",
+            "NUMPY_STORE_METRIC",
+            "NUMPY_STORE_READ_ONLY",
+            "NUMPY_STORE_IVF_LISTS",
+            "NUMPY_STORE_QUANTIZATION",
+            "LEXICAL_INDEX_ENABLED",
+            "BM25_INDEX_PATH",
+        ),
+    }
+
+    _FACTORIES = {
+        "splitter": UniversalSplitter,
+        "embedder": UniversalEmbedder,
+        "vector_store": UniversalVectorStore,
+    }
+
+    def __init__(self):
+        """
+        Initialize an empty registry. Components are created on first access.
+        """
+        self._lock = threading.RLock()
+        self._components: Dict[str, object] = {}
+        self._fingerprints: Dict[str, Tuple[Optional[str], ...]] = {}
+
+    def _fingerprint(self, name: str) -> Tuple[Optional[str], ...]:
+        return tuple(os.environ.get(key) for key in self._CONFIG_KEYS[name])
+
+    def _is_stale(self, name: str, component: object) -> bool:
+        if self._fingerprints.get(name) != self._fingerprint(name):
+            logger.info(f"Configuration changed, rebuilding {name}")
+            return True
+        if name == "embedder" and component.needs_refresh():  # type: ignore
+            logger.info("Embedder credentials expired, rebuilding embedder")
+            return True
+        return False
+
+    def _get(self, name: str):
+        with self._lock:
+            component = self._components.get(name)
+            if component is None or self._is_stale(name, component):
+                if component is not None:
+                    self._close(component)
+                logger.debug(f"Creating pipeline component: {name}")
+                component = self._FACTORIES[name]()
+                self._components[name] = component
+                self._fingerprints[name] = self._fingerprint(name)
+            return component
+
+    @staticmethod
+    def _close(component: object) -> None:
+        close = getattr(component, "close", None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception as e:
+            logger.error(f"Failed to close {type(component).__name__}: {e}")
+
+    def get_splitter(self) -> UniversalSplitter:
+        """
+        Get the shared splitter, creating or rebuilding it if needed.
+
+        Returns:
+            UniversalSplitter: The splitter for the configured chunking strategy.
+        """
+        return self._get("splitter")
+
+    def get_embedder(self) -> UniversalEmbedder:
+        """
+        Get the shared embedder, creating or rebuilding it if needed.
+
+        Returns:
+            UniversalEmbedder: The embedder for the configured provider.
+        """
+        return self._get("embedder")
+
+    def get_vector_store(self) -> UniversalVectorStore:
+        """
+        Get the shared vector store, creating or rebuilding it if needed.
+
+        Returns:
+            UniversalVectorStore: The configured vector store.
+        """
+        return self._get("vector_store")
+
+    def config_signature(self, name: str) -> str:
+        """
+        Describe the configuration a component is currently built from.
+
+        Args:
+            name (str): One of "splitter", "embedder" or "vector_store".
+
+        Returns:
+            str: The component's environment variables and their values.
+        """
+        return ";".join(
+            f"{key}={os.environ.get(key, '')}" for key in self._CONFIG_KEYS[name]
+        )
+
+    def warm_up(self) -> None:
+        """
+        Eagerly create all components so the first document does not pay for
+        client construction. Failures are logged and retried on first use.
+        """
+        for name in self._FACTORIES:
+            try:
+                self._get(name)
+            except Exception as e:
+                logger.error(f"Failed to warm up {name}: {e}")
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """
+        Drop a component (or all of them) so it is rebuilt on next access.
+
+        Args:
+            name (Optional[str]): One of "splitter", "embedder" or "vector_store".
+                                  Drops every component when None.
+        """
+        with self._lock:
+            names = list(self._components) if name is None else [name]
+            for component_name in names:
+                component = self._components.pop(component_name, None)
+                self._fingerprints.pop(component_name, None)
+                if component is not None:
+                    self._close(component)
+
+    def handle_error(self, error: BaseException) -> None:
+        """
+        Drop the embedder after an error caused by expired credentials, which
+        can be revoked before the expiry needs_refresh goes by, so the next
+        document is embedded with renewed ones.
+
+        Args:
+            error (BaseException): The exception raised while ingesting.
+        """
+        if is_expired_credentials_error(error):
+            logger.info("Embedder credentials expired, rebuilding the embedder")
+            self.invalidate("embedder")
+
+    def close(self) -> None:
+        """
+        Close every component, flushing pending vector store writes.
+        """
+        self.invalidate()
@@ -3,6 +3,7 @@ from .fixed_width_splitter import FixedWidthSplitter
 from .sentence_splitter import SentenceSplitter
 from .paragraph_splitter import ParagraphSplitter
 from .semantic_splitter import SemanticSplitter
+from .token_counter import TokenCounter, estimate_tokens, get_token_counter
 
 __all__ = [
     "AbstractDocumentSplitter",
@@ -10,4 +11,7 @@ __all__ = [
     "SentenceSplitter",
     "ParagraphSplitter",
     "SemanticSplitter",
+    "TokenCounter",
+    "estimate_tokens",
+    "get_token_counter",
 ]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterable, Iterator, List
 
 from dotenv import load_dotenv
 from langchain.schema import Document
@@ -15,3 +15,18 @@ class AbstractDocumentSplitter(ABC):
     @abstractmethod
     def split_documents(self, documents: List[Document]) -> List[Document]:
         pass
+
+    def lazy_split_documents(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """
+        Split a stream of documents, one document at a time, so only the
+        document being split and its chunks are held in memory.
+
+        Args:
+            documents (Iterable[Document]): The documents to split, e.g. from a
+                loader's lazy_load.
+
+        Yields:
+            Document: The chunks, in document order.
+        """
+        for document in documents:
+            yield from self.split_documents([document])
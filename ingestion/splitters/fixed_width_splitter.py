@@ -1,15 +1,40 @@
 import os
-from typing import List
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterator, List, Optional, Tuple
 
 from langchain.schema import Document
 
 from ingestion.splitters.abstract_document_splitter import AbstractDocumentSplitter
+from ingestion.splitters.token_counter import TokenCounter, get_token_counter
 from logging_config import setup_logger
 
 logger = setup_logger(__name__)
 
+# a chunk may end after any whitespace run, or preferably after a sentence
+_WHITESPACE = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*\s+|\n\s*\n")
+
+
 class FixedWidthSplitter(AbstractDocumentSplitter):
-    """A document splitter that splits text into chunks of fixed width."""
+    """
+    A document splitter that splits text into chunks of fixed width.
+
+    The positions where a chunk may end (after whitespace, and after sentence
+    ends) are found once per text, and every cut point is then picked by binary
+    search, so splitting is linear in the text length. A chunk ends at the last
+    sentence end in the second half of its window, else at the last whitespace,
+    else exactly chunk_size characters in. The next chunk starts at the word
+    boundary nearest to chunk_overlap characters before that end, and always
+    after the start of the previous chunk, so text without whitespace cannot
+    stall it.
+
+    With CHUNK_SIZE_UNIT=tokens the window is CHUNK_TOKEN_BUDGET tokens of the
+    embedding model instead, capped at the model's maximum input, and the
+    overlap is CHUNK_TOKEN_OVERLAP tokens converted to characters at the
+    window's own characters per token. Chunks then carry their "tokens" count.
+    """
 
     def __init__(self):
         """
@@ -20,8 +45,92 @@ class FixedWidthSplitter(AbstractDocumentSplitter):
 
         logger.debug(f"FixedWidthSplitter initialized with chunk_size: {_chunk_size} and chunk_overlap: {_chunk_overlap}")
 
-        self.chunk_size = _chunk_size
-        self.chunk_overlap = _chunk_overlap
+        self.chunk_size = max(1, _chunk_size)
+        self.chunk_overlap = max(0, _chunk_overlap)
+
+        _size_unit = os.environ.get("CHUNK_SIZE_UNIT", "chars").lower()
+        self.token_counter: Optional[TokenCounter] = None
+        if _size_unit == "tokens":
+            _token_budget = int(os.environ.get("CHUNK_TOKEN_BUDGET", "512"))
+            _token_overlap = int(os.environ.get("CHUNK_TOKEN_OVERLAP", "64"))
+            self.token_counter = get_token_counter()
+            self.token_budget = max(
+                1, min(_token_budget, self.token_counter.input_limit)
+            )
+            self.token_overlap = max(0, min(_token_overlap, self.token_budget // 2))
+            logger.debug(
+                f"FixedWidthSplitter sizing by tokens with token_budget: "
+                f"{self.token_budget} and token_overlap: {self.token_overlap}"
+            )
+        elif _size_unit != "chars":
+            raise ValueError(f"Unsupported CHUNK_SIZE_UNIT: {_size_unit}")
+
+    @staticmethod
+    def _boundaries(pattern: re.Pattern, text: str) -> array:
+        return array("q", (match.end() for match in pattern.finditer(text)))
+
+    @staticmethod
+    def _last_before(boundaries: array, low: int, high: int) -> int:
+        """Return the last boundary in (low, high], or -1 if there is none."""
+        i = bisect_right(boundaries, high) - 1
+        return boundaries[i] if i >= 0 and boundaries[i] > low else -1
+
+    def split_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Find the chunks of a text as character offsets.
+
+        Args:
+            text (str): The input text to split
+
+        Yields:
+            Tuple[int, int]: The start and end offset of each chunk, with
+            surrounding whitespace excluded, in text order.
+        """
+        text_length = len(text)
+        words = self._boundaries(_WHITESPACE, text)
+        sentences = self._boundaries(_SENTENCE_END, text)
+
+        start = 0
+        while start < text_length:
+            if self.token_counter is None:
+                limit = start + self.chunk_size
+                overlap = self.chunk_overlap
+            else:
+                limit = self.token_counter.fit(text, start, self.token_budget)
+                overlap = self.token_overlap * (limit - start) // self.token_budget
+            if limit >= text_length:
+                end = text_length
+            else:
+                end = self._last_before(sentences, (start + limit) // 2, limit)
+                if end < 0:
+                    end = self._last_before(words, start, limit)
+                if end < 0:
+                    end = limit
+
+            chunk_start, chunk_end = start, end
+            while chunk_start < chunk_end and text[chunk_start].isspace():
+                chunk_start += 1
+            while chunk_end > chunk_start and text[chunk_end - 1].isspace():
+                chunk_end -= 1
+            if chunk_start < chunk_end:
+                yield chunk_start, chunk_end
+
+            if end >= text_length:
+                break
+            # start the next chunk at a word boundary within the overlap, or at
+            # the one just before it, after the start of the chunk just yielded
+            # (not its raw start, which may be whitespace) so no chunk repeats
+            target = end - overlap
+            if target <= chunk_start:
+                start = end
+                continue
+            i = bisect_left(words, target)
+            if i < len(words) and words[i] < end:
+                start = words[i]
+            elif i > 0 and words[i - 1] > chunk_start:
+                start = words[i - 1]
+            else:
+                start = target
 
     def split_text(self, text: str) -> List[str]:
         """
@@ -35,30 +144,7 @@ class FixedWidthSplitter(AbstractDocumentSplitter):
         """
         if not text:
             return []
-
-        chunks = []
-        start = 0
-        text_length = len(text)
-
-        while start < text_length:
-            # Calculate end position for current chunk
-            end = start + self.chunk_size
-
-            # If this is not the last chunk, try to break at a space
-            if end < text_length:
-                # Look for the last space within the chunk
-                while end > start and text[end - 1] != " ":
-                    end -= 1
-                if end == start:  # No space found, force break at chunk_size
-                    end = start + self.chunk_size
-
-            # Add the chunk to our list
-            chunks.append(text[start:end].strip())
-
-            # Calculate the start of the next chunk considering overlap
-            start = end - self.chunk_overlap if end < text_length else text_length
-
-        return chunks
+        return [text[start:end] for start, end in self.split_spans(text)]
 
     def split_documents(self, documents: List[Document]) -> List[Document]:
         """
@@ -68,16 +154,18 @@ class FixedWidthSplitter(AbstractDocumentSplitter):
             documents (List[Document]): List of Document objects to split
 
         Returns:
-            List[Document]: A list of Document objects split into chunks
+            List[Document]: A list of Document objects split into chunks, with
+            their character offsets in the document as "start" and "end"
+            metadata, and their "tokens" when sizing by tokens
         """
         split_docs = []
         for doc in documents:
-            # Split the document content
-            text_chunks = self.split_text(doc.page_content)
-
             # Create new Document for each chunk while preserving metadata
-            for chunk in text_chunks:
-                new_doc = Document(page_content=chunk, metadata=doc.metadata.copy())
-                split_docs.append(new_doc)
+            for start, end in self.split_spans(doc.page_content):
+                chunk = doc.page_content[start:end]
+                metadata = {**doc.metadata, "start": start, "end": end}
+                if self.token_counter is not None:
+                    metadata["tokens"] = self.token_counter.count(chunk)
+                split_docs.append(Document(page_content=chunk, metadata=metadata))
 
         return split_docs
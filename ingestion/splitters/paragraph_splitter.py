@@ -1,9 +1,10 @@
 import os
-from typing import List
+from typing import List, Optional
 
 from langchain.schema import Document
 
 from ingestion.splitters.abstract_document_splitter import AbstractDocumentSplitter
+from ingestion.splitters.token_counter import TokenCounter, get_token_counter
 from logging_config import setup_logger
 
 logger = setup_logger(__name__)
@@ -15,6 +16,33 @@ class ParagraphSplitter(AbstractDocumentSplitter):
         self.min_length = int(os.getenv("PCS_MIN_CHUNK_LENGTH", 100))
         self.max_length = int(os.environ.get("PCS_MAX_CHUNK_LENGTH", 1000))
 
+        # with CHUNK_SIZE_UNIT=tokens max_length is a budget of embedding model
+        # tokens, capped at the model's maximum input; min_length stays in
+        # characters
+        _size_unit = os.environ.get("CHUNK_SIZE_UNIT", "chars").lower()
+        self.token_counter: Optional[TokenCounter] = None
+        if _size_unit == "tokens":
+            _token_budget = int(os.environ.get("CHUNK_TOKEN_BUDGET", "512"))
+            self.token_counter = get_token_counter()
+            self.max_length = max(
+                1, min(_token_budget, self.token_counter.input_limit)
+            )
+            logger.debug(
+                f"ParagraphSplitter sizing by tokens with max_length: {self.max_length}"
+            )
+        elif _size_unit != "chars":
+            raise ValueError(f"Unsupported CHUNK_SIZE_UNIT: {_size_unit}")
+
+    def _length(self, text: str) -> int:
+        if self.token_counter is None:
+            return len(text)
+        return self.token_counter.count(text)
+
+    def _truncate(self, text: str) -> str:
+        if self.token_counter is None:
+            return text[: self.max_length]
+        return text[: self.token_counter.fit(text, 0, self.max_length)]
+
     def split_text(self, text: str) -> List[str]:
         """Split text into paragraphs based on double newlines.
 
@@ -38,7 +66,11 @@ class ParagraphSplitter(AbstractDocumentSplitter):
             if not para:
                 continue
 
-            para_length = len(para)
+            para_length = self._length(para)
+            # Tokens are counted with the space joining the paragraph to the chunk
+            joined_length = para_length
+            if current_chunk and self.token_counter is not None:
+                joined_length = self._length(" " + para)
 
             # If paragraph exceeds max length, split it further
             if para_length > self.max_length:
@@ -50,15 +82,15 @@ class ParagraphSplitter(AbstractDocumentSplitter):
                 # Split long paragraph into sentences
                 sentences = para.split(". ")
                 for sentence in sentences:
-                    if len(sentence) > self.max_length:
-                        chunks.append(sentence[: self.max_length])
+                    if self._length(sentence) > self.max_length:
+                        chunks.append(self._truncate(sentence))
                     else:
                         chunks.append(sentence)
 
             # Add to current chunk if within bounds
-            elif current_length + para_length <= self.max_length:
+            elif current_length + joined_length <= self.max_length:
                 current_chunk.append(para)
-                current_length += para_length
+                current_length += joined_length
 
             # Start new chunk if adding would exceed max length
             else:
@@ -82,7 +114,8 @@ class ParagraphSplitter(AbstractDocumentSplitter):
             documents: List of Document objects to split
 
         Returns:
-            List of Document objects split into chunks
+            List of Document objects split into chunks, with their "tokens"
+            metadata when sizing by tokens
         """
         split_docs = []
         for doc in documents:
@@ -91,7 +124,10 @@ class ParagraphSplitter(AbstractDocumentSplitter):
 
             # Create new Document for each chunk while preserving metadata
             for chunk in text_chunks:
-                new_doc = Document(page_content=chunk, metadata=doc.metadata.copy())
+                metadata = doc.metadata.copy()
+                if self.token_counter is not None:
+                    metadata["tokens"] = self.token_counter.count(chunk)
+                new_doc = Document(page_content=chunk, metadata=metadata)
                 split_docs.append(new_doc)
 
         return split_docs
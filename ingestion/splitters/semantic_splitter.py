@@ -7,6 +7,7 @@ from langchain_experimental.text_splitter import SemanticChunker
 from langchain_ollama import OllamaEmbeddings
 from langchain_openai.embeddings import OpenAIEmbeddings
 
+from common.embedders.embedding_cache import CachedEmbeddings
 from ingestion.splitters.abstract_document_splitter import AbstractDocumentSplitter
 from logging_config import setup_logger
 
@@ -45,6 +46,14 @@ class SemanticSplitter(AbstractDocumentSplitter):
         else:
             _embedding_model = OpenAIEmbeddings()
 
+        if os.environ.get("EMBEDDING_CACHE_ENABLED", "true").lower() == "true":
+            # sentence embeddings are shared with the embedder through the cache
+            _embedding_model = CachedEmbeddings(
+                _embedding_model,
+                _embedding_model_provider,
+                _embedding_model.model,
+            )
+
         _min_chunk_size = os.environ.get("SCS_MIN_CHUNK_SIZE", None)
         _breakpoint_threshold_type = os.environ.get(
             "SCS_BREAKPOINT_THRESHOLD_TYPE", "percentile"
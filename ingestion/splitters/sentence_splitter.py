@@ -1,54 +1,248 @@
-from typing import List
-from ingestion.splitters.abstract_document_splitter import AbstractDocumentSplitter
+import os
+import re
+from typing import Iterator, List, Optional, Tuple
+
 from langchain.schema import Document
+
+from ingestion.splitters.abstract_document_splitter import AbstractDocumentSplitter
+from ingestion.splitters.token_counter import TokenCounter, get_token_counter
 from logging_config import setup_logger
 
 logger = setup_logger(__name__)
 
+# a sentence may end after terminal punctuation and closing quotes or brackets
+# followed by whitespace, and always ends at a blank line
+_CANDIDATE_END = re.compile(r"[.!?…]+[\"'”’)\]]*(?=\s)|\n[ \t]*\n")
+# the word before a period, which may be an abbreviation or an initial
+_WORD_BEFORE = re.compile(r"[\w.]*$")
+# initials such as "J." or "U.S.", but not the pronoun "I."
+_INITIALS = re.compile(r"(?:[A-Za-z]\.)+[A-Za-z]|[A-HJ-Z]")
+_NEXT_CHAR = re.compile(r"\s*(\S)")
+# lowercased, without their final period
+_ABBREVIATIONS = frozenset(
+    "al approx apr aug ave ca cf co corp dec dept dr e.g est etc feb fig figs "
+    "gen i.e inc jan jr jul jun lt ltd mar mr mrs ms mt no nos nov oct p pp "
+    "prof ref rev sep sept sgt sr st vol vs".split()
+)
+# how far back to look for the word before a period
+_LOOKBACK = 32
+
+
+def sentence_spans(text: str) -> Iterator[Tuple[int, int]]:
+    """
+    Find the sentences of a text as character offsets.
+
+    A sentence ends at ".", "!", "?" or an ellipsis (with any closing quotes or
+    brackets) followed by whitespace, unless the next sentence would start in
+    lowercase or the period closes a known abbreviation or an initial, such as
+    "Dr.", "e.g." or "J."; and at every blank line. Decimals ("3.14"), URLs and
+    file names never end a sentence as their periods are not followed by
+    whitespace.
+
+    Args:
+        text (str): The text to split into sentences.
+
+    Yields:
+        Tuple[int, int]: The start and end offset of each sentence, with
+        surrounding whitespace excluded, in text order.
+    """
+
+    def stripped(start: int, end: int) -> Iterator[Tuple[int, int]]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            yield start, end
+
+    start = 0
+    for match in _CANDIDATE_END.finditer(text):
+        if match.group().startswith("\n"):
+            yield from stripped(start, match.start())
+            start = match.end()
+            continue
+
+        following = _NEXT_CHAR.match(text, match.end())
+        if following is not None and following.group(1).islower():
+            continue
+        punctuation = match.group().rstrip("\"'”’)]")
+        if punctuation == ".":
+            word = _WORD_BEFORE.search(
+                text, max(0, match.start() - _LOOKBACK), match.start()
+            ).group()
+            if word.lower() in _ABBREVIATIONS or _INITIALS.fullmatch(word):
+                continue
+        yield from stripped(start, match.end())
+        start = match.end()
+
+    yield from stripped(start, len(text))
+
+
 class SentenceSplitter(AbstractDocumentSplitter):
-    """Splits documents into chunks based on sentences (full stops)."""
-    
+    """
+    Splits documents into chunks on sentence boundaries, see sentence_spans.
+
+    In the default "window" mode (SSCS_MODE) consecutive sentences are packed
+    into chunks of up to SSCS_CHUNK_SIZE characters, or CHUNK_TOKEN_BUDGET
+    embedding model tokens with CHUNK_SIZE_UNIT=tokens, and each chunk repeats
+    the last SSCS_SENTENCE_OVERLAP sentences of the one before it. A sentence
+    longer than a chunk is cut at whitespace into chunks of its own. In
+    "sentence" mode every sentence is a chunk.
+
+    Chunks carry their character offsets in the document as "start" and "end"
+    metadata, their number of "sentences", and their "tokens" when sizing by
+    tokens.
+    """
+
     def __init__(self):
-        super().__init__()
+        """
+        Initialize the sentence splitter.
+        """
+        _mode = os.environ.get("SSCS_MODE", "window").lower()
+        _chunk_size = int(os.environ.get("SSCS_CHUNK_SIZE", "1000"))
+        _sentence_overlap = int(os.environ.get("SSCS_SENTENCE_OVERLAP", "1"))
+        if _mode not in ("window", "sentence"):
+            raise ValueError(f"Unsupported SSCS_MODE: {_mode}")
+
+        self.mode = _mode
+        self.chunk_size = max(1, _chunk_size)
+        self.sentence_overlap = max(0, _sentence_overlap)
+
+        _size_unit = os.environ.get("CHUNK_SIZE_UNIT", "chars").lower()
+        self.token_counter: Optional[TokenCounter] = None
+        if _size_unit == "tokens":
+            _token_budget = int(os.environ.get("CHUNK_TOKEN_BUDGET", "512"))
+            self.token_counter = get_token_counter()
+            self.chunk_size = max(
+                1, min(_token_budget, self.token_counter.input_limit)
+            )
+        elif _size_unit != "chars":
+            raise ValueError(f"Unsupported CHUNK_SIZE_UNIT: {_size_unit}")
+
+        logger.debug(
+            f"SentenceSplitter initialized with mode: {self.mode}, chunk_size: "
+            f"{self.chunk_size} {_size_unit} and sentence_overlap: "
+            f"{self.sentence_overlap}"
+        )
+
+    def _size(self, text: str, start: int, end: int) -> int:
+        if self.token_counter is None:
+            return end - start
+        return self.token_counter.count(text[start:end])
+
+    def _cut(self, text: str, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        """Cut a sentence longer than a chunk at whitespace, or hard if it has none."""
+        while start < end:
+            if self.token_counter is None:
+                limit = start + self.chunk_size
+            else:
+                limit = self.token_counter.fit(text, start, self.chunk_size)
+            cut = min(end, limit)
+            if cut < end:
+                space = max(text.rfind(" ", start, cut), text.rfind("\n", start, cut))
+                if space > start:
+                    cut = space
+            yield start, cut
+            start = cut
+            while start < end and text[start].isspace():
+                start += 1
+
+    def split_spans(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """
+        Find the chunks of a text as character offsets.
+
+        Args:
+            text (str): The input text to split
+
+        Yields:
+            Tuple[int, int, int]: The start and end offset of each chunk and
+            the number of sentences in it, in text order.
+        """
+        sentences = list(sentence_spans(text))
+        if self.mode == "sentence":
+            for start, end in sentences:
+                yield start, end, 1
+            return
+
+        # the size of each sentence, and of it together with the whitespace
+        # before it, so a run of sentences is measured without measuring it again
+        own = [self._size(text, start, end) for start, end in sentences]
+        sizes = own[:1]
+        for i in range(1, len(sentences)):
+            gap = sentences[i][0] - sentences[i - 1][1]
+            sizes.append(own[i] + (gap if self.token_counter is None else 0))
+
+        first = 0
+        while first < len(sentences):
+            start, end = sentences[first]
+            if own[first] > self.chunk_size:
+                # cut alone, never overlapped into a neighbouring chunk
+                for cut_start, cut_end in self._cut(text, start, end):
+                    yield cut_start, cut_end, 1
+                first += 1
+                continue
+
+            last = first
+            size = own[first]
+            while (
+                last + 1 < len(sentences)
+                and own[last + 1] <= self.chunk_size
+                and size + sizes[last + 1] <= self.chunk_size
+            ):
+                last += 1
+                size += sizes[last]
+            yield start, sentences[last][1], last - first + 1
+
+            if last + 1 >= len(sentences):
+                break
+            # repeat the overlap, but always move forward and drop overlapped
+            # sentences that would not fit next to the following one
+            next_first = max(first + 1, last + 1 - self.sentence_overlap)
+            while (
+                next_first <= last
+                and own[next_first] + sum(sizes[next_first + 1 : last + 2])
+                > self.chunk_size
+            ):
+                next_first += 1
+            first = next_first
 
     def split_documents(self, documents: List[Document]) -> List[Document]:
         """
         Split a list of documents into chunks based on sentences.
-        
+
         Args:
             documents: List of Document objects to split
-            
+
         Returns:
-            List of Document objects split by sentences
+            List of Document objects, each a run of whole sentences with its
+            offsets in the document as "start" and "end" metadata
         """
         logger.info("Splitting documents into sentences.")
         split_docs = []
-        logger.debug(f"Received {len(documents)} documents to split.")  # Log the debu
+        logger.debug(f"Received {len(documents)} documents to split.")
         for doc in documents:
-            logger.debug(f"Processing document: {doc.page_content}")  # Log the debug info
-            # Split content by full stops, preserving the full stop
-            sentences = [s.strip() + '.' for s in doc.page_content.split('.') if s.strip()]
-            logger.debug(f"Split document into {len(sentences)} sentences.")  # Log the debug info
-            # Create new Document for each sentence while preserving metadata
-            for sentence in sentences:
-                new_doc = Document(
-                    page_content=sentence,
-                    metadata=doc.metadata.copy()
-                )
-                split_docs.append(new_doc)
-        logger.info(f"Split {len(documents)} documents into {len(split_docs)} sentences.")  # Log the inf
+            for start, end, sentences in self.split_spans(doc.page_content):
+                chunk = doc.page_content[start:end]
+                metadata = {
+                    **doc.metadata,
+                    "start": start,
+                    "end": end,
+                    "sentences": sentences,
+                }
+                if self.token_counter is not None:
+                    metadata["tokens"] = self.token_counter.count(chunk)
+                split_docs.append(Document(page_content=chunk, metadata=metadata))
+        logger.info(f"Split {len(documents)} documents into {len(split_docs)} chunks.")
         return split_docs
 
     def split_text(self, text: str) -> List[str]:
         """
         Split a text string into chunks based on sentences.
-        
+
         Args:
             text: String to split
-            
+
         Returns:
-            List of sentence strings
+            List of chunk strings
         """
-        # Split by full stops and clean up
-        sentences = [s.strip() + '.' for s in text.split('.') if s.strip()]
-        return sentences
+        return [text[start:end] for start, end, _ in self.split_spans(text)]
@@ -0,0 +1,203 @@
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+# maximum input tokens and tiktoken encoding by embedding model id prefix
+_MODEL_LIMITS = (
+    ("text-embedding-3", 8191, "cl100k_base"),
+    ("text-embedding-ada-002", 8191, "cl100k_base"),
+    ("amazon.titan-embed-text-v2", 8192, None),
+    ("amazon.titan-embed-text-v1", 8192, None),
+    ("amazon.titan-embed-image", 128, None),
+    ("cohere.embed", 512, None),
+    ("nomic-embed-text", 8192, None),
+    ("bge-m3", 8192, None),
+    ("mxbai-embed-large", 512, None),
+    ("snowflake-arctic-embed", 512, None),
+    ("all-minilm", 256, None),
+)
+_DEFAULT_MAX_TOKENS = 512
+# share of the maximum input usable when tokens are only estimated
+_ESTIMATE_MARGIN = 0.9
+# no token of the supported models spans more characters than this
+_MAX_CHARS_PER_TOKEN = 16
+
+# letter runs, digit runs and any other non-space character
+_PIECES = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_")
+
+
+def _piece_tokens(piece: str) -> int:
+    if piece[0].isdigit():
+        return math.ceil(len(piece) / 2)
+    if piece[0].isalpha() and piece.isascii():
+        return math.ceil(len(piece) / 4)
+    # non-latin scripts are split into about a token per character
+    return len(piece)
+
+
+def _piece_chars(piece: str, tokens: int) -> int:
+    """Return how many characters of a piece fit in a number of tokens."""
+    if piece[0].isdigit():
+        return min(len(piece), tokens * 2)
+    if piece[0].isalpha() and piece.isascii():
+        return min(len(piece), tokens * 4)
+    return min(len(piece), tokens)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a text without a tokenizer, on the high side
+    for the subword tokenizers of embedding models: a token per four letters of
+    a word, per two digits, and per punctuation or symbol character.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return sum(_piece_tokens(piece) for piece in _PIECES.findall(text))
+
+
+class TokenCounter:
+    """
+    Counts the tokens of texts the way an embedding model does, with the
+    model's tiktoken encoding when it has one and tiktoken is installed, and
+    with estimate_tokens otherwise.
+
+    Attributes:
+        model_id (str): The embedding model.
+        max_tokens (int): The most tokens the model accepts per input.
+        exact (bool): Whether counts come from the model's own tokenizer.
+    """
+
+    def __init__(
+        self, model_id: str, max_tokens: int, encoding_name: Optional[str] = None
+    ):
+        """
+        Initialize the counter.
+
+        Args:
+            model_id (str): The embedding model.
+            max_tokens (int): The most tokens the model accepts per input.
+            encoding_name (Optional[str]): The model's tiktoken encoding.
+        """
+        self.model_id = model_id
+        self.max_tokens = max_tokens
+        self._encoding = None
+        if encoding_name is not None:
+            try:
+                import tiktoken
+
+                self._encoding = tiktoken.get_encoding(encoding_name)
+            except ImportError:
+                logger.debug("tiktoken is not installed, estimating token counts")
+        self.exact = self._encoding is not None
+
+    @property
+    def input_limit(self) -> int:
+        """The most counted tokens a chunk may have, with a margin for estimates."""
+        if self.exact:
+            return self.max_tokens
+        return int(self.max_tokens * _ESTIMATE_MARGIN)
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens of a text.
+
+        Args:
+            text (str): The text to measure.
+
+        Returns:
+            int: The number of tokens.
+        """
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return estimate_tokens(text)
+
+    def fit(self, text: str, start: int, budget: int) -> int:
+        """
+        Find how far a chunk starting at start can extend within a token budget.
+
+        Args:
+            text (str): The text being split.
+            start (int): The offset the chunk starts at.
+            budget (int): The most tokens the chunk may have.
+
+        Returns:
+            int: The largest end offset such that text[start:end] has at most
+            budget tokens, and at least start + 1.
+        """
+        budget = max(1, budget)
+        high = min(len(text), start + budget * _MAX_CHARS_PER_TOKEN)
+        if self._encoding is None:
+            tokens = 0
+            for match in _PIECES.finditer(text, start, high):
+                piece_tokens = _piece_tokens(match.group())
+                if tokens + piece_tokens > budget:
+                    # only a piece that starts the chunk is cut inside
+                    if tokens == 0:
+                        return match.start() + _piece_chars(match.group(), budget)
+                    return match.start()
+                tokens += piece_tokens
+            return high
+
+        encoded = self._encoding.encode(text[start:high], disallowed_special=())
+        if len(encoded) <= budget:
+            return high
+        prefix = self._encoding.decode_bytes(encoded[:budget])
+        end = max(start + 1, start + len(prefix.decode("utf-8", errors="ignore")))
+        # the prefix can tokenize differently on its own, shrink it if it must
+        if self.count(text[start:end]) <= budget:
+            return end
+        low, high = start + 1, end - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(text[start:middle]) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+
+@lru_cache(maxsize=None)
+def _token_counter(model_id: str, max_tokens: Optional[int]) -> TokenCounter:
+    model = model_id.lower()
+    limit, encoding_name = _DEFAULT_MAX_TOKENS, None
+    for prefix, model_limit, model_encoding in _MODEL_LIMITS:
+        if model.startswith(prefix):
+            limit, encoding_name = model_limit, model_encoding
+            break
+    else:
+        logger.warning(
+            f"Unknown input limit for {model_id}, assuming {_DEFAULT_MAX_TOKENS} "
+            "tokens, set EMBEDDING_MAX_TOKENS to override"
+        )
+    counter = TokenCounter(model_id, max_tokens or limit, encoding_name)
+    logger.debug(
+        f"TokenCounter for {model_id}: {counter.max_tokens} tokens, "
+        f"exact: {counter.exact}"
+    )
+    return counter
+
+
+def get_token_counter() -> TokenCounter:
+    """
+    Get the shared token counter of the configured embedding model,
+    EMBEDDING_MODEL_ID, with its input limit overridden by EMBEDDING_MAX_TOKENS.
+
+    Returns:
+        TokenCounter: The counter, created once per model.
+    """
+    _model_id = os.environ.get("EMBEDDING_MODEL_ID", "")
+    _max_tokens = int(os.environ.get("EMBEDDING_MAX_TOKENS", "0"))
+    return _token_counter(_model_id, _max_tokens or None)
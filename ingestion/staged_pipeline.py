@@ -0,0 +1,377 @@
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from itertools import batched
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+from langchain.schema import Document
+
+from ingestion.ingestion_manifest import IngestionManifest, LogCheck, ManifestCheck
+from ingestion.loaders import TextLoader
+from ingestion.pipeline_components import PipelineComponents
+from ingestion.universal_loader import UniversalLoader
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+# sentinel placed on a stage queue to stop one of its workers
+_STOP = object()
+
+
+@dataclass
+class WorkItem:
+    """A slice of one source file travelling through the pipeline stages."""
+
+    file_path: str
+    documents: List[Document] = field(default_factory=list)
+    embeddings: Optional[List[List[float]]] = None
+    # the bytes to load of a followed log, the whole file when None
+    byte_range: Optional[Tuple[int, int]] = None
+
+
+class _FileTracker:
+    """Counts the outstanding work items of every file in the pipeline."""
+
+    def __init__(self, on_complete: Callable[[str, bool, int], None]):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, int] = {}
+        self._failed: Dict[str, bool] = {}
+        self._chunks: Dict[str, int] = {}
+        self._started: Dict[str, float] = {}
+        self._on_complete = on_complete
+
+    def start(self, file_path: str) -> None:
+        with self._lock:
+            self._pending[file_path] = self._pending.get(file_path, 0) + 1
+            self._failed.setdefault(file_path, False)
+            self._chunks.setdefault(file_path, 0)
+            self._started.setdefault(file_path, time.perf_counter())
+
+    def add(self, file_path: str, count: int = 1) -> None:
+        with self._lock:
+            self._pending[file_path] += count
+
+    def stored(self, file_path: str, chunks: int) -> None:
+        with self._lock:
+            self._chunks[file_path] += chunks
+
+    def fail(self, file_path: str) -> None:
+        with self._lock:
+            self._failed[file_path] = True
+
+    def done(self, file_path: str) -> None:
+        with self._lock:
+            self._pending[file_path] -= 1
+            if self._pending[file_path] > 0:
+                return
+            del self._pending[file_path]
+            failed = self._failed.pop(file_path)
+            chunks = self._chunks.pop(file_path)
+            elapsed = time.perf_counter() - self._started.pop(file_path)
+
+        if failed:
+            logger.error(f"Ingestion of {file_path} failed after {elapsed:.2f}s")
+        else:
+            logger.info(f"Ingested {file_path}: {chunks} chunks in {elapsed:.2f}s")
+        self._on_complete(file_path, not failed, chunks)
+
+    def pending_files(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+
+class _Stage:
+    """A pool of worker threads draining one bounded queue."""
+
+    def __init__(
+        self,
+        name: str,
+        worker_count: int,
+        queue_size: int,
+        process: Callable[[WorkItem], Iterable[WorkItem]],
+        tracker: _FileTracker,
+        on_error: Callable[[BaseException], None],
+        next_stage: Optional["_Stage"] = None,
+    ):
+        self.name = name
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._process = process
+        self._tracker = tracker
+        self._on_error = on_error
+        self._next_stage = next_stage
+        self._workers = [
+            threading.Thread(
+                target=self._worker_loop, name=f"{name}-worker-{i}", daemon=True
+            )
+            for i in range(max(1, worker_count))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def put(self, item: WorkItem) -> None:
+        self.queue.put(item)
+
+    def _worker_loop(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            try:
+                for output in self._process(item):
+                    if self._next_stage is None:
+                        continue
+                    # account for the output before handing it over so the file
+                    # cannot be reported complete while it is still in flight
+                    self._tracker.add(output.file_path)
+                    self._next_stage.put(output)
+            except Exception as e:
+                logger.error(f"{self.name} stage failed on {item.file_path}: {e}")
+                self._on_error(e)
+                self._tracker.fail(item.file_path)
+            finally:
+                self._tracker.done(item.file_path)
+
+    def stop(self) -> None:
+        for _ in self._workers:
+            self.queue.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+
+
+class StagedPipeline:
+    """
+    A streaming ingestion pipeline that overlaps loading, splitting, embedding
+    and storing.
+
+    Every stage runs on its own pool of worker threads and the stages are
+    connected by bounded queues. Loaded pages are handed to the splitter in small
+    batches as they are produced, so CPU-bound parsing of one document overlaps
+    with network-bound embedding of another (or of earlier pages of the same
+    document), and a full downstream queue throttles the stages before it.
+    """
+
+    def __init__(
+        self,
+        components: PipelineComponents,
+        on_complete: Optional[Callable[[str, bool], None]] = None,
+        manifest: Optional[IngestionManifest] = None,
+    ):
+        """
+        Initialize the pipeline and start the stage workers.
+
+        Args:
+            components (PipelineComponents): The registry providing the shared
+                splitter, embedder and vector store.
+            on_complete (Optional[Callable[[str, bool], None]]): Called with the
+                file path and a success flag when every slice of a file is stored.
+            manifest (Optional[IngestionManifest]): When set, unchanged files are
+                skipped and the outcome of every file is recorded.
+        """
+        _queue_size = int(os.environ.get("STAGED_QUEUE_SIZE", "64"))
+        _load_workers = int(os.environ.get("STAGED_LOAD_WORKERS", "2"))
+        _split_workers = int(os.environ.get("STAGED_SPLIT_WORKERS", "2"))
+        _embed_workers = int(os.environ.get("STAGED_EMBED_WORKERS", "8"))
+        _store_workers = int(os.environ.get("STAGED_STORE_WORKERS", "1"))
+        self.load_batch_pages = int(os.environ.get("STAGED_LOAD_BATCH_PAGES", "8"))
+
+        logger.debug(
+            f"StagedPipeline initialized with load={_load_workers}, "
+            f"split={_split_workers}, embed={_embed_workers}, "
+            f"store={_store_workers} workers and queue size {_queue_size}"
+        )
+
+        self.components = components
+        self.manifest = manifest
+        self._on_complete = on_complete
+        self._checks: Dict[str, Union[ManifestCheck, LogCheck]] = {}
+        self._checks_lock = threading.Lock()
+        self._tracker = _FileTracker(self._complete)
+
+        # stages are built back to front so each one knows its successor
+        self._store_stage = _Stage(
+            "store",
+            _store_workers,
+            _queue_size,
+            self._store,
+            self._tracker,
+            components.handle_error,
+        )
+        self._embed_stage = _Stage(
+            "embed",
+            _embed_workers,
+            _queue_size,
+            self._embed,
+            self._tracker,
+            components.handle_error,
+            self._store_stage,
+        )
+        self._split_stage = _Stage(
+            "split",
+            _split_workers,
+            _queue_size,
+            self._split,
+            self._tracker,
+            components.handle_error,
+            self._embed_stage,
+        )
+        self._load_stage = _Stage(
+            "load",
+            _load_workers,
+            _queue_size,
+            self._load,
+            self._tracker,
+            components.handle_error,
+            self._split_stage,
+        )
+
+    def submit(self, file_path: str) -> None:
+        """
+        Queue a file for ingestion, blocking while the load queue is full.
+
+        Args:
+            file_path (str): The path of the file to ingest.
+        """
+        if self.manifest is not None and self.manifest.follows(file_path):
+            self._submit_log(file_path)
+            return
+        if self.manifest is not None:
+            try:
+                check = self.manifest.check(file_path)
+            except OSError as e:
+                logger.error(f"Cannot check {file_path} against the manifest: {e}")
+                self._finish(file_path, False)
+                return
+            if check.skip:
+                if check.replaces_previous:
+                    # now a copy of another file, drop what it held before
+                    self.components.get_vector_store().delete_documents(
+                        os.path.abspath(file_path)
+                    )
+                    self.manifest.mark_duplicate(file_path, check)
+                logger.info(f"Skipping {file_path}: {check.reason}")
+                self._finish(file_path, True)
+                return
+            self.manifest.mark_started(file_path, check)
+            if check.replaces_previous:
+                self.components.get_vector_store().delete_documents(
+                    os.path.abspath(file_path)
+                )
+            with self._checks_lock:
+                self._checks[file_path] = check
+
+        self._tracker.start(file_path)
+        self._load_stage.put(WorkItem(file_path=file_path))
+
+    def _submit_log(self, file_path: str) -> None:
+        """
+        Queue the lines appended to a followed log file since it was last
+        ingested, see IngestionManifest.check_log.
+        """
+        try:
+            check = self.manifest.check_log(file_path)
+        except OSError as e:
+            logger.error(f"Cannot check {file_path} against its offset: {e}")
+            self._finish(file_path, False)
+            return
+        if check.skip:
+            logger.info(f"Skipping {file_path}: {check.reason}")
+            self._finish(file_path, True)
+            return
+        logger.info(
+            f"Ingesting bytes {check.start}-{check.end} of {file_path}: {check.reason}"
+        )
+        if check.replaces_previous:
+            self.components.get_vector_store().delete_documents(
+                os.path.abspath(file_path)
+            )
+        with self._checks_lock:
+            # a range submitted while an earlier one is in flight completes with
+            # it, so the latest check holds the offset both reach
+            self._checks[file_path] = check
+
+        self._tracker.start(file_path)
+        self._load_stage.put(
+            WorkItem(file_path=file_path, byte_range=(check.start, check.end))
+        )
+
+    def _complete(self, file_path: str, succeeded: bool, chunks: int) -> None:
+        with self._checks_lock:
+            check = self._checks.pop(file_path, None)
+        if isinstance(check, LogCheck):
+            # a failed range is read again on the next change
+            if succeeded:
+                self.manifest.mark_log_ingested(file_path, check)
+        elif self.manifest is not None and check is not None:
+            if succeeded:
+                self.manifest.mark_ingested(file_path, check, chunks)
+            else:
+                self.manifest.mark_failed(file_path, check)
+        self._finish(file_path, succeeded)
+
+    def _finish(self, file_path: str, succeeded: bool) -> None:
+        if self._on_complete is not None:
+            self._on_complete(file_path, succeeded)
+
+    def _load(self, item: WorkItem) -> Iterable[WorkItem]:
+        if item.byte_range is not None:
+            pages = TextLoader(item.file_path).load_range(*item.byte_range)
+        else:
+            pages = UniversalLoader(item.file_path).lazy_load()
+        # pages are read as the split stage takes batches, not all up front
+        for documents in batched(pages, self.load_batch_pages):
+            yield WorkItem(file_path=item.file_path, documents=list(documents))
+
+    def _split(self, item: WorkItem) -> Iterable[WorkItem]:
+        chunks = self.components.get_splitter().split_documents(item.documents)
+        if chunks:
+            yield WorkItem(file_path=item.file_path, documents=chunks)
+
+    def _embed(self, item: WorkItem) -> Iterable[WorkItem]:
+        item.embeddings = self.components.get_embedder().embed_documents(
+            item.documents
+        )
+        yield item
+
+    def _store(self, item: WorkItem) -> Iterable[WorkItem]:
+        vector_store = self.components.get_vector_store()
+        vector_store.save_doc_embeddings(
+            item.documents, item.embeddings  # type: ignore
+        )
+        # a failed asynchronous write fails the file it belongs to
+        vector_store.flush()
+        self._tracker.stored(item.file_path, len(item.documents))
+        return ()
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get the depth of every stage queue and the number of files in flight.
+
+        Returns:
+            Dict[str, int]: Queue depths keyed by stage name and the file count.
+        """
+        return {
+            "load_queue": self._load_stage.queue.qsize(),
+            "split_queue": self._split_stage.queue.qsize(),
+            "embed_queue": self._embed_stage.queue.qsize(),
+            "store_queue": self._store_stage.queue.qsize(),
+            "files_in_flight": self._tracker.pending_files(),
+        }
+
+    def shutdown(self) -> None:
+        """
+        Finish every submitted file and stop the stage workers, front to back.
+        """
+        logger.info(f"Shutting down staged pipeline: {self.get_stats()}")
+        for stage in (
+            self._load_stage,
+            self._split_stage,
+            self._embed_stage,
+            self._store_stage,
+        ):
+            stage.stop()
+        self.components.get_vector_store().flush()
+        logger.info("Staged pipeline stopped")
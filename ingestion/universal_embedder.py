@@ -6,6 +6,7 @@ from langchain.schema import Document
 
 from common.embedders import BedrockEmbedder, OllamaEmbedder, OpenAIEmbedder
 from common.embedders.abstract_document_embedder import AbstractDocumentEmbedder
+from common.embedders.embedding_cache import CachedEmbedder
 from logging_config import setup_logger
 
 logger = setup_logger(__name__)
@@ -29,8 +30,26 @@ class UniversalEmbedder(AbstractDocumentEmbedder):
         else:
             raise ValueError(f"Unknown embedding provider: {embedding_provider}")
 
+        if os.environ.get("EMBEDDING_CACHE_ENABLED", "true").lower() == "true":
+            self.embedder = CachedEmbedder(self.embedder)
+
+        self.provider_name = self.embedder.provider_name
+        self.model_id = self.embedder.model_id
+
     def embed_documents(self, documents: List[Document]) -> List[List[float]]:
         return self.embedder.embed_documents(documents)
 
     def embed_query(self, input_text: str) -> List[float]:
         return self.embedder.embed_query(input_text)
+
+    def embed_queries(self, input_texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_queries(input_texts)
+
+    def needs_refresh(self) -> bool:
+        return self.embedder.needs_refresh()
+
+    async def aembed_documents(self, documents: List[Document]) -> List[List[float]]:
+        return await self.embedder.aembed_documents(documents)
+
+    async def aembed_query(self, input_text: str) -> List[float]:
+        return await self.embedder.aembed_query(input_text)
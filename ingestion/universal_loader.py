@@ -1,4 +1,7 @@
 import os
+from typing import Iterator
+
+from langchain.schema import Document
 
 from ingestion.loaders import AbstractDocumentLoader, DocxLoader, PDFLoader, TextLoader
 from logging_config import setup_logger
@@ -7,6 +10,16 @@ logger = setup_logger(__name__)
 
 
 class UniversalLoader:
+    # loader of every file extension get_loader knows how to handle
+    LOADERS = {
+        ".pdf": PDFLoader,
+        ".txt": TextLoader,
+        ".md": TextLoader,
+        ".log": TextLoader,
+        ".docx": DocxLoader,
+    }
+    SUPPORTED_EXTENSIONS = frozenset(LOADERS)
+
     def __init__(self, file_path):
         """
         Initialize a new instance of the class.
@@ -32,7 +45,7 @@ class UniversalLoader:
         Returns:
             AbstractDocumentLoader: An instance of the appropriate document loader.
 
-        Supported file types and their loaders:
+        Supported file types and their loaders, see LOADERS:
         - .pdf: PDFLoader
         - .txt, .md, .log: TextLoader
         - .docx: DocxLoader
@@ -43,14 +56,10 @@ class UniversalLoader:
         """
         file_extension = os.path.splitext(self.file_path)[1].lower()
 
-        if file_extension == ".pdf":
-            return PDFLoader(self.file_path)
-        elif file_extension in [".txt", ".md", ".log"]:
-            return TextLoader(self.file_path)
-        elif file_extension == ".docx":
-            return DocxLoader(self.file_path)
-        else:
+        loader_class = self.LOADERS.get(file_extension)
+        if loader_class is None:
             raise ValueError(f"Unsupported file type: {file_extension}")
+        return loader_class(self.file_path)
 
     def load(self):
         """
@@ -91,6 +100,43 @@ class UniversalLoader:
             )
             raise
 
+    def lazy_load(self) -> Iterator[Document]:
+        """
+        Load documents from the specified file path one at a time.
+
+        Unlike load, only the document being processed is held in memory, so
+        large files are loaded with memory bounded by their page or window size.
+
+        Yields:
+            Document: The loaded documents, in file order.
+
+        Raises:
+            FileNotFoundError: If the specified file is not found.
+            PermissionError: If there's no permission to access the file.
+            Exception: For any other unexpected errors during the loading process.
+
+        """
+        logger.info(f"Attempting to lazily load file: {self.file_path}")
+
+        try:
+            loader = self.get_loader()
+            count = 0
+            for document in loader.lazy_load():
+                count += 1
+                yield document
+            logger.info(f"Successfully loaded {count} documents.")
+        except FileNotFoundError as e:
+            logger.error(f"Error: File not found - {e}")
+            raise
+        except PermissionError as e:
+            logger.error(f"Error: Permission denied - {e}")
+            raise
+        except Exception as e:
+            logger.error(
+                f"An unexpected error occurred while loading the document: {str(e)}"
+            )
+            raise
+
     def load_and_split(self):
         """
         Load and split documents from the specified file path.
@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import Iterable, Iterator, List
 
 from dotenv import load_dotenv
 from langchain.schema import Document
@@ -42,3 +42,6 @@ class UniversalSplitter(AbstractDocumentSplitter):
 
     def split_documents(self, documents: List[Document]) -> List[Document]:
         return self.splitter.split_documents(documents)
+
+    def lazy_split_documents(self, documents: Iterable[Document]) -> Iterator[Document]:
+        return self.splitter.lazy_split_documents(documents)
@@ -1,11 +1,11 @@
 import os
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 from langchain.schema import Document
-from openai import vector_stores
 
-from common.databases import ChromaDBVectorStore
+from common.databases import BM25Index, ChromadbVectorStore, NumpyVectorStore
+from common.databases.bm25_index import reciprocal_rank_fusion
 from common.databases.abstract_vector_store import AbstractVectorStore
 from logging_config import setup_logger
 
@@ -22,16 +22,134 @@ class UniversalVectorStore(AbstractVectorStore):
         ).lower()
 
         if vector_store == "chromadb":
-            self.vector_store = ChromaDBVectorStore()
+            self.vector_store = ChromadbVectorStore()
+        elif vector_store == "numpy":
+            self.vector_store = NumpyVectorStore()
         elif vector_store == "aws":
-            self.vector_store = ChromaDBVectorStore()
+            logger.warning("No AWS vector store is available, using chromadb")
+            self.vector_store = ChromadbVectorStore()
         else:
             raise ValueError(f"Unknown vector store: {vector_store}")
 
+        # lexical index kept next to the vector store for hybrid queries
+        _lexical_index = os.environ.get("LEXICAL_INDEX_ENABLED", "true").lower()
+        _hybrid_candidates = int(os.environ.get("HYBRID_CANDIDATES", "20"))
+        _rrf_k = int(os.environ.get("HYBRID_RRF_K", "60"))
+        self.lexical_index = BM25Index() if _lexical_index == "true" else None
+        self.hybrid_candidates = _hybrid_candidates
+        self.rrf_k = _rrf_k
+
     def save_doc_embeddings(
         self, documents: List[Document], embeddings: List[List[float]]
     ) -> None:
-        return self.vector_store.save_doc_embeddings(documents, embeddings)
+        self.vector_store.save_doc_embeddings(documents, embeddings)
+        if self.lexical_index is not None:
+            self.lexical_index.add_documents(documents)
+
+    def batch_query_doc_embeddings(
+        self,
+        embeddings: List[List[float]],
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        return self.vector_store.batch_query_doc_embeddings(
+            embeddings, k, filters, max_distance
+        )
+
+    def query_doc_embeddings(
+        self,
+        embeddings: List[float],
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[Tuple[Document, float]]:
+        return self.vector_store.query_doc_embeddings(
+            embeddings, k, filters, max_distance
+        )
+
+    def batch_hybrid_query(
+        self,
+        queries: List[str],
+        embeddings: Optional[List[List[float]]] = None,
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Answer queries from the lexical index and the vector store, fusing both
+        rankings with reciprocal rank fusion.
+
+        Without embeddings the queries are answered from the lexical index only,
+        which needs no call to the embedding provider. Without a lexical index
+        they are answered from the vector store only.
+
+        Args:
+            queries (List[str]): The query texts.
+            embeddings (Optional[List[List[float]]]): The query vectors, one per
+                query text.
+            k (int): The number of results per query.
+            filters (Optional[Dict[str, Any]]): A metadata filter, see
+                matches_filters.
+            max_distance (Optional[float]): Drop vector results further away
+                than this.
+
+        Returns:
+            List[List[Tuple[Document, float]]]: For every query, the chunks and
+            their scores, highest first: fused scores in hybrid mode, BM25
+            scores in lexical mode and distances (lowest first) in vector mode.
+
+        Raises:
+            ValueError: If neither embeddings nor a lexical index are available.
+        """
+        if self.lexical_index is None:
+            if embeddings is None:
+                raise ValueError("Lexical index is disabled, embeddings are required")
+            return self.batch_query_doc_embeddings(embeddings, k, filters, max_distance)
+        if embeddings is None:
+            return self.lexical_index.batch_search(queries, k, filters)
+
+        candidates = max(k, self.hybrid_candidates)
+        lexical = self.lexical_index.batch_search(queries, candidates, filters)
+        dense = self.batch_query_doc_embeddings(
+            embeddings, candidates, filters, max_distance
+        )
+        return [
+            reciprocal_rank_fusion([lexical_results, dense_results], k, self.rrf_k)
+            for lexical_results, dense_results in zip(lexical, dense)
+        ]
+
+    def hybrid_query(
+        self,
+        query: str,
+        embeddings: Optional[List[float]] = None,
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Answer one query, see batch_hybrid_query.
+        """
+        return self.batch_hybrid_query(
+            [query],
+            None if embeddings is None else [embeddings],
+            k,
+            filters,
+            max_distance,
+        )[0]
+
+    def delete_documents(self, source: str) -> None:
+        self.vector_store.delete_documents(source)
+        if self.lexical_index is not None:
+            self.lexical_index.delete_documents(source)
+
+    def collection_version(self) -> Optional[str]:
+        return self.vector_store.collection_version()
+
+    def flush(self) -> None:
+        return self.vector_store.flush()
 
-    def query_doc_embeddings(self, embeddings: List[float]) -> List[Document]:
-        return self.vector_store.query_doc_embeddings(embeddings)
+    def close(self) -> None:
+        self.vector_store.close()
+        if self.lexical_index is not None:
+            self.lexical_index.close()
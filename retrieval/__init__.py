@@ -0,0 +1,13 @@
+from .query_cache import QueryEmbeddingCache, SemanticResultCache
+from .query_server import LatencyTracker, QueryBatcher, QueryServer
+from .retriever import Retriever
+
+
+__all__ = [
+    "LatencyTracker",
+    "QueryBatcher",
+    "QueryEmbeddingCache",
+    "QueryServer",
+    "Retriever",
+    "SemanticResultCache",
+]
@@ -0,0 +1,239 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain.schema import Document
+
+from common.embedders.embedding_cache import normalize_text
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+Results = List[Tuple[Document, float]]
+
+
+def query_key(query: str) -> str:
+    """
+    Normalize a query for exact cache lookups, so queries differing only in
+    whitespace share an entry. Case is kept, as embeddings depend on it.
+
+    Args:
+        query (str): The query text.
+
+    Returns:
+        str: The normalized query.
+    """
+    return normalize_text(query)
+
+
+class QueryEmbeddingCache:
+    """
+    An in-memory LRU cache of query embeddings with a time to live, keyed by the
+    embedding model and the normalized query text.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty cache.
+        """
+        _max_entries = int(os.environ.get("QUERY_EMBEDDING_CACHE_ENTRIES", "10000"))
+        _ttl = float(os.environ.get("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+
+        logger.debug(
+            f"QueryEmbeddingCache initialized with {_max_entries} entries "
+            f"and a ttl of {_ttl}s"
+        )
+
+        self.max_entries = _max_entries
+        self.ttl = _ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0}
+
+    @staticmethod
+    def make_key(model: str, query: str) -> str:
+        return f"{model}\x00{query_key(query)}"
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """
+        Look up a query embedding.
+
+        Args:
+            key (str): The key from make_key.
+
+        Returns:
+            Optional[List[float]]: The embedding, or None if absent or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        """
+        Store a query embedding, evicting the least recently used entries.
+
+        Args:
+            key (str): The key from make_key.
+            embedding (List[float]): The query embedding.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
+
+
+class SemanticResultCache:
+    """
+    An in-memory cache of query results looked up by query vector.
+
+    A new query is answered from the cache when its vector has at least the
+    configured cosine similarity to a cached query asked with the same
+    parameters (k, filters, mode), so paraphrases of a recent question skip the
+    vector search. Entries expire after a time to live, the least recently used
+    entries are evicted, and the whole cache is cleared when the collection
+    changes.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty cache.
+        """
+        _max_entries = int(os.environ.get("QUERY_RESULT_CACHE_ENTRIES", "2000"))
+        _ttl = float(os.environ.get("QUERY_RESULT_CACHE_TTL", "600"))
+        _threshold = float(os.environ.get("QUERY_RESULT_CACHE_THRESHOLD", "0.95"))
+
+        logger.debug(
+            f"SemanticResultCache initialized with {_max_entries} entries, "
+            f"a ttl of {_ttl}s and similarity threshold {_threshold}"
+        )
+
+        self.max_entries = _max_entries
+        self.ttl = _ttl
+        self.threshold = _threshold
+        self._lock = threading.Lock()
+        # entry id -> (expiry, parameters, slot, results); the unit query vector
+        # of an entry is the row of its slot in the preallocated matrix
+        self._entries: "OrderedDict[int, Tuple[float, str, int, Results]]" = (
+            OrderedDict()
+        )
+        self._next_id = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_owner = np.full(max(1, _max_entries), -1, dtype=np.int64)
+        self._free_slots: List[int] = []
+        self._stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_parameters(
+        k: int,
+        filters: Optional[Dict[str, Any]],
+        max_distance: Optional[float],
+        mode: str,
+    ) -> str:
+        return json.dumps([k, filters, max_distance, mode], sort_keys=True, default=str)
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get(self, embedding: List[float], parameters: str) -> Optional[Results]:
+        """
+        Find the results of a cached query similar to this one.
+
+        Args:
+            embedding (List[float]): The query vector.
+            parameters (str): The query parameters from make_parameters.
+
+        Returns:
+            Optional[Results]: The cached results, or None.
+        """
+        vector = self._unit(embedding)
+        with self._lock:
+            if self._vectors is not None and self._vectors.shape[1] == len(vector):
+                now = time.monotonic()
+                similarities = self._vectors @ vector
+                similarities[self._slot_owner < 0] = -np.inf
+                close = np.flatnonzero(similarities >= self.threshold)
+                for slot in close[np.argsort(-similarities[close])]:
+                    entry_id = int(self._slot_owner[slot])
+                    expiry, entry_parameters, _, results = self._entries[entry_id]
+                    if expiry < now or entry_parameters != parameters:
+                        continue
+                    self._entries.move_to_end(entry_id)
+                    self._stats["hits"] += 1
+                    return results
+            self._stats["misses"] += 1
+            return None
+
+    def _evict_oldest(self) -> None:
+        _, (_, _, slot, _) = self._entries.popitem(last=False)
+        self._slot_owner[slot] = -1
+        self._free_slots.append(slot)
+
+    def put(self, embedding: List[float], parameters: str, results: Results) -> None:
+        """
+        Cache the results of a query, evicting the least recently used entry
+        when the cache is full.
+
+        Args:
+            embedding (List[float]): The query vector.
+            parameters (str): The query parameters from make_parameters.
+            results (Results): The query results.
+        """
+        vector = self._unit(embedding)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                # first entry, or the embedding model changed
+                self._clear()
+                self._vectors = np.zeros(
+                    (len(self._slot_owner), len(vector)), dtype=np.float32
+                )
+            if not self._free_slots:
+                self._evict_oldest()
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._slot_owner[slot] = self._next_id
+            self._entries[self._next_id] = (
+                time.monotonic() + self.ttl,
+                parameters,
+                slot,
+                results,
+            )
+            self._next_id += 1
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._slot_owner[:] = -1
+        self._free_slots = list(range(len(self._slot_owner) - 1, -1, -1))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
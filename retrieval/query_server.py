@@ -0,0 +1,369 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from common.databases.abstract_vector_store import validate_filters
+from logging_config import setup_logger
+from retrieval.query_cache import Results
+from retrieval.retriever import RETRIEVAL_MODES, Retriever
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+_MAX_BODY_BYTES = 1 << 20
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    500: "Internal Server Error",
+}
+
+
+class LatencyTracker:
+    """
+    Keeps the latencies of the most recent requests and reports percentiles.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty window of QUERY_LATENCY_WINDOW samples.
+        """
+        _window = int(os.environ.get("QUERY_LATENCY_WINDOW", "10000"))
+
+        self._lock = threading.Lock()
+        self._samples: "deque[float]" = deque(maxlen=max(1, _window))
+        self._count = 0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get the latency percentiles of the window.
+
+        Returns:
+            Dict[str, float]: The total request count, and p50, p90, p99 and max
+            of the window in milliseconds.
+        """
+        with self._lock:
+            samples = np.fromiter(self._samples, dtype=np.float64)
+            count = self._count
+        if not len(samples):
+            return {"count": count}
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99]) * 1000.0
+        return {
+            "count": count,
+            "p50_ms": round(float(p50), 3),
+            "p90_ms": round(float(p90), 3),
+            "p99_ms": round(float(p99), 3),
+            "max_ms": round(float(samples.max()) * 1000.0, 3),
+        }
+
+
+class QueryBatcher:
+    """
+    Gathers concurrent queries into batches answered by one Retriever.batch_search
+    call, so a batch costs one embedding request and one vector search instead
+    of one of each per query.
+
+    Queries are grouped by their search parameters. A group is flushed when it
+    reaches QUERY_BATCH_MAX_SIZE queries or QUERY_BATCH_WINDOW_MS after its
+    first query arrived, whichever comes first. At most QUERY_BATCH_CONCURRENCY
+    batches run at the same time, each on a worker thread.
+    """
+
+    def __init__(self, retriever: Retriever):
+        """
+        Initialize the batcher.
+
+        Args:
+            retriever (Retriever): Answers the batches.
+        """
+        _window_ms = float(os.environ.get("QUERY_BATCH_WINDOW_MS", "5"))
+        _max_size = int(os.environ.get("QUERY_BATCH_MAX_SIZE", "64"))
+        _concurrency = int(os.environ.get("QUERY_BATCH_CONCURRENCY", "4"))
+
+        logger.debug(
+            f"QueryBatcher initialized with a {_window_ms}ms window, batches of "
+            f"up to {_max_size} and {_concurrency} concurrent batches"
+        )
+
+        self.retriever = retriever
+        self.window = _window_ms / 1000.0
+        self.max_size = max(1, _max_size)
+        self.concurrency = max(1, _concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # parameters -> pending (query, future) pairs and the flush timer
+        self._pending: Dict[Tuple, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple, asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+        self._stats = {"batches": 0, "queries": 0, "max_batch": 0}
+
+    async def search(
+        self,
+        query: str,
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        max_distance: Optional[float] = None,
+        mode: Optional[str] = None,
+    ) -> Results:
+        """
+        Queue a query for the next batch with the same parameters.
+
+        Args:
+            query (str): The query text.
+            k (int): The number of results.
+            filters (Optional[Dict[str, Any]]): A metadata filter.
+            max_distance (Optional[float]): Drop vector results further away
+                than this.
+            mode (Optional[str]): The retrieval mode, see Retriever.batch_search.
+
+        Returns:
+            Results: The chunks and their scores.
+        """
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        key = (k, json.dumps(filters, sort_keys=True), max_distance, mode)
+        future = loop.create_future()
+        group = self._pending.setdefault(key, [])
+        group.append((query, future))
+        if len(group) >= self.max_size:
+            self._flush(key)
+        elif len(group) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key: Tuple) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        group = self._pending.pop(key, None)
+        if not group:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(key, group))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Tuple, group: List[Tuple[str, asyncio.Future]]) -> None:
+        k, filters, max_distance, mode = key
+        queries = [query for query, _ in group]
+        async with self._semaphore:
+            self._stats["batches"] += 1
+            self._stats["queries"] += len(group)
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(group))
+            try:
+                results = await asyncio.to_thread(
+                    self.retriever.batch_search,
+                    queries,
+                    k,
+                    json.loads(filters),
+                    max_distance,
+                    mode,
+                )
+            except Exception as e:
+                logger.error(f"Batch of {len(group)} queries failed: {e}")
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        for (_, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def drain(self) -> None:
+        """
+        Flush all pending queries and wait for the running batches.
+        """
+        for key in list(self._pending):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, float]:
+        stats = dict(self._stats)
+        stats["mean_batch"] = (
+            round(stats["queries"] / stats["batches"], 3) if stats["batches"] else 0.0
+        )
+        return stats
+
+
+class QueryServer:
+    """
+    A long-running HTTP/1.1 query service on top of the Retriever.
+
+    Endpoints:
+        POST /query: a JSON body {"query", "k", "filters", "max_distance",
+            "mode"}, only "query" is required. Answers {"results": [{"id",
+            "text", "metadata", "score"}], "latency_ms"}.
+        GET /stats: request latency percentiles, batching and cache statistics.
+        GET /health: {"status": "ok"}.
+
+    Concurrent queries are answered in batches, see QueryBatcher.
+    """
+
+    def __init__(self, retriever: Optional[Retriever] = None):
+        """
+        Initialize the server.
+
+        Args:
+            retriever (Optional[Retriever]): Answers the queries, a Retriever
+                by default.
+        """
+        _host = os.environ.get("QUERY_SERVER_HOST", "127.0.0.1")
+        _port = int(os.environ.get("QUERY_SERVER_PORT", "8080"))
+
+        logger.debug(f"QueryServer initialized on {_host}:{_port}")
+
+        self.host = _host
+        self.port = _port
+        self.retriever = retriever if retriever is not None else Retriever()
+        self.batcher = QueryBatcher(self.retriever)
+        self.latency = LatencyTracker()
+
+    async def _query(self, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        try:
+            request = json.loads(body or b"{}")
+            query = request["query"]
+            if not isinstance(query, str) or not query.strip():
+                raise ValueError("query must be a non-empty string")
+            k = int(request.get("k", 4))
+            filters = request.get("filters")
+            validate_filters(filters)
+            max_distance = request.get("max_distance")
+            if max_distance is not None:
+                max_distance = float(max_distance)
+            mode = request.get("mode")
+            if mode is not None and str(mode).lower() not in RETRIEVAL_MODES:
+                raise ValueError(f"unknown retrieval mode {mode}")
+        except (KeyError, TypeError, ValueError) as e:
+            return 400, {"error": f"Invalid query request: {e}"}
+
+        start = time.perf_counter()
+        try:
+            results = await self.batcher.search(query, k, filters, max_distance, mode)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        elapsed = time.perf_counter() - start
+        self.latency.record(elapsed)
+        return 200, {
+            "results": [
+                {
+                    "id": document.id,
+                    "text": document.page_content,
+                    "metadata": document.metadata,
+                    "score": score,
+                }
+                for document, score in results
+            ],
+            "latency_ms": round(elapsed * 1000.0, 3),
+        }
+
+    async def _dispatch(
+        self, method: str, path: str, body: bytes
+    ) -> Tuple[int, Dict[str, Any]]:
+        path = path.split("?", 1)[0]
+        if method == "POST" and path == "/query":
+            return await self._query(body)
+        if method == "GET" and path == "/stats":
+            return 200, {
+                "latency": self.latency.get_stats(),
+                "batching": self.batcher.get_stats(),
+                "caches": self.retriever.get_stats(),
+            }
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        return 404, {"error": f"No route for {method} {path}"}
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", "0") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # the body cannot be skipped, so the connection is closed
+                    status, payload = 400, {"error": "Invalid Content-Length"}
+                elif length > _MAX_BODY_BYTES:
+                    status, payload = 400, {"error": "Request body too large"}
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        status, payload = await self._dispatch(method, path, body)
+                    except Exception as e:
+                        logger.error(f"Error answering {method} {path}: {e}")
+                        status, payload = 500, {"error": "Internal error"}
+
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    and version == "HTTP/1.1"
+                    and 0 <= length <= _MAX_BODY_BYTES
+                )
+                data = json.dumps(payload, default=str).encode("utf-8")
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(data)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                        "\r\n"
+                    ).encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        """
+        Serve queries until cancelled.
+        """
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Query server listening on {self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.drain()
+
+    def run(self) -> None:
+        """
+        Serve queries until interrupted, then close the retriever.
+        """
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            logger.info("Query server stopped")
+        finally:
+            self.retriever.close()
@@ -0,0 +1,221 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from common.embedders.abstract_document_embedder import AbstractDocumentEmbedder
+from ingestion.universal_embedder import UniversalEmbedder
+from ingestion.universal_vector_store import UniversalVectorStore
+from logging_config import setup_logger
+from retrieval.query_cache import QueryEmbeddingCache, Results, SemanticResultCache
+
+logger = setup_logger(__name__)
+load_dotenv(override=False)
+
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+
+
+class Retriever:
+    """
+    Answers queries from the vector store, with caches in front of the embedding
+    provider and the search.
+
+    Query embeddings are cached by model and normalized query text, so repeated
+    questions skip the embedding round trip. Optionally, results are cached by
+    query vector, so a question close enough to a recent one (QUERY_RESULT_CACHE_
+    THRESHOLD cosine similarity, asked with the same parameters) is answered
+    without a search. Cached results are dropped as soon as the vector store
+    reports that the collection changed. Query embeddings do not depend on the
+    collection and stay cached until they expire.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[AbstractDocumentEmbedder] = None,
+        vector_store: Optional[UniversalVectorStore] = None,
+    ):
+        """
+        Initialize the retriever.
+
+        Args:
+            embedder (Optional[AbstractDocumentEmbedder]): Embeds the queries,
+                a UniversalEmbedder by default.
+            vector_store (Optional[UniversalVectorStore]): The store searched,
+                a UniversalVectorStore by default.
+        """
+        _mode = os.environ.get("RETRIEVAL_MODE", "vector").lower()
+        _embedding_cache = os.environ.get(
+            "QUERY_EMBEDDING_CACHE_ENABLED", "true"
+        ).lower()
+        _result_cache = os.environ.get("QUERY_RESULT_CACHE_ENABLED", "false").lower()
+
+        if _mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {_mode}")
+
+        logger.debug(
+            f"Retriever initialized in {_mode} mode, embedding cache: "
+            f"{_embedding_cache}, result cache: {_result_cache}"
+        )
+
+        self.mode = _mode
+        self.embedder = embedder if embedder is not None else UniversalEmbedder()
+        self.vector_store = (
+            vector_store if vector_store is not None else UniversalVectorStore()
+        )
+        self.embedding_cache = (
+            QueryEmbeddingCache() if _embedding_cache == "true" else None
+        )
+        self.result_cache = SemanticResultCache() if _result_cache == "true" else None
+        self._collection_version: Optional[str] = None
+
+    def _model(self) -> str:
+        return f"{self.embedder.provider_name}:{self.embedder.model_id}"
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed queries, calling the provider only for those not cached.
+
+        Args:
+            queries (List[str]): The query texts.
+
+        Returns:
+            List[List[float]]: One embedding per query.
+        """
+        if self.embedding_cache is None:
+            return self.embedder.embed_queries(queries)
+
+        model = self._model()
+        keys = [QueryEmbeddingCache.make_key(model, query) for query in queries]
+        embeddings: List[Optional[List[float]]] = [
+            self.embedding_cache.get(key) for key in keys
+        ]
+        # one provider call for all misses, each distinct query embedded once
+        missing: Dict[str, int] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(keys[i], i)
+        if missing:
+            computed = self.embedder.embed_queries(
+                [queries[i] for i in missing.values()]
+            )
+            vectors = dict(zip(missing, computed))
+            for key, vector in vectors.items():
+                self.embedding_cache.put(key, vector)
+            embeddings = [
+                vectors[key] if embedding is None else embedding
+                for key, embedding in zip(keys, embeddings)
+            ]
+        return embeddings
+
+    def _check_collection(self) -> None:
+        """Drop cached results when the collection changed since they were cached."""
+        if self.result_cache is None:
+            return
+        version = self.vector_store.collection_version()
+        if version is None or version != self._collection_version:
+            if self._collection_version is not None:
+                logger.debug("Collection changed, clearing the result cache")
+            self.result_cache.clear()
+            self._collection_version = version
+
+    def batch_search(
+        self,
+        queries: List[str],
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        max_distance: Optional[float] = None,
+        mode: Optional[str] = None,
+    ) -> List[Results]:
+        """
+        Answer several queries with one batched search.
+
+        Args:
+            queries (List[str]): The query texts.
+            k (int): The number of results per query.
+            filters (Optional[Dict[str, Any]]): A metadata filter, see
+                matches_filters.
+            max_distance (Optional[float]): Drop vector results further away
+                than this.
+            mode (Optional[str]): "vector", "hybrid" or "lexical", RETRIEVAL_MODE
+                by default.
+
+        Returns:
+            List[Results]: For every query, the chunks and their scores, see
+            UniversalVectorStore.batch_hybrid_query.
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        mode = (mode or self.mode).lower()
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if not queries:
+            return []
+        if mode == "lexical":
+            return self.vector_store.batch_hybrid_query(queries, None, k, filters)
+
+        embeddings = self.embed_queries(queries)
+        self._check_collection()
+        parameters = SemanticResultCache.make_parameters(
+            k, filters, max_distance, mode
+        )
+        results: List[Optional[Results]] = [None] * len(queries)
+        if self.result_cache is not None:
+            results = [
+                self.result_cache.get(embedding, parameters) for embedding in embeddings
+            ]
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            pending_embeddings = [embeddings[i] for i in pending]
+            if mode == "hybrid":
+                found = self.vector_store.batch_hybrid_query(
+                    [queries[i] for i in pending],
+                    pending_embeddings,
+                    k,
+                    filters,
+                    max_distance,
+                )
+            else:
+                found = self.vector_store.batch_query_doc_embeddings(
+                    pending_embeddings, k, filters, max_distance
+                )
+            for i, result in zip(pending, found):
+                results[i] = result
+                if self.result_cache is not None:
+                    self.result_cache.put(embeddings[i], parameters, result)
+        return results
+
+    def search(
+        self,
+        query: str,
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        max_distance: Optional[float] = None,
+        mode: Optional[str] = None,
+    ) -> Results:
+        """
+        Answer one query, see batch_search.
+        """
+        return self.batch_search([query], k, filters, max_distance, mode)[0]
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get the cache statistics.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Hits, misses and entries of each enabled
+            cache.
+        """
+        stats = {}
+        if self.embedding_cache is not None:
+            stats["embedding_cache"] = self.embedding_cache.get_stats()
+        if self.result_cache is not None:
+            stats["result_cache"] = self.result_cache.get_stats()
+        return stats
+
+    def close(self) -> None:
+        """
+        Close the vector store.
+        """
+        self.vector_store.close()
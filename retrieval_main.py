@@ -0,0 +1,17 @@
+from logging_config import setup_logger
+from retrieval.query_server import QueryServer
+
+logger = setup_logger(__name__)
+
+
+def main():
+    """
+    Main function to run the query server.
+    """
+    logger.info("Starting query server...")
+    query_server = QueryServer()
+    query_server.run()
+
+
+if __name__ == "__main__":
+    main()
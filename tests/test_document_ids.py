@@ -0,0 +1,40 @@
+import zipfile
+
+from common.databases.abstract_vector_store import AbstractVectorStore
+from ingestion.loaders.docx_loader import DocxLoader
+from ingestion.splitters.fixed_width_splitter import FixedWidthSplitter
+
+_W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def _write_docx(path, sections: int) -> None:
+    paragraphs = []
+    for number in range(sections):
+        paragraphs.append(
+            f'<w:p><w:pPr><w:outlineLvl w:val="0"/></w:pPr>'
+            f"<w:r><w:t>Section {number}</w:t></w:r></w:p>"
+        )
+        paragraphs.append(
+            f"<w:p><w:r><w:t>Body of section {number}.</w:t></w:r></w:p>"
+        )
+    document = (
+        f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{_W}">'
+        f"<w:body>{''.join(paragraphs)}</w:body></w:document>"
+    )
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", document)
+
+
+def test_docx_chunk_ids_do_not_depend_on_batches(tmp_path):
+    path = tmp_path / "sections.docx"
+    _write_docx(path, 12)
+    units = DocxLoader(str(path)).load()
+    assert len(units) == 12
+
+    splitter = FixedWidthSplitter()
+    first = AbstractVectorStore.document_ids(splitter.split_documents(units[:8]))
+    second = AbstractVectorStore.document_ids(splitter.split_documents(units[8:]))
+    every = AbstractVectorStore.document_ids(splitter.split_documents(units))
+
+    assert set(first).isdisjoint(second)
+    assert every == first + second